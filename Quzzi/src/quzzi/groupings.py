@@ -166,6 +166,8 @@ class routeComposite:
             compseg.seg.arrtime = last.arrtime
             compseg.seg.depday = first.depday
             compseg.seg.arrday = last.arrday
+            compseg.seg.udep = first.udep
+            compseg.seg.uarr = last.uarr
             compseg.seg.UT1 = first.UT1
             compseg.seg.UT2 = last.UT2
             compseg.seg.T   = 0 # N/A for composites
@@ -199,6 +201,8 @@ class routeComposite:
                 compseg.seg.arrtime = last.arrtime
                 compseg.seg.depday = first.depday
                 compseg.seg.arrday = last.arrday
+                compseg.seg.udep = first.udep
+                compseg.seg.uarr = last.uarr
                 compseg.seg.UT1 = first.UT1
                 compseg.seg.UT2 = last.UT2
                 compseg.seg.T   = 0 # N/A for composites
@@ -28,6 +28,10 @@ from collections import defaultdict
 # Provides for stacking multiple qubos for independant constraint inspection                   #
 # Application of linear and quadratic constraints to a named qubo                              #
 #                                                                                              #
+# An optional mask (rows x cols) keeps only the feasible cells: pruned cells get no variable   #
+# (id -1 in the board) and the kept cells are numbered row by row. Use getqb/isCell/decode     #
+# rather than computing r*cols+c.                                                              #
+#                                                                                              #
 #==============================================================================================#
 
 class qbGrid:
@@ -66,19 +70,31 @@ class qbGrid:
             print("         ",add.size,"additional variables",add.min(),"to",add.max())
         #print("         ",self.ancil.size,"start ancillaries",self.ancil.min(),"to",self.ancil.max() )
             
+    # Number of non zero coefficients in a qubo
+    def nonzeros(self,Q):
+        return( sum(1 for v in Q.values() if v != 0) )
+
+    # Number of ancillary variables added by high order reductions
+    def ancillas(self):
+        return( len(self.additional) )
+
     def clearQubos(self):
         if ( self.Qubos is not None):     
             self.Qubos.clear()
             
-    def __init__(self,rows=1,cols=1):
+    def __init__(self,rows=1,cols=1,mask=None):
         self.rows = rows
         self.cols = cols
         self.N = rows * cols
         
+        # Feasible cells
+        self.mask = np.ones((rows,cols), dtype=bool) if mask is None else np.array(mask, dtype=bool)
+        self.cells = int(self.mask.sum())
+        
         # Board qubits
-        self.set = np.array(list(range(self.N)))
+        self.set = np.array(list(range(self.cells)))
         # Flag qubits
-        self.flags = np.array(range(rows)) + self.N
+        self.flags = np.array(range(rows)) + self.cells
         # Ancillary qubits for start flags
         #self.ancil = np.array(range(rows)) + self.N + self.flags.size
         # High Order variables 
@@ -89,8 +105,9 @@ class qbGrid:
 
         #self.info()
         
-        # Board and Transposed Board
-        self.board = np.array(self.set).reshape(self.rows,self.cols)
+        # Board and Transposed Board (-1 on pruned cells)
+        self.board = np.full((self.rows,self.cols), -1, dtype=int)
+        self.board[self.mask] = self.set
         self.trans = self.board.T 
 
         #
@@ -113,20 +130,36 @@ class qbGrid:
         return( w * self.normal )
     
     def getOrg(self,r,c):
-        return (r * self.cols + c)
+        return (int(self.board[r,c]))
     
     def getqb(self,r,c):
         return list([self.getOrg(r,c)])
 
+    # Is (r,c) a feasible (not pruned) cell
+    def isCell(self,r,c):
+        return (self.mask[r,c])
+
+    def pruned(self):
+        return (self.N - self.cells)
+
     # Get row wise groups of qubits
     def getr(self,r,s=0):
         if ( s == 0 ): s = self.cols
-        return self.board[r][:s]
+        return self.board[r][:s][self.mask[r][:s]]
     
     # Get column wise groups of qubits
     def getc(self,c,s=0):
         if ( s == 0 ): s = self.rows
-        return self.trans[c][:s]
+        return self.trans[c][:s][self.mask.T[c][:s]]
+
+    # Decode a sample (list or dictionary of variable values) row by row:
+    # yields (row, start flag value, columns set to 1)
+    def decode(self,variables):
+        for r in range(self.rows):
+            q = self.flags[r]
+            state = variables[q] if ( q < len(variables) ) else 0
+            nodes = [int(c) for c in np.flatnonzero(self.mask[r]) if variables[int(self.board[r,c])] == 1]
+            yield (r, state, nodes)
     
     # Get a list of all rows
     def getr_all(self, s=0):
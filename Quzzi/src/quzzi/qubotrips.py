@@ -23,6 +23,7 @@ import networkx as nx
 
 from quzzi.qbgrid import qbGrid
 from quzzi.qzquad import *
+from quzzi.qzprofile import profiler
 
 #from qztrips.qbGrid import qbGrid
 #from qzquad import quadCoeff
@@ -74,8 +75,11 @@ class QuboTrips:
         self.params['const_max_connect'] = 36*60 # Default: Assumes single day trips only. Disallows crew rest
         self.params['const_max_fly_2X2'] = 14*60 # Default: Maximum flight time for combined 2 segments when no crew rest
         self.params['const_min_prone_rest'] = 8*60 # Default: Amount of time in between segments that may qualify for a rest period
+        self.params['const_max_trip'] = 0          # Default: Full board. Otherwise maximum trip span (minutes) used to prune board cells
         
-        self.G = self.buildFltGraph()
+        self.layers = []                           # Applied layers as (method name, qubo, weights), see tripModel.applyLayer
+        self.layerScale = {}                       # Scale of each Qubo in the problem Qubo (default 1.0), see qztune
+        self.commitParams()
 
         self.finalQ = None
         
@@ -84,11 +88,21 @@ class QuboTrips:
     # Build Graph - Must be called after parameters have been set
     
     def commitParams(self):
-        self.G = self.buildFltGraph()
+        with profiler.phase("buildFltGraph") as p:
+            self.G = self.buildFltGraph()
+            p.size(nodes=self.G.number_of_nodes(), edges=self.G.number_of_edges())
+        # Restrict the board to the feasible cells. A new board starts without Qubos
+        mask = self.buildFeasibleCells()
+        if ( not np.array_equal(mask, self.board.mask) ):
+            self.board = qbGrid(self.board.rows, self.board.cols, mask=mask)
+            self.layers = []
     
     # This is required to create a single final normalized qubo 
     def commitQubo(self):
-        self.finalQ = self.problemQubo()
+        with profiler.phase("problemQubo") as p:
+            self.finalQ = self.problemQubo()
+            if ( profiler.enabled ):
+                p.size(terms=len(self.finalQ), nonzeros=self.board.nonzeros(self.finalQ), variables=int(self.board.qubits), ancillas=self.board.ancillas())
     
     # This is the call that the solver needs to make to get the problem Qubo
     def finalQubo(self):
@@ -102,7 +116,7 @@ class QuboTrips:
         FinalQubo = self.board.newQubo()
 
         for qubo in self.board.Qubos.keys():
-            Q = self.normalizeQubo(self.board.Qubos[qubo])
+            Q = self.normalizeQubo(self.board.Qubos[qubo], self.layerScale.get(qubo, 1.0))
             FinalQubo = self.sumQubo( FinalQubo, Q )
         return (FinalQubo)
         
@@ -187,10 +201,15 @@ class QuboTrips:
     # Normalization of a Qubo. 
     # Use this on an Objectives Qubo to prepare adding other normalized Qubos
     #
-    def normalizeQubo(self,Q):
+    def normalizeQubo(self,Q,scale=1.0):
         normQ = {}
-        for e in Q: normQ[e] = Q[e] * self.norm
+        for e in Q: normQ[e] = Q[e] * self.norm * scale
         return(normQ)
+
+    # Weigh the Qubos of the problem Qubo without rebuilding them: {qubo name: scale}
+    def setLayerScale(self,scales):
+        self.layerScale = dict(scales)
+        self.finalQ = None
     
     # Apply an initial Qii (negative value)
     # Use this to set the Linear Qii of one or more qubits to an initial ground state
@@ -267,9 +286,9 @@ class QuboTrips:
     #
     # Apply High Order Function (will replace TripleContribution when testing completed) 
     #
-    # 
+    # The substitution constraints (weight P) go to the penalty Qubo, the reduced terms to qubo
     
-    def ApplyHighOrderContribution(self, qubits, Qijk_z, qubo='high-order', P=1 ): # Applies -Qijklmno...z
+    def ApplyHighOrderContribution(self, qubits, Qijk_z, qubo='high-order', P=1, penalty='substitutions' ): # Applies -Qijklmno...z
         Q = self.board.getQubo(qubo)
         # Get the next variable id we can use
         Y = self.board.qubits
@@ -282,7 +301,7 @@ class QuboTrips:
         self.board.highOrders = e.substitutions
         #print(self.board.highOrders)
         #e.elaborate()
-        e.applyQubo(Q) # Apply the weights to the given Qubo
+        e.applyQubo(Q, self.board.getQubo(penalty)) # Apply the weights to the given Qubo
         #Q = self.sumQubo( self.board.getQubo(qubo) , e.qubo() )
         self.board.additional.extend(e.newvars)
         self.board.qubits = Y
@@ -341,6 +360,92 @@ class QuboTrips:
                     grid[s1.obj.task_id-1,s2.obj.task_id-1] = max(0,self.getGap(s1,s2)) + (min(0,self.getGap(s1,s2)) * (self.params['const_neg_gap']))
         return(grid)
 
+    # ================================================================================================================================
+    # Encode sequences of task ids (as schedData.get_sequences) into the board variable layout
+    # Trips are placed by first departure, one segment per row, with the start flag set on their first row.
+    # Segments missing from the sequences are placed as trips of their own. Ancillas take the value of the
+    # product they substitute (board.highOrders), so the assignment satisfies the reduction penalties.
+    # Returns {variable: 0/1} for all board variables
+    #
+    def encodeSequences(self,sequences):
+        board = self.board
+        T = self.Ann.getTable()
+        seqs = [list(seq) for seq in (sequences.values() if isinstance(sequences, dict) else sequences)]
+        seen = set(t for seq in seqs for t in seq)
+        seqs.extend([[int(t)] for t in T.task_id if int(t) not in seen])
+        seqs.sort(key=lambda seq: (T.udep[seq[0]-1], seq[0]))
+
+        x = {q: 0 for q in range(board.qubits)}
+        row = 0
+        for seq in seqs:
+            if ( row + len(seq) > board.rows ): raise ValueError("Sequences repeat segments")
+            x[int(board.flags[row])] = 1
+            for task_id in seq:
+                if ( not board.isCell(row, task_id-1) ): raise ValueError("Segment {} is pruned at row {}".format(task_id, row))
+                x[board.getOrg(row, task_id-1)] = 1
+                row += 1
+
+        # Substitutions are keyed "x<a>x<b>" and created after their variables
+        for key, y in sorted(board.highOrders.items(), key=lambda kv: kv[1]):
+            (a, b) = [int(v) for v in key.split("x")[1:]]
+            x[y] = x[a] * x[b]
+        return(x)
+
+    # ================================================================================================================================
+    # Build the feasible board cells (see SegmentTable.feasibleCells)
+    # Heuristic: only orderings listing trips by start time are kept, for trips of at most const_max_trip minutes
+    # N: board size (default: the current board)
+    #
+    def buildFeasibleCells(self, N=None):
+        (rows, cols) = (self.board.rows, self.board.cols) if N is None else (N, N)
+        mask = np.ones((rows,cols), dtype=bool)
+        T = self.Ann.getTable()
+        if ( self.params['const_max_trip'] <= 0 or T.n != cols ): return(mask)
+        return( T.feasibleCells(self.params, self.params['const_max_trip']) )
+
+    # ================================================================================================================================
+    # Values forced by the penalty layers applied (see qzfix.variableFixer): any other value violates a layer
+    # whatever the other variables are, so no feasible solution takes it
+    #   - the first row start flag (applyMustStart), so the first row cells departing off base (applyNoStartOffBase)
+    #   - cells departing off base with no connection from any cell of the previous row, and cells arriving off
+    #     base with no connection to any cell of the next row: with a start flag applyNoStartOffBase penalizes
+    #     them, without one applyNoMisconnect does
+    # Segments that cannot avoid these penalties keep their cells: those left without any free cell, or sharing
+    # the single row left to them (fixing would only move the violation to the one node per row and column layers)
+    # Returns {variable: 0/1}
+    #
+    def forcedValues(self):
+        board = self.board
+        applied = set(name for (name, qubo, kwargs) in self.layers)
+        fixed = {}
+        if ( 'applyMustStart' not in applied ): return(fixed)
+        fixed[int(board.flags[0])] = 1
+        T = self.Ann.getTable()
+        if ( 'applyNoStartOffBase' not in applied or T.n != board.cols ): return(fixed)
+
+        mask = board.mask
+        zero = np.zeros(mask.shape, dtype=bool)
+        zero[0] = ~T.hbDep
+        if ( 'applyNoMisconnect' in applied ):
+            connect = (self.buildConnectFromG() > 0).astype(int)
+            fromPrevious = (mask[:-1].astype(int) @ connect) > 0
+            toNext = (mask[1:].astype(int) @ connect.T) > 0
+            zero[1:] |= ~fromPrevious & ~T.hbDep[None,:]
+            zero[:-1] |= ~toNext & ~T.hbArr[None,:]
+        zero &= mask
+
+        free = mask & ~zero
+        keep = ~free.any(axis=0)
+        single = (free.sum(axis=0) == 1)
+        rows = free.argmax(axis=0)
+        for r in np.unique(rows[single]):
+            if ( (single & (rows == r)).sum() > 1 ): keep |= single & (rows == r)
+        zero[:, keep] = False
+
+        for (r, n) in zip(*np.nonzero(zero)):
+            fixed[board.getOrg(r, n)] = 0
+        return(fixed)
+
     # ================================================================================================================================
     # Build the connect stations truth table from G
     # Includes Sta to Sta and MinConnect conditions
@@ -359,11 +464,8 @@ class QuboTrips:
     #
     
     def buildMisconnectFromG(self):
-        grid = np.zeros(self.board.N).reshape(self.board.rows,self.board.cols)
-        for n1,n2 in self.nextNodePair(self.Ann.segments,self.Ann.segments, self.noEdgesNodePair, self.G, unique=False):
-            #print(self.Ann.FD.formatSegment(n1,0),"<= no connect =>", self.Ann.FD.formatSegment(n2,0))
-            grid[n1.obj.task_id-1,n2.obj.task_id-1] = True 
-        return(grid)        
+        # Every segment pair without an edge (complement of the connect table)
+        return( 1.0 - self.buildConnectFromG() )
     
     # Build the connect stations truth table
     #
@@ -390,10 +492,10 @@ class QuboTrips:
     # ==============================================================================================================================
     #
     def buildHomeBase(self):
+        T = self.Ann.getTable()
         grid = np.zeros((self.board.rows,2))
-        for s1 in self.Ann.segments:
-            grid[s1.obj.task_id-1,0] = ( s1.obj.dep in self.Ann.HomeBases )
-            grid[s1.obj.task_id-1,1] = ( s1.obj.arr in self.Ann.HomeBases )
+        grid[T.task_id-1,0] = T.hbDep
+        grid[T.task_id-1,1] = T.hbArr
         return(grid)
         
     # Build Station ground state contribution weights per segment
@@ -421,26 +523,34 @@ class QuboTrips:
     # whereby leftover unspecified edges are deemed unwanted at any cost
     #
     
-    def applyNoMisconnect(self,qubo="constraint", LG=1):
+    def applyNoMisconnect(self,qubo="constraint", LG=1, cols=None):
         misconnects = self.buildMisconnectFromG()
-        for (n1,n2,q1,q2) in self.nextBoardQuboNodePair(self.consecRows):   # Nodes must be consecutive
-            self.ApplyPairwiseContribution( [(q1,q2)], misconnects[n1,n2] * self.params['const_bad'] * LG, qubo=qubo)
+        pairs = [(n1,n2) for n1 in range(self.board.cols) for n2 in range(self.board.cols) if self.inCols(cols,n1,n2)]
+        # Nodes must be consecutive (as nextBoardQuboNodePair with consecRows, board qubits are row major)
+        for r in range(self.board.rows-1):
+            for (n1,n2) in pairs:
+                if ( not (self.board.isCell(r,n1) and self.board.isCell(r+1,n2)) ): continue   # Pruned cells
+                q1 = self.board.getqb(r,n1)[0]
+                q2 = self.board.getqb(r+1,n2)[0]
+                self.ApplyPairwiseContribution( [(q1,q2)], misconnects[n1,n2] * self.params['const_bad'] * LG, qubo=qubo)
 
     # 
     #
     #
     
-    def applyNoStartOffBase(self,qubo="constraint", LG=1):
+    def applyNoStartOffBase(self,qubo="constraint", LG=1, cols=None):
         hb = self.buildHomeBase()
         departure = 0
         arrival = 1
         # No start on a non-base departure
         for ( s, r, n, qs1, q1 ) in self.nextBoardQuboStartPair(self.startOnNode):
+            if ( not self.inCols(cols,n) ): continue
             if ( not hb[n][departure]):
                 #print("No start on", s, r, n, qs1, q1 )
                 self.ApplyPairwiseContribution( [(qs1,q1)], self.params['const_bad'] * LG, qubo=qubo)
         # No start following a non-base arrival
         for ( s, r, n, qs1, q1 ) in self.nextBoardQuboStartPair(self.startAfterNode):
+            if ( not self.inCols(cols,n) ): continue
             if ( not hb[n][arrival]):
                 #print("No start after", s, r, n, qs1, q1 )
                 self.ApplyPairwiseContribution( [(qs1,q1)], self.params['const_bad'] * LG, qubo=qubo)
@@ -449,10 +559,11 @@ class QuboTrips:
     # Apply segment initial Objectives contribution
     # 
     
-    def applySegmentInitialContribution(self,qubo='objective'):
+    def applySegmentInitialContribution(self,qubo='objective', cols=None):
         contrib = self.buildStationWeights()
         for r in range(self.board.rows):
             for n in range(self.board.cols):
+                if ( not self.board.isCell(r,n) or not self.inCols(cols,n) ): continue   # Pruned cell
                 q = list(self.board.getqb(r,n))
                 self.ApplySingleInitialContribution(q, contrib[n], qubo)
 
@@ -482,6 +593,7 @@ class QuboTrips:
             for n2 in range(self.board.cols):
                 for r2 in range(1,self.board.rows):
                     r = r2 - 1
+                    if ( not (self.board.isCell(r,n1) and self.board.isCell(r2,n2)) ): continue   # Pruned cells
                     q1 = self.board.getqb(r,n1)[0]
                     q2 = self.board.getqb(r2,n2)[0]
                     if ( q1 < q2 ):
@@ -490,7 +602,7 @@ class QuboTrips:
     # Apply segment gaps where valid
     #
     
-    def applyValidGaps(self,qubo='objective', LG=1):
+    def applyValidGaps(self,qubo='objective', LG=1, cols=None):
         hb = self.buildHomeBase()
         wgts = self.buildEndPointWeights() # Column 0 = depart, 1 = arrival
         gaps = self.buildValidGapsFromG(LG=LG)
@@ -499,8 +611,10 @@ class QuboTrips:
 
         for n1 in range(self.board.cols):
             for n2 in range(self.board.cols):
+                if ( not self.inCols(cols,n1,n2) ): continue
                 for r2 in range(1,self.board.rows):
                     r = r2 - 1
+                    if ( not (self.board.isCell(r,n1) and self.board.isCell(r2,n2)) ): continue   # Pruned cells
                     q1 = self.board.getqb(r,n1)[0]
                     q2 = self.board.getqb(r2,n2)[0]
                     if ( q1 < q2 ):
@@ -544,7 +658,7 @@ class QuboTrips:
     # ** Respect the order such that target is not confused with the previous to target
     # ** Use the G graph
     
-    def applyStart(self,qubo='objective', P=1):
+    def applyStart(self,qubo='objective', P=1, cols=None):
         wgts = self.buildEndPointWeights() # Column 0 = depart, 1 = arrival
         departure = 0
         arrival = 1
@@ -557,51 +671,59 @@ class QuboTrips:
         # Obtain the gap from the "gaps" qubo
         gap_qubo = self.board.getQubo('-gaps-')
 
+        # Check in (Start to Segment) and check out (Segment to Start) edges by (start, segment) index
+        checkIn = {}
+        checkOut = {}
+        for n1, n2, w in self.G.edges.data("weight"):
+            if ( n1.isStart() and n2.isSegment() ): checkIn[(n1.task_id-1, n2.task_id-1)] = w
+            if ( n1.isSegment() and n2.isStart() ): checkOut[(n2.task_id-1, n1.task_id-1)] = w
+
         # Traverse Qubo to apply ChkI and Cancel Gaps
         for r in range(0,self.board.rows-1): # All rows except last
             s = r + soff
             for n in range(self.board.cols):
+                if ( not self.board.isCell(r,n) ): continue   # Pruned cell
+                touched = self.inCols(cols,n)
                 #print("Start Contributions for Row",r,"Node",n,".............................")
                 valid_found = False
                 # For valid edges, Start to Segment add the check in time
-                for s1, n1, chkI in self.G.edges.data("weight"):
-                    #print("Start object id", s1.obj.id, "start row item", s ,"for row",r, "(offset is",soff,")")
-                    if ( s1.isStart() and n1.isSegment() and (n1.obj.task_id-1 == n) and (s1.obj.task_id-1==s)):
-
-                        valid_found = True
-                        qs1 = self.board.flags[r] 
-                        #qw1 = self.board.ancil[r]   
-                        q1 = self.board.getqb(r,n)[0]                    
-                        # Add Check In time
-                        (qn1,qn2) = sorted((qs1,q1))
-
-                        # Handle the first row cancelling of the initial positioning cost (unsequenced segment). For other rows, this is done
-                        # via pairwise between two segment nodes. However, for the first row, this needs to 
-                        # be handled by the Start node.
-
-                        if ( r == 0 ):
-                            # n1 departure point weight cancellation to be replaced by ChkI
-                            self.ApplyPairwiseContribution( [(qn1,qn2)], wgts[n,departure], qubo  )
-
-                        # Apply the 
-                        self.ApplyPairwiseContribution([(qn1,qn2)] , chkI, qubo=qubo)
-                        #print("Applying check in time", chkI, "with Start variable",qs1, "at node variable",q1)
-                        
-                        # If we have a previous row, cancel gaps between this node and previous nodes
-                        pr = r - 1
-                        if ( pr >= 0 ):
-                            for pn in range(self.board.cols):
-                                q2 = self.board.getqb(pr,pn)[0]    
-                                (qn1,qn2) = sorted((q1,q2))
-                                gap = gap_qubo[(qn1,qn2)]
-                                if ( gap > 0 ):
-                                    contribution = -gap  
-                                    #print("Applying cubic value", contribution,"to",qn1,qn2,qs1,qw1)
-                                    #self.ApplyTripleContribution([(qn1,qn2,qs1,qw1)], contribution, qubo='cubic-gap' )
-                                    #print("     >>> Cancelling gap", gap, "between",q2,"and",q1,"due to start",qs1)
-                                    #print(self.Ann.tg.formatSegment(self.Ann.segments[pn],0), "<==>",self.Ann.tg.formatSegment(n1,0))
-                                    self.ApplyHighOrderContribution([qn1,qn2,qs1], contribution, qubo='cubic-gap', P=P )
-                                    #print("Total variables in use: ", self.board.qubits)
+                if ( (s,n) in checkIn ):
+                    chkI = checkIn[(s,n)]
+                    valid_found = True
+                    qs1 = self.board.flags[r] 
+                    #qw1 = self.board.ancil[r]   
+                    q1 = self.board.getqb(r,n)[0]                    
+                    # Add Check In time
+                    (qn1,qn2) = sorted((qs1,q1))
+
+                    # Handle the first row cancelling of the initial positioning cost (unsequenced segment). For other rows, this is done
+                    # via pairwise between two segment nodes. However, for the first row, this needs to 
+                    # be handled by the Start node.
+
+                    if ( r == 0 and touched ):
+                        # n1 departure point weight cancellation to be replaced by ChkI
+                        self.ApplyPairwiseContribution( [(qn1,qn2)], wgts[n,departure], qubo  )
+
+                    # Apply the 
+                    if ( touched ): self.ApplyPairwiseContribution([(qn1,qn2)] , chkI, qubo=qubo)
+                    #print("Applying check in time", chkI, "with Start variable",qs1, "at node variable",q1)
+                    
+                    # If we have a previous row, cancel gaps between this node and previous nodes
+                    pr = r - 1
+                    if ( pr >= 0 ):
+                        for pn in (range(self.board.cols) if touched else sorted(cols)):
+                            if ( not self.board.isCell(pr,pn) ): continue   # Pruned cell
+                            q2 = self.board.getqb(pr,pn)[0]    
+                            (qn1,qn2) = sorted((q1,q2))
+                            gap = gap_qubo[(qn1,qn2)]
+                            if ( gap > 0 ):
+                                contribution = -gap  
+                                #print("Applying cubic value", contribution,"to",qn1,qn2,qs1,qw1)
+                                #self.ApplyTripleContribution([(qn1,qn2,qs1,qw1)], contribution, qubo='cubic-gap' )
+                                #print("     >>> Cancelling gap", gap, "between",q2,"and",q1,"due to start",qs1)
+                                #print(self.Ann.tg.formatSegment(self.Ann.segments[pn],0), "<==>",self.Ann.tg.formatSegment(n1,0))
+                                self.ApplyHighOrderContribution([qn1,qn2,qs1], contribution, qubo='cubic-gap', P=P )
+                                #print("Total variables in use: ", self.board.qubits)
 
                 # If no valid edge found between start s and segment n, then we need to apply a heavy cost
                 # to starting a trip here     
@@ -620,17 +742,18 @@ class QuboTrips:
                 valid_found = False
                 s = r + soff
                 pr = r - 1
+                if ( not self.board.isCell(pr,n) or not self.inCols(cols,n) ): continue   # Pruned cell
                 #print("End Contributions for Previous Row",pr,"Node",n,".............................")
                 # For valid edges, Segment to Start add the check out time
-                for n1, s1, chkO in self.G.edges.data("weight"):
-                    if ( s1.isStart() and n1.isSegment() and (n1.obj.task_id-1 == n) and (s1.obj.task_id-1==s)):
-                        valid_found = True
-                        qs1 = self.board.flags[r]   
-                        q1 = self.board.getqb(pr,n)[0]    # Prior row nodes                
-                        # Add Check Out time
-                        (qn1,qn2) = sorted((qs1,q1))
-                        self.ApplyPairwiseContribution([(qn1,qn2)] , chkO, qubo=qubo)
-                        #print("Applying check out time", chkO, "with Start variable",qs1, "at previous node variable",q1)
+                if ( (s,n) in checkOut ):
+                    chkO = checkOut[(s,n)]
+                    valid_found = True
+                    qs1 = self.board.flags[r]   
+                    q1 = self.board.getqb(pr,n)[0]    # Prior row nodes                
+                    # Add Check Out time
+                    (qn1,qn2) = sorted((qs1,q1))
+                    self.ApplyPairwiseContribution([(qn1,qn2)] , chkO, qubo=qubo)
+                    #print("Applying check out time", chkO, "with Start variable",qs1, "at previous node variable",q1)
 
                 # If no valid edge found between start s and segment n, then we need to apply a heavy cost
                 # to starting a trip here               
@@ -643,6 +766,103 @@ class QuboTrips:
                 #    #print("Applying bad trip between Start variable",qs1, "and previous node variable",q1)        
 
 
+    # Does a contribution on segments n touch the given columns (any contribution when cols is None)
+    def inCols(self,cols,*n):
+        if ( cols is None ): return(True)
+        for x in n:
+            if ( x in cols ): return(True)
+        return(False)
+
+    # ================================================================================================================================
+    # Incremental updates after segment edits (see routeAnneal.retimeSegment and cancelSegment)
+    #
+    # The layers depending on the segments take cols= to apply only the contributions touching those segment
+    # columns. A patch applies the difference of these contributions after and before the edit, so only the
+    # coefficients of the edited columns change. Contributions are collected with substitutions of their own
+    # (a reused substitution does not repeat its terms), then mapped to the board ancillas, new products
+    # getting new ancillas. Ancillas no longer used are left without any coefficient.
+    #
+    segmentLayers = ('applyNoMisconnect', 'applyNoStartOffBase', 'applySegmentInitialContribution', 'applyValidGaps', 'applyStart')
+
+    # Contributions of the recorded segment layers touching cols, as {qubo name: Qubo} on the board variables
+    def layerTerms(self,cols):
+        board = self.board
+        saved = (board.Qubos, board.highOrders, board.qubits, board.additional)
+        base = board.qubits
+        (board.Qubos, board.highOrders, board.additional) = ({}, {}, [])
+        try:
+            for (name, qubo, kwargs) in self.layers:
+                if ( name in self.segmentLayers ): getattr(self,name)(qubo=qubo, cols=cols, **kwargs)
+            (terms, subs) = (board.Qubos, board.highOrders)
+        finally:
+            (board.Qubos, board.highOrders, board.qubits, board.additional) = saved
+        return( self.mapAncillas(terms, subs, base) )
+
+    # Map the ancillas of collected terms (ids from base, substitutions subs) to the board substitutions
+    def mapAncillas(self,terms,subs,base):
+        board = self.board
+        ids = {}
+        for key, y in subs.items():
+            if ( key not in board.highOrders ):
+                board.highOrders[key] = board.qubits
+                board.additional.append(board.qubits)
+                board.qubits += 1
+            ids[y] = board.highOrders[key]
+        mapped = {}
+        for name, Q in terms.items():
+            M = mapped[name] = defaultdict(float)
+            for (i,j), w in Q.items():
+                M[tuple(sorted((ids[i] if i >= base else i, ids[j] if j >= base else j)))] += w
+        return(mapped)
+
+    # Apply edit() (updating the segment table in place) and patch the graph and the Qubos for the
+    # edited columns. Returns False when the board was rebuilt instead (the feasible cells changed)
+    def patchSegments(self,cols,edit):
+        cols = set(cols)
+        old = self.layerTerms(cols)
+        edit()
+        self.updateGraph(cols)
+        if ( not np.array_equal(self.buildFeasibleCells(), self.board.mask) ):
+            self.rebuildLayers()
+            return(False)
+        new = self.layerTerms(cols)
+        # The final Qubo, when already built, takes the same (normalized and scaled) difference
+        targets = [None] if self.finalQ is not None else []
+        for name in set(old) | set(new):
+            for (target, scale) in [(name, 1.0)] + [(t, self.norm * self.layerScale.get(name, 1.0)) for t in targets]:
+                Q = self.board.getQubo(target) if target is not None else self.finalQ
+                for (terms, sign) in [(new.get(name, {}), scale), (old.get(name, {}), -scale)]:
+                    for e in terms: Q[e] += sign * terms[e]
+                for e in [e for e in old.get(name, {}) if Q[e] == 0]: del Q[e]
+        return(True)
+
+    # Replay the recorded layers on a new board sized for the current segments, after a new graph
+    def rebuildLayers(self):
+        layers = self.layers
+        N = self.Ann.getTable().n
+        self.G = self.buildFltGraph()
+        self.board = qbGrid(N,N, mask=self.buildFeasibleCells(N))
+        self.layers = []
+        for (name, qubo, kwargs) in layers:
+            getattr(self,name)(qubo=qubo, **kwargs)
+            self.layers.append((name, qubo, kwargs))
+        self.finalQ = None
+
+    # Replace the graph edges of the given segments (0 based) from the segment table
+    def updateGraph(self,cols):
+        T = self.Ann.getTable()
+        ( doEdge, gaps ) = T.connections(self.params)
+        nodes = {s.task_id-1: s for s in self.Ann.segments}
+        for n in cols:
+            node = nodes[n]
+            self.G.remove_edges_from(list(self.G.in_edges(node)) + list(self.G.out_edges(node)))
+            edges = [(node, nodes[m], int(gaps[n,m])) for m in np.flatnonzero(doEdge[n])]
+            edges += [(nodes[m], node, int(gaps[m,n])) for m in np.flatnonzero(doEdge[:,n])]
+            for start in self.Ann.states:
+                if ( T.hbDep[n] ): edges.append((start, node, self.params['const_CI']))
+                if ( T.hbArr[n] ): edges.append((node, start, self.params['const_CO']))
+            self.G.add_weighted_edges_from(edges)
+
     # Return the sum of a Qubo diagonal
     def sumQii(self,Q):
         qii_sum = 0.0
@@ -793,71 +1013,58 @@ class QuboTrips:
 
         segments = self.Ann.segments
         states = self.Ann.states
+        T = self.Ann.getTable()
 
         # TODO: Consider sorting and re-indexing segments
         
         G = nx.DiGraph()
 
         # Build the segments connectivity graph. Assign the time gap to the weight value
-        
-        for n1 in segments:
-            for n2 in segments:
-                if ( n1.task_id >= n2.task_id ): continue  # This may need to be optional for other models that allow re-timing a segment
-
-                # Truth Table for edges
-                #
-                # Applicability: Creating an Edge in the Graph means that we allow two nodes to be sequenced consecutively, baring 
-                #                additional constraints.
-                # In other words: If we do not create an edge between two nodes, they will NEVER be allowed to be consecutive to each other.
-                # 
-                #    n1.arr==n2.dep   Gap(n1,n2) > 0  n2.dep is a Base  Gap > min   |  Create an Edge   |  Weight
-                #    --------------   --------------  ----------------  ----------- |  ---------------  |  ------
-                #          1                1                1               1      |        Y          |   gap,    cancellable
-                #          1                1                0               1      |        Y          |   gap,    cancellable
-                #          1                0                1               1      |        Y          |   badgap, cancellable
-                #          1                0                0               1      |        N          |   N/A
-                #          0                1                1               1      |        N          |   N/A
-                #          0                1                0               1      |        N          |   N/A
-                #          0                0                1               1      |        N          |   N/A
-                #          0                0                0               1      |        N          |   N/A
-                #          1                1                1               0      |        Y          |   badgap, cancellable
-                #          1                1                0               0      |        N          |   N/A
-                #          1                0                1               0      |        Y          |   badgap, cancellable
-                #          1                0                0               0      |        N          |   N/A
-                #          0                1                1               0      |        N          |   N/A
-                #          0                1                0               0      |        N          |   N/A
-                #          0                0                1               0      |        N          |   N/A
-                #          0                0                0               0      |        N          |   N/A
-                
-                ( doEdge, gap, cancellable ) = self.createEdge(n1,n2)
-
-                #if ( gap < 0 and doEdge ):
-                #    print("Implemented negative gap between",self.Ann.FD.formatSegment(n1,0),"and",self.Ann.FD.formatSegment(n2,0))                      
-
-                if ( doEdge ):
-                    if ( view ):
-                        l1 = n1.obj.lab + '/' + str(n1.obj.depday)
-                        l2 = n2.obj.lab + '/' + str(n2.obj.depday)
-                        G.add_weighted_edges_from([(l1,l2, abs(gap) )])
-                    else:
-                
-                        # Cancellable gap must be negative. If not cancellable, store weight as a positive
-
-                        if ( cancellable ): 
-                            gap = -abs(gap)
-                        else:
-                            gap = abs(gap)
-                    
-                        G.add_weighted_edges_from([(n1,n2, gap )])      
-                        
-                        #if ( gap < 0 ):
-                        #    print("Implemented negative gap between",self.Ann.FD.formatSegment(n1,0),"and",self.Ann.FD.formatSegment(n2,0))                      
-                else:
-                    pass
-                    #print("No edge for", self.Ann.FD.formatSegment(n1,0),"<= no connect =>", self.Ann.FD.formatSegment(n2,0)) 
+        #
+        # Truth Table for edges (createEdge, evaluated for all n1.task_id < n2.task_id pairs at once on the segment table)
+        #
+        # Applicability: Creating an Edge in the Graph means that we allow two nodes to be sequenced consecutively, baring 
+        #                additional constraints.
+        # In other words: If we do not create an edge between two nodes, they will NEVER be allowed to be consecutive to each other.
+        # 
+        #    n1.arr==n2.dep   Gap(n1,n2) > 0  n2.dep is a Base  Gap > min   |  Create an Edge   |  Weight
+        #    --------------   --------------  ----------------  ----------- |  ---------------  |  ------
+        #          1                1                1               1      |        Y          |   gap,    cancellable
+        #          1                1                0               1      |        Y          |   gap,    cancellable
+        #          1                0                1               1      |        Y          |   badgap, cancellable
+        #          1                0                0               1      |        N          |   N/A
+        #          0                1                1               1      |        N          |   N/A
+        #          0                1                0               1      |        N          |   N/A
+        #          0                0                1               1      |        N          |   N/A
+        #          0                0                0               1      |        N          |   N/A
+        #          1                1                1               0      |        Y          |   badgap, cancellable
+        #          1                1                0               0      |        N          |   N/A
+        #          1                0                1               0      |        Y          |   badgap, cancellable
+        #          1                0                0               0      |        N          |   N/A
+        #          0                1                1               0      |        N          |   N/A
+        #          0                1                0               0      |        N          |   N/A
+        #          0                0                1               0      |        N          |   N/A
+        #          0                0                0               0      |        N          |   N/A
+
+        ( doEdge, gaps ) = T.connections(self.params)     # Cancellable gaps are negative
+
+        index = np.array([s.task_id-1 for s in segments], dtype=int)  # Table rows in segments order
+        edges = []
+        for (i,j) in zip(*np.nonzero(doEdge[np.ix_(index,index)])):
+            n1 = segments[i]
+            n2 = segments[j]
+            gap = int(gaps[index[i],index[j]])
+            if ( view ):
+                l1 = n1.obj.lab + '/' + str(n1.obj.depday)
+                l2 = n2.obj.lab + '/' + str(n2.obj.depday)
+                edges.append((l1,l2, abs(gap) ))
+            else:
+                edges.append((n1,n2, gap ))
+        G.add_weighted_edges_from(edges)
 
         if ( not fltonly ):
 
+            edges = []
             for start in states:
                 for seg in segments:
                     
@@ -865,21 +1072,22 @@ class QuboTrips:
                     # Build the valid Start to leading Segments and assign the Check In value
                     # Valid for homebase only
                     
-                    if seg.obj.dep in self.Ann.HomeBases:
+                    if ( T.hbDep[seg.task_id-1] ):
                         if ( view ):
-                            G.add_weighted_edges_from([(start.task_id,seg.task_id,self.params['const_CI'])])
+                            edges.append((start.task_id,seg.task_id,self.params['const_CI']))
                         else:
-                            G.add_weighted_edges_from([(start,seg,self.params['const_CI'])])
+                            edges.append((start,seg,self.params['const_CI']))
                             
                     # Order is important: Segment->Start represents the end of a cycle
                     # Build the valid ending Segments to a Start and assign the Check Out value
                     # Valid for homebase only
                     
-                    if seg.obj.arr in self.Ann.HomeBases:
+                    if ( T.hbArr[seg.task_id-1] ):
                         if ( view ):
-                            G.add_weighted_edges_from([(seg.task_id,start.task_id,self.params['const_CO'])])
+                            edges.append((seg.task_id,start.task_id,self.params['const_CO']))
                         else:
-                            G.add_weighted_edges_from([(seg,start,self.params['const_CO'])])
+                            edges.append((seg,start,self.params['const_CO']))
+            G.add_weighted_edges_from(edges)
 
         return G
 
@@ -909,9 +1117,11 @@ class QuboTrips:
     def nextBoardQuboNodePair(self,match=None):
         for r in range(self.board.rows):
             for n1 in range(self.board.cols):
+                if ( not self.board.isCell(r,n1) ): continue   # Pruned cell
                 q1 = self.board.getqb(r,n1)[0]   
                 for r2 in range(self.board.rows):
                     for n2 in range(self.board.cols):
+                        if ( not self.board.isCell(r2,n2) ): continue
                         q2 = self.board.getqb(r2,n2)[0]
                         if ( q1 >= q2 ): continue
                         if (( match is not None ) and ( not match(r,r2))): continue
@@ -929,6 +1139,7 @@ class QuboTrips:
                 for n in range(self.board.cols):
                     if ( target is not None ):
                         if ( not target(s,r,n)): continue                    
+                        if ( not self.board.isCell(r,n) ): continue   # Pruned cell
                         q1 = self.board.getqb(r,n)[0]
                         
                         yield (s,r,n,qs1,q1)
@@ -20,12 +20,26 @@ Created on Oct. 22, 2021
 
 from dimod.binary_quadratic_model import BinaryQuadraticModel
 from tabu import TabuSampler        
-from dwave.system import DWaveSampler, EmbeddingComposite, LeapHybridSampler
+from dwave.system import DWaveSampler, FixedEmbeddingComposite, LeapHybridSampler
 import neal
+from neal.sampler import default_beta_range
 
-from quzzi.qznodes import Node, Segment, Start
+import asyncio
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import networkx as nx
+
+from quzzi.qznodes import Node, Segment, Start, SegmentTable
 from quzzi.qzfsched import schedData
 from quzzi.qubotrips import QuboTrips
+from quzzi.qzembed import embeddingCache
+from quzzi.qzprofile import profiler
+from quzzi.qzsamplers import milpSampler
+from quzzi.qzchain import chainSampler
+from quzzi.qzfix import variableFixer
+from quzzi.qzretain import retain
+from quzzi.qzstream import sampleStream
 
 class routeAnneal:
 
@@ -47,6 +61,17 @@ class routeAnneal:
     def getT(self):
         return (self.T)
     
+    # Pickle without the executor (threads cannot be sent to worker processes)
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['executor'] = None
+        return(state)
+
+    # Segment arrays (rebuilt from the segments when not yet available)
+    def getTable(self):
+        if ( self.table is None ): return SegmentTable(self.segments, self.HomeBases)
+        return (self.table)
+
     def getHomeBases(self):
         return self.HomeBases
 
@@ -54,20 +79,28 @@ class routeAnneal:
     def getHomeBaseWeightOffset(self):
         return self.HomeBaseWeightOffset
     
-    def __init__(self,dataset="",homebases={},atypes=[],depday=None):
+    def __init__(self,dataset="",homebases={},atypes=[],depday=None,cache=None):
         
         self.states = []
         self.segments = []
+        self.table = None                             # SegmentTable of the loaded segments
         self.HomeBases = homebases
         self.NotHomeBaseWeight = 0 # self.makeBaseWeight(len(self.HomeBases)+1) 
         self.FD = schedData()                         # Flight Data Object
+        self.embeddings = embeddingCache()            # QPU minor-embedding cache
+        self.executor = None                          # Executor for asynchronous solves
+        self.PM = None                                # Set partitioning model (qzpartition), used instead of the QT board when set
+        self.sampleset = None
+        self.previous = None                          # Best sequences before schedule edits, to warm start reSolve()
         # Load the data
 
         if ( type(dataset) == type(self.segments)):
             self.FD.set(dataset)
+        elif ( isinstance(dataset, schedData) ):
+            self.FD = dataset                         # Already loaded (e.g. schedData.subset)
         else:
             if ( dataset != "" ):
-                self.FD = schedData(dataset, Atypes=atypes, depDay = depday, HomeBases=self.HomeBases )
+                self.FD = schedData(dataset, Atypes=atypes, depDay = depday, HomeBases=self.HomeBases, cache=cache )
             else:
                 self.FD.set(self.buildSet1())
             
@@ -75,12 +108,21 @@ class routeAnneal:
         
         self.segments = self.FD.segments
         self.N = self.getN()
+        self.table = self.FD.getTable(self.HomeBases)
+        self.prepareSegments()
 
+    # Trip start states and segment timing for the loaded segments
+    def prepareSegments(self):
         # Create the trip Start state objects. 
         state_origin = self.N+1;
         self.states = []
         for s in range(self.N):
             self.states.append(Node(Start(state_origin+s,"start")))
+
+        # Segments built from the derived columns already have T, CI/CO and their base weights
+        if ( self.FD.derived() ):
+            self.T = self.FD.spanT()
+            return
         
         # TODO: Decide on applicability of this including self.T
         #print ("Minimum Dep", min(node.obj.deptime + ((node.obj.depday-1)) * 1440 for node in self.segments))
@@ -92,63 +134,398 @@ class routeAnneal:
         # We are not currently using this information from segments in quboTrips
         for seg in self.segments:
             seg.obj.setT(self.T)
-            seg.obj.setCI(60) # Checkin Time TODO: Parameterize this
-            seg.obj.setCO(30) # Check out time. TODO: Parameterize this
+            seg.obj.setCI(self.FD.CI) # Checkin Time TODO: Parameterize this
+            seg.obj.setCO(self.FD.CO) # Check out time. TODO: Parameterize this
             #print( seg.obj.id, seg.obj.getUT1(), seg.obj.getUT2(), seg.obj.getUT(), seg.obj.ft,seg.obj.getUT()+seg.obj.ft )
 
-    # Solver for Q 
-    # Gets Q from the final Qubo prepared in QT
-    def solve(self, 
+    # ============================================================================================
+    # Schedule edits for disruption re-solves
+    #
+    # Cancellations, and retimes keeping the departure order, patch the model in place: the segment
+    # table row, the graph edges of the segment and the Qubo coefficients of its board column
+    # (QuboTrips.patchSegments). A cancelled segment keeps its column as a trip of its own and is
+    # left out of the sequences. Additions, and retimes changing the departure order, renumber the
+    # segments and replay the recorded layers on a new board (without reloading or re-estimating
+    # the weights). The best sequences of the last solve follow the edits: reSolve() starts from them.
+    #
+    #   ra.cancelSegment(12)
+    #   ra.retimeSegment(15, deptime=820, arrtime=915)
+    #   ra.reSolve(useNeal=True, useHyb=False, num_reads=10)
+    # ============================================================================================
+
+    def retimeSegment(self, task_id, deptime, arrtime, depday=None, arrday=None):
+        n = task_id - 1
+        T = self.getTable()
+        if ( T.cancelled[n] ): raise ValueError("Segment {} is cancelled".format(task_id))
+        s = self.segments[n].obj
+        if ( depday is None ): depday = s.depday
+        if ( arrday is None ): arrday = depday + s.arrday - s.depday
+        udep = (depday-1) * 1440 + deptime
+        self.keepPrevious()
+        if ( (n > 0 and T.udep[n-1] > udep) or (n < self.N-1 and T.udep[n+1] < udep) ):
+            # Departure order changed: segments are renumbered, the segment leaves its trip
+            self.splitPrevious(task_id, keep=True)
+            items = [self.segmentItem(m) for m in range(self.N)]
+            items[n] = (n+1, s.lab, s.dep, s.arr, deptime, arrtime, depday, arrday)
+            self.renumber(items)
+            return
+        def edit():
+            self.segments[n].obj = self.newSegment(task_id, s.lab, s.dep, s.arr, deptime, arrtime, depday, arrday)
+            T.retime(n, depday, deptime, arrday, arrtime)
+        self.patch([n], edit)
+
+    def cancelSegment(self, task_id):
+        n = task_id - 1
+        self.keepPrevious()
+        self.splitPrevious(task_id)
+        self.patch([n], lambda: self.getTable().cancel(n))
+
+    # Split the previous trip through a segment around it. keep: the segment stays as a trip of its own
+    def splitPrevious(self, task_id, keep=False):
+        if ( self.previous is None ): return
+        pieces = []
+        for seq in self.previous.values():
+            piece = []
+            for t in seq:
+                if ( t == task_id ):
+                    pieces.append(piece)
+                    if ( keep ): pieces.append([t])
+                    piece = []
+                else:
+                    piece.append(t)
+            pieces.append(piece)
+        self.previous = {i: seq for i, seq in enumerate([p for p in pieces if len(p)])}
+
+    # The board gets one more row and column: segments are renumbered
+    def addSegment(self, lab, dep, arr, deptime, arrtime, depday, arrday=None):
+        if ( arrday is None ): arrday = depday if arrtime >= deptime else depday + 1
+        self.keepPrevious()
+        items = [self.segmentItem(m) for m in range(self.N)]
+        items.append((None, lab, dep, arr, deptime, arrtime, depday, arrday))
+        self.renumber(items)
+
+    # Solve again after edits, warm started from the previous sequences (see solve)
+    def reSolve(self, **kwargs):
+        kwargs.setdefault('initial', self.previous)
+        count = self.solve(**kwargs)
+        self.previous = None
+        return(count)
+
+    def keepPrevious(self):
+        if ( self.previous is None and self.sampleset is not None ):
+            self.previous = self.getSequences(self.sampleset.first)
+
+    def newSegment(self, task_id, lab, dep, arr, deptime, arrtime, depday, arrday):
+        s = Segment(task_id, lab, dep, arr, deptime, arrtime, depday, arrday, self.HomeBases)
+        s.setT(self.T)
+        s.setCI(self.FD.CI)
+        s.setCO(self.FD.CO)
+        return(s)
+
+    # (task_id, lab, dep, arr, deptime, arrtime, depday, arrday) of segment n, None once cancelled
+    def segmentItem(self, n):
+        if ( self.getTable().cancelled[n] ): return(None)
+        s = self.segments[n].obj
+        return( (s.task_id, s.lab, s.dep, s.arr, s.deptime, s.arrtime, s.depday, s.arrday) )
+
+    # Patch the model in use for edit() on the given segments (0 based)
+    def patch(self, cols, edit):
+        if ( self.PM is not None ):
+            edit()
+            self.PM.setConstraints()
+            return
+        with profiler.phase("patchSegments") as p:
+            patched = self.QT.patchSegments(cols, edit)
+            p.size(segments=len(cols), patched=patched)
+
+    # Reload the model over the given segment items (see segmentItem), renumbered in departure order.
+    # Cancelled segments (None) are dropped. The previous sequences follow the new task ids
+    def renumber(self, items):
+        items = [item for item in items if item is not None]
+        items.sort(key=lambda item: (item[6], item[4]))
+        ids = {item[0]: i+1 for i, item in enumerate(items) if item[0] is not None}
+        self.FD.set([Node(Segment(i+1, *item[1:], self.HomeBases)) for i, item in enumerate(items)])
+        self.segments = self.FD.segments
+        self.N = self.getN()
+        self.table = self.FD.getTable(self.HomeBases)
+        self.prepareSegments()
+        if ( self.previous is not None ):
+            self.previous = {k: [ids[t] for t in seq if t in ids] for k, seq in self.previous.items()}
+        if ( self.PM is not None ):
+            self.PM.setConstraints()
+            return
+        with profiler.phase("rebuildLayers") as p:
+            self.QT.rebuildLayers()
+            p.size(segments=self.N)
+
+    # Independent components of the segment graph: segments that can never be part of the same
+    # trip. Returns lists of segment indices (task_id-1), ordered by their first segment.
+    # byAtype: also split aircraft types (only for schedules loaded from a file)
+    def components(self, byAtype=False):
+        T = self.getTable()
+        (edge, weight) = T.connections(self.QT.params)
+        if ( byAtype and self.FD.cols is not None ):
+            atype = np.asarray(self.FD.cols['atype'])
+            edge &= (atype[:,None] == atype[None,:])
+        G = nx.Graph()
+        G.add_nodes_from(range(T.n))
+        G.add_edges_from(zip(*np.nonzero(edge)))
+        return( sorted(sorted(int(n) for n in c) for c in nx.connected_components(G)) )
+
+    # Build the BQM to solve from the final Qubo prepared in QT (or the set partitioning model)
+    def getBQM(self):
+        if ( self.PM is not None ): return( self.PM.getBQM() )
+
+        Q = self.QT.finalQubo()
+        
+        BQM_offset = 0 # TODO: Use the accumulated quadratic constants from the constraints
+
+        with profiler.phase("bqm") as p:
+            bqm = BinaryQuadraticModel.from_qubo(Q, offset=BQM_offset)
+            p.size(variables=bqm.num_variables, interactions=bqm.num_interactions)
+        return( bqm )
+
+    # Call the requested solver on a BQM and return its sampleset.
+    # A dimod sampler given as sampler= takes precedence over the solver flags.
+    # Remote solvers return a sampleset that resolves when the solver answers.
+    # preprocess: fix the provably optimal variables first (qzfix) and sample the reduced BQM.
+    #             The classical backends (MILP, greedy, Gurobi) take the full model.
+    # topk: keep only the k unique samples of lowest energy (qzretain). Remote answers are awaited.
+    def sample(self, bqm,
               useQPU=False, 
               useNeal=False, 
               useHyb=True,
               useGrb = False,
+              useMilp = False,
+              useGreedy = False,
+              sampler = None,
               name = "",
               time_limit = 10,
               num_reads = 100,
               chain_strength = 10000,
-              verbose=True):
-        
-        Q = self.QT.finalQubo()
-        
-        BQM_offset = 0 # TODO: Use the accumulated quadratic constants from the constraints
+              verbose=True,
+              initial_states=None,
+              preprocess=False,
+              topk=None):
 
-        bqm = BinaryQuadraticModel.from_qubo(Q, offset=BQM_offset)
+        classical = ( sampler is None and (useMilp or useGreedy or (useGrb and not (useQPU or useHyb or useNeal))) )
+        fixer = None
+        if ( preprocess and not classical ):
+            fixer = variableFixer(forced=self.QT.forcedValues() if self.PM is None else None)
+            with profiler.phase("fixVariables") as p:
+                reduced = fixer.reduce(bqm)
+                p.size(fixed=len(fixer.fixed), variables=reduced.num_variables)
+            if ( verbose ): print("Fixed", len(fixer.fixed), "of", bqm.num_variables, "variables")
+            if ( reduced.num_variables == 0 ): return( fixer.sampleset(bqm) )
+            (bqm, initial_states) = (reduced, fixer.restrict(initial_states, reduced))
 
-        self.sampleset = None
-        
-        # Call the requested solver
-        
-        if ( useQPU ):
+        with profiler.phase("sample") as p:
+            sampleset = self.sampleWith(bqm, useQPU=useQPU, useNeal=useNeal, useHyb=useHyb, useGrb=useGrb, useMilp=useMilp, useGreedy=useGreedy, sampler=sampler,
+                                        name=name, time_limit=time_limit, num_reads=num_reads, chain_strength=chain_strength,
+                                        verbose=verbose, initial_states=initial_states)
+            p.size(reads=num_reads, variables=bqm.num_variables)
+        if ( fixer is not None ): sampleset = fixer.inflate(sampleset)
+        return( retain(sampleset, topk) )
+
+    def sampleWith(self, bqm,
+              useQPU=False, 
+              useNeal=False, 
+              useHyb=True,
+              useGrb = False,
+              useMilp = False,
+              useGreedy = False,
+              sampler = None,
+              name = "",
+              time_limit = 10,
+              num_reads = 100,
+              chain_strength = 10000,
+              verbose=True,
+              initial_states=None):
+
+        if ( sampler is not None ):
+            if ( verbose ): print("Solving using the", type(sampler).__name__, "...")
+            sampleset = sampler.sample(bqm, num_reads = num_reads, **self.warmStart(sampler, initial_states))
+        elif ( useMilp ):
+            # Classical MILP (HiGHS). The set partitioning model is solved directly, the board BQM linearized
+            if ( verbose ): print("Solving using the MILP solver...")
+            sampler = milpSampler(model=self.PM)
+            sampleset = sampler.sample(bqm, time_limit = time_limit, **self.warmStart(sampler, initial_states))
+        elif ( useGreedy ):
+            # Classical constructive heuristic (qzchain), encoded in the model variables
+            if ( verbose ): print("Solving using the greedy trip chaining...")
+            sampler = chainSampler(self)
+            sampleset = sampler.sample(bqm, **self.warmStart(sampler, initial_states))
+        elif ( useQPU ):
             if ( verbose ): print("Solving using the DWaveSampler on the QPU...")
-            sampler = EmbeddingComposite(DWaveSampler(solver={'qpu': True}))
-            sampleset = sampler.sample_qubo(Q, num_reads=num_reads, chain_strength = chain_strength, label=name)
+            qpu = DWaveSampler(solver={'qpu': True})
+            # Reuse the embedding of a previous run with the same interaction structure
+            embedding = self.embeddings.get(bqm, qpu)
+            sampler = FixedEmbeddingComposite(qpu, embedding)
+            sampleset = sampler.sample(bqm, num_reads=num_reads, chain_strength = chain_strength, label=name, **self.warmStart(sampler, initial_states))
         elif ( useHyb ): 
             if ( verbose ): print("Solving using the LeapHybridSolver...", end='')
             sampler = LeapHybridSampler()
             time_limit = max(time_limit,sampler.min_time_limit(bqm))
             if ( verbose ): print( "(time limit is",time_limit,")")
-            sampleset = sampler.sample(bqm, time_limit = time_limit, label=name)
+            sampleset = sampler.sample(bqm, time_limit = time_limit, label=name, **self.warmStart(sampler, initial_states))
         elif ( useNeal ): 
             if ( verbose ): print("Solving using the SimulatedAnnealing...")
             sampler = neal.SimulatedAnnealingSampler()
-            sampleset = sampler.sample(bqm, num_reads = num_reads)
+            options = self.warmStart(sampler, initial_states)
+            if ( len(options) ):
+                # Anneal cold from the initial states: the default schedule starts hot and melts them
+                (hot, cold) = default_beta_range(bqm)
+                options.update(beta_range=(max(hot, cold/100), cold), initial_states_generator='tile')
+            sampleset = sampler.sample(bqm, num_reads = num_reads, **options)
         elif ( useGrb ): 
             if ( verbose ): print("Solving using the Gurobi Quadratic...")
             #sampler = neal.SimulatedAnnealingSampler()
-            sampleset = self.solveQGrb(Q,nreads=num_reads)
+            self.warmStart(None, initial_states)
+            sampleset = self.solveQGrb(self.QT.finalQubo(),nreads=num_reads)
         else:
             if ( verbose ): print("Solving using the TabuSampler...")
             sampler = TabuSampler()
-            sampleset = sampler.sample(bqm, num_reads = num_reads)
+            sampleset = sampler.sample(bqm, num_reads = num_reads, **self.warmStart(sampler, initial_states))
+
+        return(sampleset)
+
+    # Sampler options for a warm start: initial states are only passed to samplers that take them
+    # (neal, tabu, latencySampler over those). Others warn and start from scratch
+    def warmStart(self, sampler, initial_states):
+        if ( initial_states is None ): return( {} )
+        if ( sampler is not None and 'initial_states' in sampler.parameters ):
+            return( {'initial_states': initial_states} )
+        name = type(sampler).__name__ if sampler is not None else "Gurobi"
+        warnings.warn("{} does not take initial states: starting without them".format(name))
+        return( {} )
+
+    # Encode prior solutions into initial states of the variables of bqm. initial is one solution or a
+    # list of them, each either:
+    #   - sequences of task ids (dict or list of lists, as schedData.get_sequences)
+    #   - a full assignment {variable: 0/1} of the current model (e.g. sampleset.first.sample)
+    #   - a sampleset (all its samples)
+    # Task ids no longer in the schedule are dropped and missing segments start trips of their own.
+    # Returns (states, labels) as samples-like for initial_states, or None when nothing could be encoded
+    def initialStates(self, initial, bqm):
+        if ( initial is None ): return( None )
+        if ( hasattr(initial, 'samples') ): initial = [dict(s) for s in initial.samples()]
+        # One solution: an assignment or sequences dict, or sequences as a list of lists of task ids
+        if ( isinstance(initial, dict) or (len(initial) and isinstance(initial[0], (list, tuple))
+                                           and not isinstance(next(iter(initial[0]), None), (list, tuple))) ):
+            initial = [initial]
+
+        known = set(int(seg.obj.task_id) for seg in self.segments)
+        labels = list(bqm.variables)
+        states = []
+        for solution in initial:
+            values = list(solution.values()) if isinstance(solution, dict) else list(solution)
+            if ( len(values) and not isinstance(values[0], (list, tuple)) ):
+                x = solution                                    # Full assignment
+            else:
+                sequences = [[t for t in seq if t in known] for seq in values]
+                try:
+                    x = self.encodeSequences([seq for seq in sequences if len(seq)])
+                except ValueError as e:
+                    warnings.warn("Initial state not encoded: {}".format(e))
+                    continue
+            states.append([int(x.get(v, 0)) for v in labels])
 
-        self.sampleset = sampleset
+        if ( len(states) == 0 ): return( None )
+        return( (np.array(states, dtype=np.int8), labels) )
+
+    # Solver for Q 
+    # Gets Q from the final Qubo prepared in QT
+    # initial: prior solutions to start from (see initialStates)
+    # preprocess: sample the BQM reduced by variable fixing (see sample)
+    # topk: keep only the top k unique samples in self.sampleset (see sample)
+    def solve(self, 
+              useQPU=False, 
+              useNeal=False, 
+              useHyb=True,
+              useGrb = False,
+              useMilp = False,
+              useGreedy = False,
+              sampler = None,
+              name = "",
+              time_limit = 10,
+              num_reads = 100,
+              chain_strength = 10000,
+              verbose=True,
+              initial=None,
+              preprocess=False,
+              topk=None):
+        
+        bqm = self.getBQM()
+
+        self.sampleset = None
+        
+        # Call the requested solver
+        
+        self.sampleset = self.sample(bqm, useQPU=useQPU, useNeal=useNeal, useHyb=useHyb, useGrb=useGrb, useMilp=useMilp, useGreedy=useGreedy, sampler=sampler,
+                                     name=name, time_limit=time_limit, num_reads=num_reads, chain_strength=chain_strength,
+                                     verbose=verbose, initial_states=self.initialStates(initial, bqm), preprocess=preprocess, topk=topk)
         
         count = 0
         for res in self.sampleset.data(): count += 1
         
         return (count)
 
+    # Asynchronous solver
+    # Returns a concurrent.futures.Future resolving to the sampleset, so that several
+    # BQMs may be in flight at once. Remote solvers (QPU, hybrid) are submitted right away
+    # and only their answer is awaited on the executor. Local samplers run on the executor.
+    # Unlike solve(), self.sampleset is not updated: use future.result().
+    def solveAsync(self, 
+              useQPU=False, 
+              useNeal=False, 
+              useHyb=True,
+              useGrb = False,
+              useMilp = False,
+              useGreedy = False,
+              sampler = None,
+              name = "",
+              time_limit = 10,
+              num_reads = 100,
+              chain_strength = 10000,
+              verbose=True,
+              executor=None,
+              bqm=None,
+              initial=None,
+              preprocess=False,
+              topk=None):
+
+        if ( executor is None ): executor = self.getExecutor()
+
+        # Build in the calling thread: QT is not thread safe
+        if ( bqm is None ): bqm = self.getBQM()
+
+        options = dict(useQPU=useQPU, useNeal=useNeal, useHyb=useHyb, useGrb=useGrb, useMilp=useMilp, useGreedy=useGreedy, sampler=sampler,
+                       name=name, time_limit=time_limit, num_reads=num_reads, chain_strength=chain_strength,
+                       verbose=verbose, initial_states=self.initialStates(initial, bqm), preprocess=preprocess)
+
+        # Preprocessing re-inflates the answer: remote solves then wait on the executor as well
+        if ( sampler is None and (useQPU or useHyb) and not preprocess ):
+            sampleset = self.sample(bqm, **options)
+            return( executor.submit(resolved, sampleset, topk) )
+        
+        return( executor.submit(self.sample, bqm, topk=topk, **options) )
+
+    # Awaitable version of solveAsync for use within asyncio
+    async def solveAwait(self, **kwargs):
+        return( await asyncio.wrap_future(self.solveAsync(**kwargs)) )
+
+    # Streaming solver on a local sampler (neal unless sampler= is given)
+    # Iterate the returned sampleStream for a report per batch of reads; self.sampleset is set
+    # when the stream ends (all reads, target energy, time_limit or loop left)
+    def solveStream(self, **kwargs):
+        return( sampleStream(self, **kwargs) )
+
+    # Shared executor for asynchronous solves
+    def getExecutor(self, max_workers=8):
+        if ( self.executor is None ):
+            self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        return(self.executor)
+
     '''
     # Experimental Quadratic solver using Gurobi
     
@@ -195,23 +572,24 @@ class routeAnneal:
                             obj += Q[(i,j)] * x[i] * x[j];
 
                     # Add constraints : 
-                    # 1 - Exactly N variables within the range N * N must be set to 1
-                    EN = self.QT.board.cols
+                    # 1 - Exactly N board variables must be set to 1 (pruned cells have no variable)
+                    board = self.QT.board
+                    EN = board.cols
                     #model.addConstrs((quicksum(smatr[i,j] * v[j] for i in met) == 0) for j in reactions
                     #m.addConstrs([x[i] <= 1 for i in range(EN * EN)], name='coverage')
-                    print("Constraint: Sum of", EN*EN, "variables must less or equal to",EN)
-                    m.addConstr(gp.quicksum(x[i] for i in range(EN*EN))==EN, name="coverage")
+                    print("Constraint: Sum of", board.cells, "variables must less or equal to",EN)
+                    m.addConstr(gp.quicksum(x[int(i)] for i in board.set)==EN, name="coverage")
                     #m.addConstr(gp.quicksum(x[i] for i in range(EN*EN))>=EN-1, name="coverage")
                     print("Constraint: No more than", EN/2, "start flags")
-                    m.addConstr(gp.quicksum(x[i] for i in range(EN*EN,EN*EN+EN)) <= EN/2, name="coverage")
+                    m.addConstr(gp.quicksum(x[int(i)] for i in board.flags) <= EN/2, name="coverage")
 
                     print("Constraint: Sum of each", EN, "row variables must be equal to 1")
                     for r in range(EN):
-                        m.addConstr(gp.quicksum(x[c+r*EN] for c in range(EN)) == 1.0, name="row=1")
+                        m.addConstr(gp.quicksum(x[int(i)] for i in board.getr(r)) == 1.0, name="row=1")
 
                     print("Constraint: Sum of each", EN, "column variables must be equal to 1")
                     for c in range(EN):
-                        m.addConstr(gp.quicksum(x[c+r*EN] for r in range(EN)) == 1.0, name="col=1")
+                        m.addConstr(gp.quicksum(x[int(i)] for i in board.getc(c)) == 1.0, name="col=1")
 
 
                     # Set our complete objective
@@ -255,12 +633,45 @@ class routeAnneal:
                 print('Encountered an attribute error')
 '''
         
+    # Encode sequences of task ids into the variables of the model in use
+    def encodeSequences(self,sequences):
+        if ( self.PM is not None ): return( self.PM.encodeSequences(sequences) )
+        return( self.QT.encodeSequences(sequences) )
+
+    # Sequences of task ids of a (sample, energy) result for the model in use
+    # Cancelled segments are left out
+    def getSequences(self,result):
+        if ( self.PM is not None ):
+            sequences = self.PM.sequences(result[0])
+        else:
+            sequences = self.FD.get_sequences(self, result)
+        cancelled = self.getTable().cancelled
+        if ( not cancelled.any() ): return(sequences)
+        sequences = [[t for t in seq if not cancelled[t-1]] for seq in sequences.values()]
+        return( {i: seq for i, seq in enumerate([seq for seq in sequences if len(seq)])} )
+
     def print_all(self,max_v=3,solver="unknown"):
-        self.FD.print_all(self.sampleset,max_v,QT=self.QT)
-        self.FD.print_sequences(self.sampleset, max_v, solver=solver)
+        if ( self.PM is not None ):
+            for res in self.sampleset.data():
+                print("Energy :", res[1], "Partition:", self.PM.isPartition(res[0]), "Feasible:", self.PM.isFeasible(res[0]),
+                      "Fallback:", self.PM.fallbacks(res[0]))
+                for seq in self.getSequences(res).values():
+                    print("Trip", seq)
+                max_v -= 1
+                if ( max_v <= 0 ): break
+            return
+        with profiler.phase("decode") as p:
+            self.FD.print_all(self.sampleset,max_v,QT=self.QT)
+            self.FD.print_sequences(self.sampleset, max_v, solver=solver, QT=self.QT)
+            p.size(samples=max_v)
 
 # Utilities and add-ons
 
+# Wait for a (possibly remote) sampleset to be answered
+def resolved(sampleset, topk=None):
+    sampleset.resolve()
+    return( retain(sampleset, topk) )
+
 from io import StringIO 
 import sys
 
@@ -19,6 +19,13 @@ Created on Oct. 22, 2021
 '''
 
 import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+from tabu import TabuSampler        
+import neal
+
+from quzzi.qzprofile import profiler
+from quzzi.qzretain import retain
 
 #==============================================================================================#
 # s2fsched (c) 2020 Mario Guzzi                                                         #
@@ -32,11 +39,16 @@ import time
 class bench:
     
     
-    def __init__(self,A,task_id=0):
+    def __init__(self,A,task_id=0,store=None,topk=None):
         self.task_id = task_id
         self.A = A
-        # [QPU,Neal,Hyb]
-        self.solvers = {"tabu":[0,0,0,0], "neal":[0,1,0,0], "qpu":[1,0,0,0], "hyb":[0,0,1,0], "grb":[0,0,0,1], "def":[0,0,0,0]}
+        # Structured result store (resultStore). When set, results only keep the compact best sample
+        self.store = store
+        # Samplesets kept with their top k unique samples only (qzretain), reduced as they come back
+        self.topk = topk
+        # [QPU,Neal,Hyb,Grb,Milp,Greedy]
+        self.solvers = {"tabu":[0,0,0,0,0,0], "neal":[0,1,0,0,0,0], "qpu":[1,0,0,0,0,0], "hyb":[0,0,1,0,0,0], "grb":[0,0,0,1,0,0],
+                        "milp":[0,0,0,0,1,0], "greedy":[0,0,0,0,0,1], "def":[0,0,0,0,0,0]}
         # Profiles
         self.profiles = []
         
@@ -52,6 +64,10 @@ class bench:
         # Output collection
         self.output = []
 
+        # Phases recorded before the benchmark (loading and building the model)
+        self.phaseMark = len(profiler.records)
+        self.buildPhases = profiler.export()
+
     
     def clear(self):
         self.profiles.clear()
@@ -131,10 +147,13 @@ class bench:
                                  useNeal=selection[1], 
                                  useHyb=selection[2],
                                  useGrb=selection[3],
+                                 useMilp=selection[4],
+                                 useGreedy=selection[5],
                           name=name,
                           time_limit = rtime,
                           num_reads = int(reads),
-                          chain_strength = chain,verbose=verbose)
+                          chain_strength = chain,verbose=verbose,
+                          topk=self.topk)
 
                     t2 = time.time()
                     #print("Time 2 = " + str(t2))
@@ -149,55 +168,175 @@ class bench:
                 # TODO: What to store for a result when no result is obtained? 
                 #       Currently we record nothing.
             else:
-
-                for res in self.A.sampleset.data():
-                #print(A.sampleset.data())
-                    self.energy = res[1]
-                    self.results[self.count]={}
-                    self.results[self.count]['name'] = name
-                    self.results[self.count]['params'] = (rtime,reads,chain)
-                    self.results[self.count]['energy'] = self.energy
-                    self.results[self.count]['result'] = res
-                    self.results[self.count]['sampleset'] = self.A.sampleset
-                    #self.results[self.count]['routes'] = self.A.FD.getRoutes(self.A.sampleset)
-                    self.results[self.count]['starttime'] = t1
-                    self.results[self.count]['time'] = t2 - t1
-                    self.results[self.count]['better'] = False
-                    self.results[self.count]['best_energy'] = (self.results[self.count-1]['best_energy'] if self.count > 0 else  self.energy )
-                    self.results[self.count]['atime'] = t2 - self.results[0]['starttime']
-                    self.results[self.count]['nodes'] = self.A.QT.board.cols 
-                    self.results[self.count]['vars'] = self.A.QT.board.qubits
-                    #self.results[self.count][''] = 
-                    #self.results[self.count][''] = 
-                    
-                    
-                    
-                    if ( verbose ):
-                        print("Energy",self.energy)
-
-                    if ( self.energy < self.best_energy ):
-                        self.results[self.count]['better'] = True
-                        self.results[self.count]['best_energy'] = self.energy
-                        self.best_energy = self.energy
-                        self.best_result = self.count
-                        self.best_solver = solv
-                        self.best_profile = name
-                        self.best_time = t2-t1
-                        if ( verbose ): 
-                            self.A.print_all(max_v=max_v,solver=solv)
-
-                    # Log the result
-                    #self.logResult(name,solv,self.count)
-
-                    break;
-
-                self.count += 1
+                self.record(name, solv, rtime, reads, chain, self.A.sampleset, t1, t2, max_v=max_v, verbose=verbose)
                     
         if ( q is not None ):
             q.put(task_id,self)
                     
         #return(self)
 
+    # Concurrent version of process
+    # Independent profile combinations run on a bounded pool of workers: local samplers
+    # (neal, tabu) in separate processes, remote solvers (qpu, hyb) asynchronously.
+    # Results are collected in the same order as process() would produce them.
+    
+    def processConcurrent(self,max_v=1,verbose=True,task_id=None, q=None, workers=4):
+
+        bqm = self.A.getBQM()   # Built once, shipped to every worker
+        
+        with ProcessPoolExecutor(max_workers=workers) as procs, ThreadPoolExecutor(max_workers=workers) as threads:
+
+            jobs = []
+            for job in self.next():
+                (name, prof, solv, selection, rtime, reads, chain ) = job
+                if ( verbose ):
+                    print("Submitting Profile: {:16} Solver: {:8} Time: {} -- Reads: {} -- Chain: {}".format(name, solv, rtime, int(reads),chain))
+                jobs.append((job, self.submit(procs, threads, bqm, job)))
+
+            for (job, future) in jobs:
+                (name, prof, solv, selection, rtime, reads, chain ) = job
+
+                maxtry = 3
+                tries = 0
+                result = None
+                while(tries < maxtry):
+
+                    if ( tries ): 
+                        print( "Warning: Retry #",tries,"...")
+                        future = self.submit(procs, threads, bqm, job)
+
+                    try:
+                        result = future.result()
+                        break
+                    except Exception as e:
+                        tries += 1
+                        print("Warning: Error reaching solver:", e)
+
+                if ( result is None ):
+                    print("Error: Could not recover from errors. Moving on...")
+                else:
+                    (sampleset, t1, t2) = result
+                    profiler.add("sample", t2 - t1, reads=int(reads), solver=solv)   # Measured by the worker
+                    self.record(name, solv, rtime, reads, chain, sampleset, t1, t2, max_v=max_v, verbose=verbose)
+
+        if ( q is not None ):
+            q.put(task_id,self)
+
+    # Submit one profile combination. The future resolves to (sampleset, t1, t2)
+    
+    def submit(self, procs, threads, bqm, job):
+        (name, prof, solv, selection, rtime, reads, chain ) = job
+
+        if ( selection[0] or selection[2] or selection[3] or selection[4] or selection[5] ):
+            # Remote solvers (and the classical ones, which need the annealer's model): in flight on the annealer's asynchronous solve
+            t1 = time.time()
+            future = self.A.solveAsync(useQPU=selection[0], 
+                                       useNeal=selection[1], 
+                                       useHyb=selection[2],
+                                       useGrb=selection[3],
+                                       useMilp=selection[4],
+                                       useGreedy=selection[5],
+                                       name=name,
+                                       time_limit = rtime,
+                                       num_reads = int(reads),
+                                       chain_strength = chain,
+                                       verbose=False,
+                                       executor=threads,
+                                       bqm=bqm,
+                                       topk=self.topk)
+            # Time stamp the answer when it arrives, without holding a worker thread
+            timed = Future()
+            def arrived(f):
+                try:
+                    timed.set_result((f.result(), t1, time.time()))
+                except Exception as e:
+                    timed.set_exception(e)
+            future.add_done_callback(arrived)
+            return( timed )
+
+        # Local samplers: one process each
+        return( procs.submit(sampleLocal, bqm, selection[1], int(reads), self.topk) )
+
+    # Record a result for a profile combination
+    
+    def record(self, name, solv, rtime, reads, chain, sampleset, t1, t2, max_v=1, verbose=True):
+
+        for res in sampleset.data():
+        #print(A.sampleset.data())
+            self.energy = res[1]
+            self.results[self.count]={}
+            self.results[self.count]['name'] = name
+            self.results[self.count]['params'] = (rtime,reads,chain)
+            self.results[self.count]['energy'] = self.energy
+            if ( self.store is None ):
+                self.results[self.count]['result'] = res
+                self.results[self.count]['sampleset'] = sampleset
+            else:
+                self.results[self.count]['sample'] = self.store.compact(res.sample)
+            #self.results[self.count]['routes'] = self.A.FD.getRoutes(self.A.sampleset)
+            self.results[self.count]['starttime'] = t1
+            self.results[self.count]['time'] = t2 - t1
+            self.results[self.count]['better'] = False
+            self.results[self.count]['best_energy'] = (self.results[self.count-1]['best_energy'] if self.count > 0 else  self.energy )
+            self.results[self.count]['atime'] = t2 - self.results[0]['starttime']
+            self.results[self.count]['nodes'] = self.A.QT.board.cols 
+            self.results[self.count]['vars'] = self.A.QT.board.qubits if self.A.PM is None else self.A.getBQM().num_variables
+            if ( profiler.enabled ):
+                # Phases measured since the previous result
+                self.results[self.count]['phases'] = profiler.export(self.phaseMark)
+                self.phaseMark = len(profiler.records)
+            #self.results[self.count][''] = 
+            #self.results[self.count][''] = 
+            
+            
+            
+            if ( verbose ):
+                print("Energy",self.energy)
+
+            if ( self.energy < self.best_energy ):
+                self.results[self.count]['better'] = True
+                self.results[self.count]['best_energy'] = self.energy
+                self.best_energy = self.energy
+                self.best_result = self.count
+                self.best_solver = solv
+                self.best_profile = name
+                self.best_time = t2-t1
+                if ( verbose ): 
+                    self.A.sampleset = sampleset
+                    self.A.print_all(max_v=max_v,solver=solv)
+
+            # Log the result
+            #self.logResult(name,solv,self.count)
+            if ( self.store is not None ):
+                self.storeResult(solv, self.count, reads=int(reads), occurrences=int(res.num_occurrences))
+
+            break;
+
+        self.count += 1
+
+    # Write one result to the structured store
+    def storeResult(self,solver,instance,**extra):
+        r = self.results[instance]
+        (rtime,reads,chain) = r['params']
+        rec = {'benchmark': r['name'],
+               'solver': solver,
+               'task_id': self.task_id,
+               'resid': instance,
+               'time_limit': rtime,
+               'num_reads': reads,
+               'chain': chain,
+               'energy': r['energy'],
+               'better': r['better'],
+               'best_energy': r['best_energy'],
+               'time': r['time'],
+               'atime': r['atime'],
+               'nodes': r['nodes'],
+               'vars': r['vars'],
+               'sample': r['sample']}
+        if ( 'phases' in r ): rec['phases'] = r['phases']
+        rec.update(extra)
+        self.store.write(rec)
+
         # Logging functions
 
     # LogString: 
@@ -256,3 +395,16 @@ class bench:
 
         return out
 
+# Worker for local samplers, run in a separate process by processConcurrent
+# Returns (sampleset, t1, t2) measured within the worker, the sampleset reduced to topk
+
+def sampleLocal(bqm, useNeal, num_reads, topk=None):
+    t1 = time.time()
+    if ( useNeal ):
+        sampler = neal.SimulatedAnnealingSampler()
+    else:
+        sampler = TabuSampler()
+    sampleset = sampler.sample(bqm, num_reads = num_reads)
+    sampleset.resolve()
+    t2 = time.time()
+    return(retain(sampleset, topk), t1, t2)
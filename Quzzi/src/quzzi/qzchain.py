@@ -0,0 +1,169 @@
+#   Copyright 2021 Mario Guzzi
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+'''
+Created on Oct. 19, 2026
+
+@author: Mario Guzzi
+'''
+
+import numpy as np
+import dimod
+
+from quzzi.qzpartition import tripEnumerator
+
+#==============================================================================================#
+# class tripChainer: Constructive trip chaining heuristic                                      #
+#                                                                                              #
+# Classical baseline and warm start for the annealers, over the segment connection matrix:     #
+#   1) Greedy chaining: segments in departure order join the chain whose last segment          #
+#      connects with the smallest gap, or start a new chain. Chains started at a base are kept #
+#      for segments that can still get back to one: a segment that cannot joins a chain        #
+#      already open (or starts one when it departs from a base), so closed trips stay closed   #
+#   2) Dynamic programming: each chain is re-split into trips at home base stops, minimizing   #
+#      the segments left in open trips (not from and back to a base), then the trip costs      #
+#      (check in + gaps + check out, as tripEnumerator) within max_duty                        #
+#                                                                                              #
+# Trips that cannot be closed (the schedule does not allow it, e.g. at the horizon) are kept   #
+# in open as sequences of task ids.                                                            #
+#                                                                                              #
+# The result is sequences of task ids (as schedData.get_sequences), encoded in the variable    #
+# layout of the model with routeAnneal.encodeSequences.                                        #
+#                                                                                              #
+#==============================================================================================#
+
+class tripChainer:
+
+    def __init__(self, table, params, max_duty=None):
+        self.T = table
+        self.params = params
+        self.max_duty = max_duty
+        self.E = tripEnumerator(table, params)
+        self.open = []                  # Trips not closed at a base (task ids), see solve
+
+    # Greedy chaining by minimal gap, keeping chains closable at a base. Returns chains of segment indices
+    def chain(self):
+        T = self.T
+        (edge, weight) = T.connections(self.params)
+        edge &= (T.gaps() >= self.params['const_min_connect'])
+        closes = self.E.homeLegs([np.flatnonzero(edge[n]) for n in range(T.n)]) <= T.n
+        chains = []
+        based = []                      # Chain started at a base and can still close
+        for n in np.lexsort((T.task_id, T.udep)):
+            best = None
+            bestKey = None
+            for c, chain in enumerate(chains):
+                m = chain[-1]
+                if ( not edge[m,n] ): continue
+                # A base departure that cannot get back does not spoil a closable chain
+                if ( T.hbDep[n] and based[c] and not closes[n] ): continue
+                key = (based[c] != closes[n], T.udep[n] - T.uarr[m])
+                if ( bestKey is None or key < bestKey ):
+                    best = c
+                    bestKey = key
+            if ( best is None ):
+                chains.append([int(n)])
+                based.append(bool(T.hbDep[n] and closes[n]))
+            else:
+                chains[best].append(int(n))
+                based[best] = based[best] and bool(closes[n])
+        return(chains)
+
+    # Is a piece of chain open: not from a base departure to a base arrival
+    def isOpen(self, trip):
+        return( not (self.T.hbDep[trip[0]] and self.T.hbArr[trip[-1]]) )
+
+    # Longest duty fitting a board pruned at const_max_trip (None when not pruned)
+    @staticmethod
+    def boardDuty(params, max_duty=None):
+        if ( max_duty is None and params['const_max_trip'] > 0 ):
+            max_duty = params['const_CI'] + params['const_max_trip'] + params['const_CO']
+        return(max_duty)
+
+    def duty(self, trip):
+        T = self.T
+        return( self.params['const_CI'] + T.uarr[trip[-1]] - T.udep[trip[0]] + self.params['const_CO'] )
+
+    # (segments left open, cost) of a piece of chain
+    def pieceCost(self, piece):
+        return( np.array([len(piece) if self.isOpen(piece) else 0, self.E.cost(piece)]) )
+
+    # Best split of a chain into trips, cutting only at home base stops. Costs compare the segments
+    # left in open trips first
+    def split(self, chain):
+        T = self.T
+        k = len(chain)
+        cuts = [0] + [j for j in range(1, k) if T.hbArr[chain[j-1]] and T.hbDep[chain[j]]] + [k]
+        best = {0: ((0, 0), None)}
+        for j in cuts[1:]:
+            for i in cuts:
+                if ( i >= j or i not in best ): continue
+                piece = chain[i:j]
+                if ( self.max_duty is not None and self.duty(piece) > self.max_duty and j - i > 1 ): continue
+                cost = tuple(best[i][0] + self.pieceCost(piece))
+                if ( j not in best or cost < best[j][0] ): best[j] = (cost, i)
+            if ( j not in best ):
+                # No split within max_duty: keep the cheapest one
+                best[j] = min((tuple(best[i][0] + self.pieceCost(chain[i:j])), i) for i in cuts if i < j and i in best)
+        trips = []
+        j = k
+        while ( j > 0 ):
+            i = best[j][1]
+            trips.append(chain[i:j])
+            j = i
+        return( trips[::-1] )
+
+    # Sequences of task ids, ordered by first departure. The open trips are also listed in open
+    def solve(self):
+        trips = [trip for chain in self.chain() for trip in self.split(chain)]
+        trips.sort(key=lambda trip: (self.T.udep[trip[0]], trip[0]))
+        self.open = [[int(self.T.task_id[n]) for n in trip] for trip in trips if self.isOpen(trip)]
+        return( {i: [int(self.T.task_id[n]) for n in trip] for i, trip in enumerate(trips)} )
+
+    def cost(self, sequences):
+        return( sum(self.E.cost([t-1 for t in seq]) for seq in sequences.values()) )
+
+#==============================================================================================#
+# class chainSampler: tripChainer as a dimod sampler (bench solver and energy baseline)        #
+#                                                                                              #
+# Returns the heuristic solution encoded in the routeAnneal model variables, with its energy   #
+# on the given BQM. On a pruned board (const_max_trip), trips are limited to the pruning       #
+# horizon unless max_duty is given.                                                            #
+#                                                                                              #
+#==============================================================================================#
+
+class chainSampler(dimod.Sampler):
+
+    def __init__(self, ra, max_duty=None):
+        self.ra = ra
+        self.max_duty = max_duty
+
+    @property
+    def parameters(self):
+        return {'num_reads': []}
+
+    @property
+    def properties(self):
+        return {'heuristic': 'greedy chaining and dynamic programming split'}
+
+    # num_reads is accepted for compatibility with the other samplers: the heuristic is deterministic
+    def sample(self, bqm, num_reads=1, **parameters):
+        ra = self.ra
+        params = ra.QT.params
+        chainer = tripChainer(ra.getTable(), params, tripChainer.boardDuty(params, self.max_duty))
+        sequences = chainer.solve()
+        x = ra.encodeSequences(sequences)
+        labels = list(bqm.variables)
+        sample = [x.get(v, 0) for v in labels]
+        return( dimod.SampleSet.from_samples_bqm(([sample], labels), bqm, info={'sequences': sequences, 'open': chainer.open}) )
@@ -0,0 +1,109 @@
+#   Copyright 2021 Mario Guzzi
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+'''
+Created on Oct. 19, 2026
+
+@author: Mario Guzzi
+'''
+
+from quzzi.qzanneal import routeAnneal
+from quzzi.tripModel import tripModel
+from quzzi.qzprofile import profiler
+
+#==============================================================================================#
+# class componentSolver: Decomposition of the flight network into independent sub-problems     #
+#                                                                                              #
+# Segments in different components of the segment graph (routeAnneal.components) can never   #
+# be sequenced in the same trip, yet share one N x N board. Each component gets its own        #
+# routeAnneal and QuboTrips (with the parent params), the sub-problems are solved in parallel  #
+# with solveAsync and the sequences are merged back with the parent task ids.                 #
+#                                                                                              #
+# Components of a single segment are returned as a sequence of their own without solving.    #
+#                                                                                              #
+# Usage:                                                                                       #
+#                                                                                              #
+#   ra = routeAnneal(dataset="DS2.csv", homebases={"LCA":1})                                   #
+#   tripModel().annealer(ra)                                                                   #
+#   C = componentSolver(ra, byAtype=True)                                                      #
+#   sequences = C.solve(useNeal=True, useHyb=False, num_reads=100)                             #
+#                                                                                              #
+#==============================================================================================#
+
+class componentSolver:
+
+    # ra      : parent routeAnneal with its params set (e.g. tripModel().annealer(ra))
+    # byAtype : also split aircraft types
+    # model   : model class applied to each sub-problem (annealer() then setConstraints())
+    def __init__(self, ra, byAtype=False, model=tripModel):
+        self.ra = ra
+        self.byAtype = byAtype
+        self.model = model
+        self.index = []             # Parent segment indices per component
+        self.parts = []             # routeAnneal per component (None for single segments)
+        self.samplesets = []
+
+    def build(self):
+        ra = self.ra
+        with profiler.phase("components") as p:
+            self.index = ra.components(byAtype=self.byAtype)
+            p.size(components=len(self.index), largest=max([len(c) for c in self.index], default=0))
+        self.parts = []
+        for comp in self.index:
+            if ( len(comp) < 2 ):
+                self.parts.append(None)
+                continue
+            sub = routeAnneal(dataset=ra.FD.subset(comp), homebases=ra.HomeBases)
+            model = self.model().annealer(sub)
+            sub.QT.params.update(ra.QT.params)
+            sub.QT.commitParams()
+            model.setConstraints()
+            self.parts.append(sub)
+        return(self.parts)
+
+    # Largest sub-problem (segments), to compare with ra.N
+    def largest(self):
+        return( max([len(c) for c in self.index], default=0) )
+
+    # Solve all components in parallel. Takes the routeAnneal.solve options.
+    # Returns the merged sequences (see sequences())
+    def solve(self, executor=None, **kwargs):
+        if ( len(self.parts) == 0 ): self.build()
+        if ( executor is None ): executor = self.ra.getExecutor()
+        futures = []
+        for sub in self.parts:
+            # BQMs are built here: QT is not thread safe
+            futures.append( sub.solveAsync(executor=executor, bqm=sub.getBQM(), **kwargs) if sub is not None else None )
+        self.samplesets = []
+        for sub, future in zip(self.parts, futures):
+            sampleset = future.result() if future is not None else None
+            if ( sub is not None ): sub.sampleset = sampleset
+            self.samplesets.append(sampleset)
+        return( self.sequences() )
+
+    # Sum of the best energies of the sub-problems
+    def energy(self):
+        return( sum(ss.first.energy for ss in self.samplesets if ss is not None) )
+
+    # Merge the best sequences of each component, as schedData.get_sequences with parent task ids
+    def sequences(self):
+        merged = {}
+        for comp, sub, sampleset in zip(self.index, self.parts, self.samplesets):
+            if ( sub is None ):
+                merged[len(merged)] = [comp[0]+1]
+                continue
+            best = sampleset.first
+            for seq in sub.FD.get_sequences(sub, (best.sample, best.energy)).values():
+                merged[len(merged)] = [comp[t-1]+1 for t in seq]
+        return(merged)
@@ -0,0 +1,117 @@
+#   Copyright 2021 Mario Guzzi
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+'''
+Created on Oct. 19, 2026
+
+@author: Mario Guzzi
+'''
+
+import numpy as np
+
+from quzzi.qbgrid import qbGrid
+from quzzi.qzprofile import profiler
+
+#==============================================================================================#
+# class quboConditioner: Coefficient dynamic range of the board Qubo                           #
+#                                                                                              #
+# Penalty weights are set from the objective bound HX (tripModel.calcBaseWeights) instead of   #
+# the fixed 10^sigdigits of makeHamilWeights, to the smallest values keeping their dominance:  #
+#   - one unit of any constraint violation costs margin * HX: const_bad (misconnects, bad      #
+#     gaps, off base starts) and structure HA (one node per row and column, must start)        #
+#   - substitutions H0 : margin * largest cubic gap term they guard (bad or valid gap)         #
+#                                                                                              #
+# The constraints share one tier: ranking them (as the fixed weights did) widens the range     #
+# without changing which solutions are feasible.                                               #
+#                                                                                              #
+# The layers are rebuilt with the tightened weights, and the coefficient ranges of each layer  #
+# and of the problem Qubo are reported before and after.                                       #
+#                                                                                              #
+# Usage:                                                                                       #
+#                                                                                              #
+#   ra = routeAnneal(dataset="DS2b.csv", homebases={"LCA":1}, depday=[1])                      #
+#   C = quboConditioner(tripModel().annealer(ra), margin=2.0)                                  #
+#   C.condition()                                   # Instead of setConstraints()              #
+#   C.report()                                                                                 #
+#                                                                                              #
+#==============================================================================================#
+
+class quboConditioner:
+
+    def __init__(self, model, margin=2.0):
+        self.model = model
+        self.margin = margin
+        self.before = None              # Ranges before conditioning (None when the layers were not built)
+        self.after = None
+        self.weights = {}
+
+    # Nonzero coefficient count, smallest and largest magnitude of a Qubo
+    def range(self, Q):
+        a = np.abs(np.fromiter(Q.values(), dtype=float, count=len(Q)))
+        a = a[a > 0]
+        if ( len(a) == 0 ): return( (0, 0.0, 0.0) )
+        return( (len(a), float(a.min()), float(a.max())) )
+
+    # Ranges of each board layer and of the (normalized) problem Qubo
+    def ranges(self):
+        QT = self.model.A.QT
+        ranges = {qubo: self.range(Q) for qubo, Q in QT.board.Qubos.items()}
+        ranges['problem'] = self.range(QT.finalQubo())
+        return(ranges)
+
+    # Dynamic range (largest over smallest magnitude) of the problem Qubo
+    def dynamicRange(self, ranges):
+        (n, low, high) = ranges['problem']
+        return( high / low if low > 0 else 0.0 )
+
+    # Tightened hamilWeights and const_bad from the objective bound
+    def tighten(self):
+        model = self.model
+        QT = model.A.QT
+        m = self.margin
+        W = model.makeHamilWeights(7)
+        (HB, HC, HD) = (1.0, 1.0, 1.0)
+        bad = m * W.HX
+        W.HB = HB
+        W.HC = HC
+        W.HD = HD
+        W.H0 = m * HD * max(bad, QT.params['const_max_connect'])
+        W.HA = bad
+        W.HM = W.HA / abs(QT.params['const_must_start'])
+        self.weights = {'const_bad': bad, 'HX': W.HX, 'HA': W.HA, 'H0': W.H0, 'HB': W.HB, 'HC': W.HC, 'HD': W.HD, 'HM': W.HM}
+        return(W, bad)
+
+    # Rebuild the layers with the tightened weights. Returns the dynamic range achieved
+    def condition(self):
+        QT = self.model.A.QT
+        self.before = self.ranges() if len(QT.board.Qubos) else None
+        with profiler.phase("condition"):
+            (W, bad) = self.tighten()
+            QT.params['const_bad'] = bad
+            QT.commitParams()
+            # New board: the substitutions of a previous build would not repeat their constraints
+            QT.board = qbGrid(QT.board.rows, QT.board.cols, mask=QT.board.mask)
+            self.model.setConstraints(W, base="conditioned{:g}".format(self.margin))
+            QT.commitQubo()
+        self.after = self.ranges()
+        return( self.dynamicRange(self.after) )
+
+    def report(self):
+        print("Weights:", ", ".join("{}={:.6g}".format(k, v) for k, v in self.weights.items()))
+        print("{:14} {:>8} {:>12} {:>12} {:>12} {:>12}".format("layer", "terms", "min", "max", "range", "before"))
+        for qubo, (n, low, high) in self.after.items():
+            before = ""
+            if ( self.before is not None and qubo in self.before and self.before[qubo][1] > 0 ):
+                before = "{:12.4g}".format(self.before[qubo][2] / self.before[qubo][1])
+            print("{:14} {:8d} {:12.4g} {:12.4g} {:12.4g} {:>12}".format(qubo, n, low, high, high / low if low > 0 else 0, before))
@@ -0,0 +1,154 @@
+#   Copyright 2021 Mario Guzzi
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+'''
+Created on Oct. 19, 2026
+
+@author: Mario Guzzi
+'''
+
+import hashlib
+import json
+import os
+
+import networkx as nx
+import minorminer
+import dwave_networkx as dnx
+
+#==============================================================================================#
+# class embeddingCache: Persistent minor-embedding cache for the QPU path                      #
+#                                                                                              #
+# Embeddings are keyed by a hash of the BQM interaction structure and a hash of the target     #
+# graph, and stored as json files. A fixed size board always produces the same interaction    #
+# structure, so the (slow) minorminer search is only done once per board size and QPU.        #
+#                                                                                              #
+# Usage (offline, against a generated topology):                                              #
+#                                                                                              #
+#   EC = embeddingCache(path="embeddings")                                                     #
+#   embedding = EC.get(bqm, targetGraph("pegasus",16))                                         #
+#                                                                                              #
+#==============================================================================================#
+
+class embeddingCache:
+
+    def __init__(self, path=".qzcache/embeddings", tries=10, timeout=1000, verbose=False):
+        self.path = path
+        self.tries = tries          # minorminer restarts
+        self.timeout = timeout      # minorminer timeout (seconds)
+        self.verbose = verbose
+        self.hits = 0
+        self.misses = 0
+
+    # Source edges (interactions) and variables of a BQM, a Qubo dictionary or an edge list
+    # Variables are included so that isolated variables also receive a chain
+
+    def sourceGraph(self, source):
+        if ( isinstance(source,dict) ):
+            variables = set()
+            edges = []
+            for (i,j) in source:
+                variables.update([int(i),int(j)])
+                if ( i != j ): edges.append((int(i),int(j)))
+            return(sorted(variables), edges)
+        if ( hasattr(source,'quadratic') ):
+            variables = sorted(int(v) for v in source.variables)
+            edges = [(int(i),int(j)) for (i,j) in source.quadratic]
+            return(variables, edges)
+        edges = [(int(i),int(j)) for (i,j) in source]
+        variables = sorted(set(v for e in edges for v in e))
+        return(variables, edges)
+
+    # Target edges from a sampler (edgelist), a networkx graph or an edge list
+
+    def targetEdges(self, target):
+        if ( hasattr(target,'edgelist') ): return list(target.edgelist)
+        if ( isinstance(target,nx.Graph) ): return list(target.edges)
+        return list(target)
+
+    # Hash of a list of undirected edges, independent of their order and orientation
+
+    def hashEdges(self, edges, variables=None):
+        h = hashlib.sha256()
+        for (i,j) in sorted(tuple(sorted(e)) for e in edges):
+            h.update("{},{};".format(i,j).encode())
+        if ( variables is not None ):
+            h.update(b"|")
+            for v in variables:
+                h.update("{};".format(v).encode())
+        return(h.hexdigest())
+
+    def key(self, source, target):
+        (variables, edges) = self.sourceGraph(source)
+        skey = self.hashEdges(edges, variables)
+        tkey = self.hashEdges(self.targetEdges(target))
+        return(skey[:32] + "-" + tkey[:32])
+
+    def file(self, key):
+        return(os.path.join(self.path, key + ".json"))
+
+    # Get an embedding for source on target. Loaded from disk when available,
+    # otherwise computed with minorminer and saved.
+
+    def get(self, source, target):
+        key = self.key(source, target)
+
+        embedding = self.load(key)
+        if ( embedding is not None ):
+            self.hits += 1
+            if ( self.verbose ): print("Embedding cache hit", key)
+            return(embedding)
+
+        self.misses += 1
+        (variables, edges) = self.sourceGraph(source)
+        if ( self.verbose ): print("Embedding cache miss", key, "- searching embedding for", len(variables), "variables")
+
+        S = nx.Graph()
+        S.add_nodes_from(variables)
+        S.add_edges_from(edges)
+        embedding = minorminer.find_embedding(S, self.targetEdges(target), tries=self.tries, timeout=self.timeout)
+        if ( len(embedding) == 0 ):
+            raise ValueError("No embedding found for {} variables on the target graph".format(len(variables)))
+
+        embedding = { int(v): [int(q) for q in chain] for v, chain in embedding.items() }
+        self.save(key, embedding)
+        return(embedding)
+
+    def load(self, key):
+        filename = self.file(key)
+        if ( not os.path.exists(filename) ): return(None)
+        with open(filename, 'r') as f:
+            data = json.load(f)
+        return({ v: chain for (v, chain) in data['embedding'] })
+
+    def save(self, key, embedding):
+        os.makedirs(self.path, exist_ok=True)
+        data = {'key': key, 'embedding': [[v, chain] for v, chain in embedding.items()]}
+        # Write then rename so that concurrent runs never read a partial file
+        tmp = self.file(key) + ".tmp" + str(os.getpid())
+        with open(tmp, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp, self.file(key))
+
+    def clear(self):
+        if ( not os.path.isdir(self.path) ): return
+        for f in os.listdir(self.path):
+            if ( f.endswith(".json") ): os.remove(os.path.join(self.path, f))
+
+# Generated QPU topologies for offline embedding
+
+def targetGraph(topology="pegasus", size=16):
+    if ( topology == "pegasus" ): return dnx.pegasus_graph(size)
+    if ( topology == "chimera" ): return dnx.chimera_graph(size)
+    if ( topology == "zephyr" ): return dnx.zephyr_graph(size)
+    raise ValueError("Unknown topology {}".format(topology))
@@ -0,0 +1,119 @@
+#   Copyright 2021 Mario Guzzi
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+'''
+Created on Oct. 19, 2026
+
+@author: Mario Guzzi
+'''
+
+import dimod
+
+try:
+    from dwave.preprocessing import roof_duality
+except ImportError:
+    roof_duality = None             # Dominance rules only
+
+#==============================================================================================#
+# class variableFixer: Variable fixing before sampling                                         #
+#                                                                                              #
+# Fixes the variables whose value is provably optimal and removes them from the BQM:           #
+#   - forced values of the model (QuboTrips.forcedValues): values any other of which violates  #
+#     a penalty layer, such as the first start flag and cells that cannot start nor connect.   #
+#     They hold for the optimum as long as the penalties dominate the objective, as the board  #
+#     weights are set for                                                                      #
+#   - roof duality (dwave.preprocessing): strong persistencies by default, values taken by     #
+#     every ground state (strict=False also takes values of some ground state)                 #
+#   - dominance, repeated until nothing changes: a binary variable whose linear bias outweighs #
+#     every combination of its couplings takes its better value                                #
+#                                                                                              #
+# The reduced BQM keeps the energy of the fixed variables in its offset, so samples of the     #
+# reduced BQM re-inflated with inflate() have their energies on the full BQM.                  #
+#                                                                                              #
+# The generic rules alone fix nothing on the board (its penalties are all pairwise): the       #
+# forced values fix their cells first, then roof duality and dominance propagate from them.    #
+#                                                                                              #
+# Usage (see routeAnneal.sample(preprocess=True)):                                             #
+#                                                                                              #
+#   F = variableFixer(forced=ra.QT.forcedValues())                                             #
+#   reduced = F.reduce(bqm)                                                                    #
+#   sampleset = F.inflate(neal.SimulatedAnnealingSampler().sample(reduced))                    #
+#                                                                                              #
+#==============================================================================================#
+
+class variableFixer:
+
+    # method : 'roof' (roof duality then dominance) or 'dominance'
+    # strict : roof duality strong persistencies only
+    # forced : {variable: value} fixed first (model structure, see QuboTrips.forcedValues)
+    def __init__(self, method='roof', strict=True, forced=None):
+        self.method = method
+        self.strict = strict
+        self.forced = forced if forced is not None else {}
+        self.fixed = {}             # Fixed binary values by variable
+        self.bound = None           # Roof duality lower bound of the energy
+
+    # BQM without the fixed variables
+    def reduce(self, bqm):
+        self.fixed = {}
+        self.bound = None
+        reduced = bqm.change_vartype(dimod.BINARY, inplace=False)
+        self.fix(reduced, {v: x for v, x in self.forced.items() if v in reduced.variables})
+        if ( self.method == 'roof' and roof_duality is not None ):
+            (self.bound, fixed) = roof_duality(reduced, strict=self.strict)
+            self.fix(reduced, fixed)
+        fixed = self.dominated(reduced)
+        while ( len(fixed) ):
+            self.fix(reduced, fixed)
+            fixed = self.dominated(reduced)
+        if ( bqm.vartype is dimod.SPIN ): reduced.change_vartype(dimod.SPIN)
+        return(reduced)
+
+    def fix(self, bqm, fixed):
+        for v, value in fixed.items():
+            bqm.fix_variable(v, value)
+        self.fixed.update(fixed)
+
+    # Variables fixed by dominance: flipping x from 0 to 1 changes the energy by h + sum J x_u,
+    # between h + (negative couplings) and h + (positive couplings)
+    def dominated(self, bqm):
+        low = dict(bqm.linear)
+        high = dict(bqm.linear)
+        for (u, v), b in bqm.quadratic.items():
+            bound = low if b < 0 else high
+            bound[u] += b
+            bound[v] += b
+        fixed = {v: 0 for v in bqm.variables if low[v] > 0}
+        fixed.update({v: 1 for v in bqm.variables if high[v] < 0})
+        return(fixed)
+
+    # Initial states (states, labels) restricted to the variables of the reduced BQM
+    def restrict(self, initial_states, reduced):
+        if ( initial_states is None ): return(None)
+        (states, labels) = initial_states
+        keep = [i for i, v in enumerate(labels) if v in reduced.variables]
+        return( (states[:,keep], [labels[i] for i in keep]) )
+
+    # Samples of the reduced BQM with the fixed variables added back
+    def inflate(self, sampleset):
+        if ( len(self.fixed) == 0 ): return(sampleset)
+        values = self.fixed
+        if ( sampleset.vartype is dimod.SPIN ): values = {v: 2*x - 1 for v, x in values.items()}
+        return( dimod.append_variables(sampleset, values) )
+
+    # Sampleset of the fixed variables alone, when they are all fixed
+    def sampleset(self, bqm):
+        values = self.fixed
+        if ( bqm.vartype is dimod.SPIN ): values = {v: 2*x - 1 for v, x in values.items()}
+        return( dimod.SampleSet.from_samples_bqm(values, bqm) )
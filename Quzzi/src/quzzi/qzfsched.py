@@ -19,35 +19,216 @@ Created on Oct. 22, 2021
 '''
 
 import csv
+import hashlib
+import json
+import os
+import shutil
+import warnings
 
-from quzzi.qznodes import Node, Segment
+import numpy as np
+
+from quzzi.qznodes import Node, Segment, SegmentTable
+from quzzi.qbgrid import qbGrid
 from quzzi.groupings import routeGroup, routeGrouping, routeComposite
+from quzzi.qzprofile import profiler
 
 #from quzzi.groupings import routeGroup
 #from quzzi.groupings import routeGrouping
 #from quzzi.groupings import routeComposite
 
+#==============================================================================================#
+# class schedCache: Binary cache of loaded schedules                                          #
+#                                                                                              #
+# Stores the filtered and sorted schedData columns, with their derived fields, as one .npy     #
+# file per column (structure of arrays) in a directory keyed by the source file hash and the  #
+# filter settings. Columns are loaded memory mapped (read only), so repeated runs and          #
+# parallel workers share the same on-disk copy without parsing the CSV.                        #
+#                                                                                              #
+# Usage:                                                                                       #
+#                                                                                              #
+#   FD = schedData("DS2b.csv", depDay=[1], HomeBases={"LCA":1}, cache=schedCache())            #
+#   ra = routeAnneal(dataset="DS2b.csv", homebases={"LCA":1}, cache=schedCache())              #
+#                                                                                              #
+#==============================================================================================#
+
+class schedCache:
+
+    version = 1     # Increase when the cached columns change
+
+    def __init__(self, path=".qzcache/datasets", mmap=True):
+        self.path = path
+        self.mmap = mmap
+        self.hits = 0
+        self.misses = 0
+
+    def hashFile(self, filename):
+        h = hashlib.sha256()
+        with open(filename, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        return(h.hexdigest())
+
+    def key(self, dataSet, Atypes=[], depDay=None, HomeBases=[]):
+        bases = HomeBases if isinstance(HomeBases, dict) else {b: 1 for b in HomeBases}
+        settings = {'version': self.version,
+                    'atypes': sorted(Atypes),
+                    'depday': None if depDay is None else sorted(int(d) for d in depDay),
+                    'homebases': sorted(bases.items())}
+        h = hashlib.sha256(json.dumps(settings).encode()).hexdigest()
+        return(self.hashFile(dataSet)[:32] + "-" + h[:16])
+
+    def folder(self, key):
+        return(os.path.join(self.path, key))
+
+    def load(self, key):
+        folder = self.folder(key)
+        if ( not os.path.exists(os.path.join(folder, "columns.json")) ):
+            self.misses += 1
+            return(None)
+        with open(os.path.join(folder, "columns.json"), 'r') as f:
+            names = json.load(f)['columns']
+        mode = 'r' if self.mmap else None
+        self.hits += 1
+        return( {k: np.load(os.path.join(folder, k + ".npy"), mmap_mode=mode) for k in names} )
+
+    def save(self, key, cols):
+        os.makedirs(self.path, exist_ok=True)
+        # Write into a private folder then rename so that concurrent runs never read a partial cache
+        tmp = self.folder(key) + ".tmp" + str(os.getpid())
+        os.makedirs(tmp, exist_ok=True)
+        for k, v in cols.items():
+            np.save(os.path.join(tmp, k + ".npy"), np.ascontiguousarray(v))
+        with open(os.path.join(tmp, "columns.json"), 'w') as f:
+            json.dump({'key': key, 'columns': list(cols.keys())}, f)
+        try:
+            os.rename(tmp, self.folder(key))
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)    # Already saved by another process
+
+    def clear(self):
+        if ( os.path.isdir(self.path) ): shutil.rmtree(self.path)
+
 class schedData:
+
+    CI = 60                         # Check in and check out times of the segments (see routeAnneal)
+    CO = 30
     
-    def __init__(self,dataSet=None, Atypes=[], depDay=None, HomeBases=[]):
+    def __init__(self,dataSet=None, Atypes=[], depDay=None, HomeBases=[], cache=None):
         self.N = 0
+        self.cols = None            # Columnar segments (filtered and sorted), see loadColumns
+        self.HomeBases = HomeBases
         self.segments = []
         if (dataSet is not None):
-            self.load(dataSet, Atypes=Atypes, depDay=depDay, HomeBases=HomeBases)
-        
-    def load(self,dataSet, Atypes=[], depDay=None, HomeBases=[]):
-        self.segments = self.loadFlts(dataSet, Atypes, depDay, HomeBases)
-        self.segments.sort(key=lambda x: (x.obj.depday*1440)+x.obj.deptime) # Sort by departure date/time
-        for i,seg in enumerate(self.segments): # Reindex to match the sort
-            seg.obj.task_id = i+1
-            seg.task_id = i+1
-        self.N =len(self.segments)
+            self.load(dataSet, Atypes=Atypes, depDay=depDay, HomeBases=HomeBases, cache=cache)
+
+    # Segment Node objects are only created when first requested
+    @property
+    def segments(self):
+        if ( self.nodes is None ): self.nodes = self.materialize()
+        return( self.nodes )
+
+    @segments.setter
+    def segments(self, flightSegments):
+        self.nodes = flightSegments
+
+    # Load a data set. With a schedCache, the filtered columns are read from (or saved to)
+    # the binary cache instead of parsing the CSV
+    def load(self,dataSet, Atypes=[], depDay=None, HomeBases=[], cache=None):
+        with profiler.phase("loadFlts") as p:
+            cols = None
+            if ( cache is not None ):
+                key = cache.key(dataSet, Atypes, depDay, HomeBases)
+                cols = cache.load(key)
+            if ( cols is None ):
+                cols = self.selectColumns(self.loadColumns(dataSet), Atypes, depDay)
+                self.deriveColumns(cols, HomeBases)
+                if ( cache is not None ): cache.save(key, cols)
+            self.cols = cols
+            self.HomeBases = HomeBases
+            self.nodes = None
+            self.N = len(cols['dep'])
+            p.size(segments=self.N)
         return( self.N )
-    
+
+    # Filters applied as masks before any object is created, then
+    # sort by departure date/time, keeping the file order for equal times
+    def selectColumns(self, cols, Atypes=[], depDay=None):
+        keep = np.ones(len(cols['atype']), dtype=bool)
+        if ( len(Atypes) > 0 ): keep &= np.isin(cols['atype'], list(Atypes))
+        if ( depDay is not None ): keep &= np.isin(cols['depday'], list(depDay))
+        idx = np.flatnonzero(keep)
+        order = idx[np.argsort((cols['depday'][idx] * 1440) + cols['deptime'][idx], kind='stable')]
+        return( {k: v[order] for k, v in cols.items()} )
+
+    # Derived fields otherwise computed per Segment (see Segment and routeAnneal)
+    #   ut1, ut2 : as Segment.setT with T spanning all segments plus one day each side
+    #   depwgt, arrwgt : home base weights of the departure and arrival stations
+    def deriveColumns(self, cols, HomeBases=[]):
+        ut1 = (cols['depday']-1) * 1440 + cols['deptime']
+        T = int((ut1 + cols['ft']).max()) + (2 * 1440) if len(ut1) else 0
+        cols['ut1'] = ut1
+        cols['ut2'] = T - (ut1 + cols['ft'])
+        weights = HomeBases if isinstance(HomeBases, dict) else {b: 1 for b in HomeBases}
+        for (wgt, sta) in [('depwgt','dep'), ('arrwgt','arr')]:
+            (stations, inverse) = np.unique(cols[sta], return_inverse=True)
+            cols[wgt] = np.array([weights.get(x, 0) for x in stations.tolist()], dtype=np.int64)[inverse]
+        return(cols)
+
+    # Structure of arrays over the segments, read directly by the hot paths
+    def getTable(self, HomeBases=None):
+        if ( HomeBases is None ): HomeBases = self.HomeBases
+        if ( self.cols is not None and self.nodes is None ):
+            return( SegmentTable(HomeBases=HomeBases, cols=self.cols) )
+        return( SegmentTable(self.segments, HomeBases) )
+
+    # Is the derived T, UT1/UT2 and home base weights of the segments taken from the columns
+    def derived(self):
+        return( self.cols is not None and 'ut1' in self.cols )
+
+    # T of the derived columns: the time range fully enclosing all segments, plus a day each side
+    def spanT(self):
+        if ( self.N == 0 ): return( 2 * 1440 )
+        return( int(self.cols['ut1'][0] + self.cols['ut2'][0] + self.cols['ft'][0]) )
+
     def set(self,flightSegments):
+        self.cols = None
         self.segments = flightSegments
         self.N = len(self.segments)
 
+    # New schedData over the segments at the given (0 based, sorted) indices, renumbered from task_id 1
+    def subset(self, indices):
+        FD = schedData(HomeBases=self.HomeBases)
+        if ( self.cols is not None and self.nodes is None ):
+            cols = {k: np.asarray(v)[indices] for k, v in self.cols.items()}
+            FD.cols = self.deriveColumns(cols, self.HomeBases)
+            FD.nodes = None
+            FD.N = len(indices)
+        else:
+            segments = []
+            for i, ndx in enumerate(indices):
+                s = self.segments[ndx].obj
+                segments.append( Node(Segment(i+1, s.lab, s.dep, s.arr, s.deptime, s.arrtime, s.depday, s.arrday, self.HomeBases)) )
+            FD.set(segments)
+        return( FD )
+
+    # Create Node/Segment objects from the columns. task_id follows the sort order
+    def materialize(self, first=0, last=None):
+        if ( self.cols is None ): return( [] )
+        if ( last is None ): last = self.N
+        c = {k: v[first:last].tolist() for k, v in self.cols.items()}
+        segments = []
+        if ( self.derived() ):
+            T = self.spanT()
+            for i in range(last - first):
+                segments.append( Node(Segment.fromColumns(first+i+1, c['fn'][i], c['dep'][i], c['arr'][i], c['deptime'][i], c['arrtime'][i],
+                                                          c['depday'][i], c['arrday'][i], c['ft'][i], c['ut1'][i], c['ut2'][i], T,
+                                                          self.CI, self.CO, c['depwgt'][i], c['arrwgt'][i])) )
+            return( segments )
+        for i in range(last - first):
+            segments.append( Node(Segment(first+i+1, c['fn'][i], c['dep'][i], c['arr'][i], c['deptime'][i], c['arrtime'][i],
+                                          c['depday'][i], c['arrday'][i], self.HomeBases)) )
+        return( segments )
+
     # ================================================================
     # TODO: Take the below method and implement in new model
     # ================================================================
@@ -85,67 +266,61 @@ class schedData:
         output = "{:03d} {:4s} {:3s} {:3s} d{:02d} {:4s} {:4s} d{:02d} ft {:4s} gt {:4s}".format(task_id,fnum,dep,arr,ddy,depT,arrT,ady,ft,gnd)
         return(output)
      
-    def print_trip(self,result, implicit=True, QT=None):
+    # board: qbGrid that produced the sample (defaults to the QT board, or a full N x N board)
+    def print_trip(self,result, implicit=True, QT=None, board=None):
         variables = result[0]
         ids = []
         energy = result[1]
         N = self.N
         segments = self.segments
+        if ( board is None ): board = QT.board if QT is not None else qbGrid(N,N)
         
         print("Energy :", (energy))
-        sndx = N*N
         prev_node = None
         leg_count = 0
-        for row in range(N):
-            origin = row * N
-            state = 0
+        for (row, state, nodes) in board.decode(variables):
             #ancil = 0
             implicit_break = False
-        
-            if ( sndx+row < len(variables)):
-                state = variables[sndx+row]
-                stateStr = ["","Trip"][int(state)]
+            stateStr = ["","Trip"][int(state)]
 
-            for node in range(N):
-                n = origin + node
+            for node in nodes:
+                n = board.getOrg(row,node)
 
-                if ( variables[n] == 1):
-                    
-                    ids.extend([n])
-                    
-                    if ( state == 1):
-                        ids.extend([sndx+row])
-                        print(stateStr)
-                        #leg_count = 0      DURING TESTING WE WANT TO SEE ALL THE GAP VALUES
-                        #prev_node = None
-                    leg_count += 1
-                    leg_gap = 0
-
-                    if ( leg_count > 1 ):
-                        t1 = segments[prev_node].obj.deptime + (1440*segments[prev_node].obj.depday) + segments[prev_node].obj.ft
-                        t2 = segments[node].obj.deptime + (1440*segments[node].obj.depday)
-                        leg_gap = t2 - t1
-                        a1 = segments[prev_node].obj.arr;
-                        a2 = segments[node].obj.dep;
-                        #
-                        # Detect implicit break (NOTE: This is to assist with tuning the QUBO)
-                        if ( implicit ):
-                            if ( state != 1 ):
-                                if ( a1 != a2 ): implicit_break = True
-                                if ( leg_gap < 0 ): implicit_break = True
-                                #if ( leg_gap > 4*60 ): implicit_break = True
-                                if ( implicit_break ):
-                                    print("Break")
-                    #print(row, segments[node].obj.id, segments[node].obj.lab, segments[node].obj.dep, segments[node].obj.arr, leg_gap)
-
-                    # Calculate the energy contribution for a segment
-                    # TODO: Unable to properly use sumQSelect here. Look for other code from Notebooks
-                    ESegment = 0.0
-                    if ( QT is not None ):
-                        ESegment = QT.sumQselect(QT.finalQubo(),list([n]))
-
-                    print(row, self.formatSegment(segments[node],leg_gap),ESegment)
-                    prev_node = node
+                ids.extend([n])
+
+                if ( state == 1):
+                    ids.extend([int(board.flags[row])])
+                    print(stateStr)
+                    #leg_count = 0      DURING TESTING WE WANT TO SEE ALL THE GAP VALUES
+                    #prev_node = None
+                leg_count += 1
+                leg_gap = 0
+
+                if ( leg_count > 1 ):
+                    t1 = segments[prev_node].obj.deptime + (1440*segments[prev_node].obj.depday) + segments[prev_node].obj.ft
+                    t2 = segments[node].obj.deptime + (1440*segments[node].obj.depday)
+                    leg_gap = t2 - t1
+                    a1 = segments[prev_node].obj.arr;
+                    a2 = segments[node].obj.dep;
+                    #
+                    # Detect implicit break (NOTE: This is to assist with tuning the QUBO)
+                    if ( implicit ):
+                        if ( state != 1 ):
+                            if ( a1 != a2 ): implicit_break = True
+                            if ( leg_gap < 0 ): implicit_break = True
+                            #if ( leg_gap > 4*60 ): implicit_break = True
+                            if ( implicit_break ):
+                                print("Break")
+                #print(row, segments[node].obj.id, segments[node].obj.lab, segments[node].obj.dep, segments[node].obj.arr, leg_gap)
+
+                # Calculate the energy contribution for a segment
+                # TODO: Unable to properly use sumQSelect here. Look for other code from Notebooks
+                ESegment = 0.0
+                if ( QT is not None ):
+                    ESegment = QT.sumQselect(QT.finalQubo(),list([n]))
+
+                print(row, self.formatSegment(segments[node],leg_gap),ESegment)
+                prev_node = node
         print("----------------------------------")
         print("Variables: ", sorted(ids))            
 
@@ -154,11 +329,12 @@ class schedData:
     def print_all(self, sampleset, max_v = 3, QT=None):
         for res in sampleset.data():
             #self.print_trip(res,QT=QT)  
-            self.print_trip(res)
+            self.print_trip(res, board=QT.board if QT is not None else None)
             max_v = max_v - 1
             if ( max_v <= 0 ): break
 
-    def get_sequences(self,A,result):
+    # board: qbGrid that produced the sample (defaults to the A.QT board, or a full N x N board)
+    def get_sequences(self,A,result,board=None):
         # Imply sequence breaks when not marked as a Trip start, but is not continuous
         implicit = True
         
@@ -173,7 +349,7 @@ class schedData:
         
         # Get variables geometry          
         N = A.N
-        sndx = N*N
+        if ( board is None ): board = A.QT.board if hasattr(A, 'QT') else qbGrid(N,N)
         
         prev_node = None
         leg_count = 0
@@ -184,56 +360,48 @@ class schedData:
         
         # Row by row correlate variables to segment ids
         # and detect sequence starts
-        for row in range(N):
-            origin = row * N
-            state = 0
+        for (row, state, nodes) in board.decode(variables):
             #ancil = 0
             implicit_break = False
         
-            if ( sndx+row < len(variables)):
-                state = variables[sndx+row]
-        
-            for node in range(N):
-                n = origin + node
-        
-                if ( variables[n] == 1):
-                    
-                    #if ( state == 1):
-                    #    ids.extend([sndx+row])
-        
-                    leg_count += 1
-                    leg_gap = 0
-        
-                    if ( leg_count > 1 ):
-                        t1 = segments[prev_node].obj.deptime + (1440*segments[prev_node].obj.depday) + segments[prev_node].obj.ft
-                        t2 = segments[node].obj.deptime + (1440*segments[node].obj.depday)
-                        leg_gap = t2 - t1
-                        a1 = segments[prev_node].obj.arr;
-                        a2 = segments[node].obj.dep;
-                        #
-                        # Detect implicit break 
-                        if ( implicit ):
-                            if ( state != 1 ):
-                                if ( a1 != a2 ): implicit_break = True
-                                if ( leg_gap < 0 ): implicit_break = True
-        
-                    # Is this segment starting a new sequence?
-                    # - Is it the very first segment? 
-                    # - Do we have a Start flag?
-                    # - Do we have an implicit break?
-                    # If so, put the current sequence (if not empty) into the result and start a new sequence
-        
-                    if ( leg_count > 1):
-                        if ( state == 1 or implicit_break ):
-                            sequences[seq_count] = sequence;
-                            sequence=[]
-                            seq_count += 1
-        
-                    # Add to the current sequence
-                    sequence.append(segments[node].obj.task_id)
-        
-                    prev_node = node
+            for node in nodes:
         
+                #if ( state == 1):
+                #    ids.extend([sndx+row])
+
+                leg_count += 1
+                leg_gap = 0
+
+                if ( leg_count > 1 ):
+                    t1 = segments[prev_node].obj.deptime + (1440*segments[prev_node].obj.depday) + segments[prev_node].obj.ft
+                    t2 = segments[node].obj.deptime + (1440*segments[node].obj.depday)
+                    leg_gap = t2 - t1
+                    a1 = segments[prev_node].obj.arr;
+                    a2 = segments[node].obj.dep;
+                    #
+                    # Detect implicit break 
+                    if ( implicit ):
+                        if ( state != 1 ):
+                            if ( a1 != a2 ): implicit_break = True
+                            if ( leg_gap < 0 ): implicit_break = True
+
+                # Is this segment starting a new sequence?
+                # - Is it the very first segment? 
+                # - Do we have a Start flag?
+                # - Do we have an implicit break?
+                # If so, put the current sequence (if not empty) into the result and start a new sequence
+
+                if ( leg_count > 1):
+                    if ( state == 1 or implicit_break ):
+                        sequences[seq_count] = sequence;
+                        sequence=[]
+                        seq_count += 1
+
+                # Add to the current sequence
+                sequence.append(segments[node].obj.task_id)
+
+                prev_node = node
+
         # Save the last sequence in progress
         if ( len(sequence)>0):
             sequences[seq_count] = sequence;
@@ -242,11 +410,11 @@ class schedData:
         
         return sequences
     
-    def print_sequences(self,sampleset, max_v=3,solver="unknown"):
+    def print_sequences(self,sampleset, max_v=3,solver="unknown",QT=None):
         print("{",end='') # Object
         print("\"solutions\":[",end='')     # single array for all solutions
         for tid,res in enumerate(sampleset.data()):
-            seqs = self.get_sequences(self, res)
+            seqs = self.get_sequences(self, res, board=QT.board if QT is not None else None)
             print("{",end='') # Object
             print("\"solution\":", id, ",", sep='', end='')
             print("\"energy\":", res[1], ",", sep='', end='')
@@ -303,11 +471,34 @@ class schedData:
                     #print(', '.join(row))
         return(fseg)
 
+    # Load flight data files into typed columns
+    # Only the columns used by Segment are kept:
+    #   fn (FN), dep (FDep), arr (FArr), depday (UDepD), deptime (UDepT), arrtime (UArrT), arrday (UArrD), ft, atype
+    def loadColumns(self,targetDataSet):
+        #  0    1    2    3      4      5      6      7      8      9      10     11    12    13    14
+        # FID, FN, FDep, FArr, FDepD, FDepT, FArrT, FArrD, UDepD, UDepT, UArrT, UArrD, FFT, FTZD, Atype
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", UserWarning)    # Empty data set
+            text = np.loadtxt(targetDataSet, delimiter=',', skiprows=1, usecols=(1,2,3,14), dtype=str, quotechar='"', ndmin=2)
+            nums = np.loadtxt(targetDataSet, delimiter=',', skiprows=1, usecols=(8,9,10,11), dtype=np.int64, quotechar='"', ndmin=2)
+        cols = {}
+        cols['fn'] = text[:,0]
+        cols['dep'] = text[:,1]
+        cols['arr'] = text[:,2]
+        cols['atype'] = text[:,3]
+        cols['depday'] = nums[:,0]
+        cols['deptime'] = nums[:,1]
+        cols['arrtime'] = nums[:,2]
+        cols['arrday'] = nums[:,3]
+        # Flight time as computed by Segment
+        cols['ft'] = (cols['arrday']-1) * 1440 + cols['arrtime'] - ((cols['depday']-1) * 1440 + cols['deptime'])
+        return(cols)
+
     # =====================================================================
     # Get a generated sequence and save in a "sequences" object
     # =====================================================================
     
-    def getRoutes(self,result):
+    def getRoutes(self,result,board=None):
         #routes = routeSequences(self)
         #self, items=[], grp=routeGroup.SEG, lab="",lev=1, fn=None, autocomp=True): 
         
@@ -326,32 +517,25 @@ class schedData:
         energy = result[1]
         N = self.N
         segments = self.segments
+        if ( board is None ): board = qbGrid(N,N)
         
-        sndx = N*N
         prev_node = None
         leg_count = 0
-        for row in range(N):
-            origin = row * N
-            state = 0
+        for (row, state, nodes) in board.decode(variables):
             #ancil = 0
         
-            if ( sndx+row < len(variables)):
-                state = variables[sndx+row]
-                stateStr = ["","Trip"][int(state)]
-                if ( state ):
-                    lab = stateStr+str(trip)
-                    #routes.addRes(lab)
-                    tripRoute = routeGrouping(grp=routeGroup.TRIP, lab=lab,lev=3,fn=routeComposite.Grp)
-                    routes.add(tripRoute)
-                    FDPRoute = routeGrouping(grp=routeGroup.DUTY, lab=lab+'FDP1',lev=2,fn=routeComposite.Seg)
-                    tripRoute.add(FDPRoute)
-                    trip += 1
-
-            for node in range(N):
-                n = origin + node
-
-                if ( variables[n] == 1):
-                    FDPRoute.add([segments[node]])
-                    #FDPRoute.add(routeGrouping(grp=segments[node], lab=segments[node].lab,fn=routeComposite.Seg))
-                    #routes.addSeq([node],lab)
+            stateStr = ["","Trip"][int(state)]
+            if ( state ):
+                lab = stateStr+str(trip)
+                #routes.addRes(lab)
+                tripRoute = routeGrouping(grp=routeGroup.TRIP, lab=lab,lev=3,fn=routeComposite.Grp)
+                routes.add(tripRoute)
+                FDPRoute = routeGrouping(grp=routeGroup.DUTY, lab=lab+'FDP1',lev=2,fn=routeComposite.Seg)
+                tripRoute.add(FDPRoute)
+                trip += 1
+
+            for node in nodes:
+                FDPRoute.add([segments[node]])
+                #FDPRoute.add(routeGrouping(grp=segments[node], lab=segments[node].lab,fn=routeComposite.Seg))
+                #routes.addSeq([node],lab)
         return(routes)
@@ -0,0 +1,159 @@
+#   Copyright 2021 Mario Guzzi
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+'''
+Created on Oct. 19, 2026
+
+@author: Mario Guzzi
+'''
+
+from quzzi.qznodes import Node, Segment
+from quzzi.qzanneal import routeAnneal
+from quzzi.tripModel import tripModel
+from quzzi.qzprofile import profiler
+
+#==============================================================================================#
+# class rollingHorizon: Rolling horizon solver for multi-day schedules                         #
+#                                                                                              #
+# Solves overlapping windows of departure days in sequence instead of one board for the whole  #
+# schedule. Window k holds the 'window' core days plus 'overlap' look ahead days:              #
+#   - trips within the core days ending at a home base are committed                           #
+#   - open trips (ending off base, or continued into the overlap) keep their core segments as  #
+#     a fixed prefix, carried to the next window as one pseudo segment (first departure to     #
+#     last arrival). Prefixes that no remaining segment can extend are committed instead.     #
+#   - segments of the overlap days are released and solved again in the next window           #
+# The last window commits all its trips. Peak board size follows the window, not the season.   #
+#                                                                                              #
+# Usage:                                                                                       #
+#                                                                                              #
+#   ra = routeAnneal(dataset="DS2.csv", homebases={"LCA":1})                                   #
+#   tripModel().annealer(ra)                                                                   #
+#   H = rollingHorizon(ra, window=1, overlap=1)                                                #
+#   sequences = H.solve(useNeal=True, useHyb=False, num_reads=100)                             #
+#                                                                                              #
+#==============================================================================================#
+
+class rollingHorizon:
+
+    # ra      : parent routeAnneal with the whole schedule and its params set
+    # window  : days committed per window
+    # overlap : look ahead days solved with the window but not committed
+    # model   : model class applied to each window (annealer() then setConstraints())
+    def __init__(self, ra, window=1, overlap=1, model=tripModel):
+        self.ra = ra
+        self.window = max(1, window)
+        self.overlap = max(0, overlap)
+        self.model = model
+        self.sizes = []             # Board segments per window
+        self.energies = []          # Best energy per window
+
+    def days(self):
+        return( sorted(set(seg.obj.depday for seg in self.ra.segments)) )
+
+    def isBase(self, station):
+        return( station in self.ra.HomeBases )
+
+    # Can a remaining segment connect after the last segment of a prefix (as SegmentTable.connections)
+    def canExtend(self, prefix, assigned):
+        params = self.ra.QT.params
+        last = self.ra.segments[prefix[-1]].obj
+        for n, seg in enumerate(self.ra.segments):
+            if ( n in assigned or seg.obj.dep != last.arr ): continue
+            gap = seg.obj.getUdeptime() - last.getUarrtime()
+            if ( gap > 0 and gap < params['const_max_connect'] ): return(True)
+        return(False)
+
+    # One segment, or a fixed prefix as a single pseudo segment, renumbered for the window
+    def windowSegment(self, task_id, item):
+        segments = self.ra.segments
+        first = segments[item[0]].obj
+        last = segments[item[-1]].obj
+        lab = first.lab if len(item) == 1 else first.lab + "+" + str(len(item)-1)
+        return( Node(Segment(task_id, lab, first.dep, last.arr, first.deptime, last.arrtime, first.depday, last.arrday, self.ra.HomeBases)) )
+
+    # Solve one window of items (lists of parent segment indices). Returns the sequences as lists of items
+    def solveWindow(self, items, **kwargs):
+        if ( len(items) < 2 ): return( [[i] for i in range(len(items))] )
+        sub = routeAnneal(dataset=[self.windowSegment(i+1, item) for i, item in enumerate(items)], homebases=self.ra.HomeBases)
+        model = self.model().annealer(sub)
+        sub.QT.params.update(self.ra.QT.params)
+        sub.QT.commitParams()
+        model.setConstraints()
+        sub.solve(**kwargs)
+        best = sub.sampleset.first
+        self.energies.append(best.energy)
+        # A sample breaking the board constraints may repeat or miss items: keep the first
+        # occurrence and return missed items on their own, so no segment is lost between windows
+        seen = set()
+        result = []
+        for seq in sub.FD.get_sequences(sub, (best.sample, best.energy)).values():
+            seq = [t-1 for t in seq if t-1 not in seen]
+            seen.update(seq)
+            if ( len(seq) ): result.append(seq)
+        result.extend([[i] for i in range(len(items)) if i not in seen])
+        return(result)
+
+    # Solve all windows in sequence. Takes the routeAnneal.solve options.
+    # Returns the sequences of parent task ids (as schedData.get_sequences)
+    def solve(self, **kwargs):
+        segments = self.ra.segments
+        day = [seg.obj.depday for seg in segments]
+        udep = [seg.obj.getUdeptime() for seg in segments]
+        days = self.days()
+
+        sequences = {}
+        assigned = set()            # Committed or carried segments
+        carried = []                # Open trip prefixes
+        self.sizes = []
+        self.energies = []
+        for i in range(0, len(days), self.window):
+            core = set(days[i:i+self.window])
+            span = set(days[i:i+self.window+self.overlap])
+            last = ( i + self.window >= len(days) )
+
+            items = carried + [[n] for n in range(len(segments)) if day[n] in span and n not in assigned]
+            items.sort(key=lambda item: (udep[item[0]], item[0]))
+            self.sizes.append(len(items))
+
+            with profiler.phase("window") as p:
+                result = self.solveWindow(items, **kwargs)
+                p.size(day=days[i], segments=len(items))
+
+            open_trips = []
+            for seq in result:
+                trip = [n for ndx in seq for n in items[ndx]]
+                if ( last ):
+                    sequences[len(sequences)] = [n+1 for n in trip]
+                    continue
+                fixed = [n for n in trip if n in assigned or day[n] in core]
+                if ( len(fixed) == 0 ): continue                      # Released to the next window
+                assigned.update(fixed)
+                if ( len(fixed) < len(trip) or not self.isBase(segments[fixed[-1]].obj.arr) ):
+                    open_trips.append(fixed)
+                else:
+                    sequences[len(sequences)] = [n+1 for n in fixed]
+
+            # Carry the open trips that can still be extended (checked once all fixed segments are known)
+            carried = []
+            for fixed in open_trips:
+                if ( self.canExtend(fixed, assigned) ):
+                    carried.append(fixed)
+                else:
+                    sequences[len(sequences)] = [n+1 for n in fixed]
+
+        return(sequences)
+
+    # Largest board solved (segments)
+    def peak(self):
+        return( max(self.sizes, default=0) )
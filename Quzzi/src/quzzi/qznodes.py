@@ -19,22 +19,31 @@ Created on Oct. 22, 2021
 '''
 
 
+
+import numpy as np
+
 '''
     Flight network classes
 '''
 
+# Network items use __slots__: no per object __dict__, faster attribute access
+# and a compact pickle when models are sent to worker processes
+
 class Node:
 
+    __slots__ = ('kind', 'task_id', 'lab', 'obj')
+
     def isStart(self):
-        return isinstance(self.obj,Start)
+        return self.kind is Start
     
     def isSegment(self):
-        return isinstance(self.obj,Segment)
+        return self.kind is Segment
     
     def isDayItem(self):
-        return isinstance(self.obj,DayItem)
+        return self.kind is DayItem
     
     def __init__(self, obj ):
+        self.kind = type(obj)       # Node type, tested by isStart/isSegment/isDayItem
         if ( isinstance(obj,Segment)):
             self.task_id = obj.task_id
             self.lab = obj.lab
@@ -56,6 +65,8 @@ class Node:
                    
 class Start:
 
+    __slots__ = ('task_id', 'lab')
+
     def __init__(self, task_id, lab):
         self.task_id = task_id
         self.lab = lab
@@ -66,11 +77,15 @@ class Start:
         
 class Segment:
 
+    __slots__ = ('task_id', 'lab', 'dep', 'arr', 'deptime', 'arrtime', 'depday', 'arrday', 'ft',
+                 'udep', 'uarr', 'UT1', 'UT2', 'T', 'ci', 'co', 'DepBaseWgt', 'ArrBaseWgt')
+
+    # Absolute times (minutes from day 1 00:00) are precomputed in __init__
     def getUarrtime(self):
-        return ((self.getUdeptime() + self.ft))
+        return (self.uarr)
                 
     def getUdeptime(self):
-        return ((self.depday - 1) * 1440 + self.deptime)
+        return (self.udep)
     
     def setT(self, T):
         self.T = T
@@ -98,6 +113,17 @@ class Segment:
     def getCO(self):
         return self.co
         
+    # Segment from precomputed fields (schedData derived columns): nothing is recomputed
+    @classmethod
+    def fromColumns(cls, task_id, lab, dep, arr, deptime, arrtime, depday, arrday, ft, UT1, UT2, T, ci, co, DepBaseWgt, ArrBaseWgt):
+        self = cls.__new__(cls)
+        (self.task_id, self.lab, self.dep, self.arr) = (task_id, lab, dep, arr)
+        (self.deptime, self.arrtime, self.depday, self.arrday) = (deptime, arrtime, depday, arrday)
+        (self.ft, self.udep, self.uarr) = (ft, UT1, UT1 + ft)
+        (self.UT1, self.UT2, self.T, self.ci, self.co) = (UT1, UT2, T, ci, co)
+        (self.DepBaseWgt, self.ArrBaseWgt) = (DepBaseWgt, ArrBaseWgt)
+        return(self)
+
     def __init__(self, task_id, lab, dep, arr, deptime, arrtime, depday, arrday, HomeBases):
         self.task_id = task_id
         self.lab = lab
@@ -108,6 +134,8 @@ class Segment:
         self.depday = depday
         self.arrday = arrday
         self.ft = (arrday-1) * 1440 + arrtime - ( (depday-1) * 1440 + deptime )
+        self.udep = (depday - 1) * 1440 + deptime
+        self.uarr = self.udep + self.ft
         self.UT1 = 0
         self.UT2 = 0
         self.T = 0
@@ -132,6 +160,9 @@ class Segment:
 '''
             
 class DayItem:
+
+    __slots__ = ('task_id', 'lab', 't1', 't2', 'date')
+
     def __init__(self, task_id, day):
         self.task_id = task_id            # 
         self.lab = "DO-" + str(day)  #
@@ -140,3 +171,119 @@ class DayItem:
         self.date = day
         return
 
+'''
+    Segment Table - Structure of arrays over the flight segments, indexed by task_id-1
+'''
+
+class SegmentTable:
+
+    # Build from a list of segment Nodes, or from schedData columns (see schedData.loadColumns)
+    def __init__(self, segments=None, HomeBases={}, cols=None):
+        self.stations = []          # Station codes by interned id
+        self.codes = {}             # Interned id by station code
+        if ( cols is not None ):
+            self.n = len(cols['dep'])
+            self.task_id = np.arange(1, self.n+1)
+            self.labels = cols['fn'].tolist()
+            dep = cols['dep'].tolist()
+            arr = cols['arr'].tolist()
+            self.depday = np.asarray(cols['depday'], dtype=np.int64)
+            self.deptime = np.asarray(cols['deptime'], dtype=np.int64)
+            self.arrday = np.asarray(cols['arrday'], dtype=np.int64)
+            self.arrtime = np.asarray(cols['arrtime'], dtype=np.int64)
+        else:
+            segments = sorted(segments if segments is not None else [], key=lambda s: s.obj.task_id)
+            self.n = len(segments)
+            self.task_id = np.array([s.obj.task_id for s in segments], dtype=np.int64)
+            self.labels = [s.obj.lab for s in segments]
+            dep = [s.obj.dep for s in segments]
+            arr = [s.obj.arr for s in segments]
+            self.depday = np.array([s.obj.depday for s in segments], dtype=np.int64)
+            self.deptime = np.array([s.obj.deptime for s in segments], dtype=np.int64)
+            self.arrday = np.array([s.obj.arrday for s in segments], dtype=np.int64)
+            self.arrtime = np.array([s.obj.arrtime for s in segments], dtype=np.int64)
+
+        self.dep = np.array([self.intern(x) for x in dep], dtype=np.int32)
+        self.arr = np.array([self.intern(x) for x in arr], dtype=np.int32)
+        # Minutes from day 1 00:00 (as Segment.getUdeptime/getUarrtime)
+        self.udep = (self.depday-1) * 1440 + self.deptime
+        self.uarr = (self.arrday-1) * 1440 + self.arrtime
+        self.ft = self.uarr - self.udep
+        bases = [self.codes[b] for b in HomeBases if b in self.codes]
+        self.hbDep = np.isin(self.dep, bases)
+        self.hbArr = np.isin(self.arr, bases)
+        self.cancelled = np.zeros(self.n, dtype=bool)
+
+    # New times of segment n (in place, see routeAnneal.retimeSegment)
+    def retime(self, n, depday, deptime, arrday, arrtime):
+        (self.depday[n], self.deptime[n], self.arrday[n], self.arrtime[n]) = (depday, deptime, arrday, arrtime)
+        self.udep[n] = (depday-1) * 1440 + deptime
+        self.uarr[n] = (arrday-1) * 1440 + arrtime
+        self.ft[n] = self.uarr[n] - self.udep[n]
+
+    # Cancel segment n (in place, see routeAnneal.cancelSegment): it loses its connections and is
+    # left as a trip of its own, taken as based at both ends so that no start penalty applies
+    def cancel(self, n):
+        self.cancelled[n] = True
+        self.hbDep[n] = True
+        self.hbArr[n] = True
+
+    def intern(self, station):
+        if ( station not in self.codes ):
+            self.codes[station] = len(self.stations)
+            self.stations.append(station)
+        return(self.codes[station])
+
+    # gap[n1,n2]: time between the arrival of n1 and the departure of n2 (as QuboTrips.getGap)
+    def gaps(self):
+        return( self.udep[None,:] - self.uarr[:,None] )
+
+    # Segment to segment edges as decided by QuboTrips.createEdge, for n1.task_id < n2.task_id
+    # Returns the edge mask and the edge weights (cancellable, thus negative)
+    def connections(self, params):
+        N = self.n
+        gap = self.gaps()
+        connect = (self.arr[:,None] == self.dep[None,:])
+        posGap = (gap > 0)
+        isBase = np.broadcast_to(self.hbDep[None,:], (N,N))
+        minConnect = posGap & (gap >= params['const_min_connect'])
+        maxConnect = (gap < params['const_max_connect'])
+        ordered = self.task_id[:,None] < self.task_id[None,:]
+
+        edge = ordered & connect & posGap & maxConnect & (minConnect | isBase)
+        edge &= ~(self.cancelled[:,None] | self.cancelled[None,:])
+        # Edges below minimum connect on a base departure carry the cancellable bad gap
+        weight = np.where(minConnect, gap, gap * params['const_neg_gap'])
+        weight = -np.abs(weight)
+        return(edge, weight)
+
+    # Feasible (row, segment) board cells for trips spanning at most 'horizon' minutes
+    #
+    # Trips are paths of edges starting on a base departure. Listing the trips by start time (each trip
+    # in departure order), segment n can only be found between rows rank(n)-a(n) and rank(n)+b(n):
+    #   a(n): segments departing between the earliest possible start of n's trip and n
+    #   b(n): segments departing at or after n whose trip may have started before n
+    # Returns a (rows=n, cols=n) mask
+    def feasibleCells(self, params, horizon):
+        N = self.n
+        (edge, weight) = self.connections(params)
+        # Earliest base departure each segment can be reached from (itself included), in task order
+        never = np.iinfo(np.int64).max
+        earliest = np.where(self.hbDep, self.udep, never)
+        order = np.argsort(self.task_id, kind='stable')
+        for n in order:
+            pred = np.flatnonzero(edge[:,n])
+            if ( len(pred) ): earliest[n] = min(earliest[n], earliest[pred].min())
+        # Lower bound of the trip start (no base origin: only the horizon applies)
+        start = np.where(earliest <= self.udep, np.maximum(earliest, self.udep - horizon), self.udep - horizon)
+
+        other = ~np.eye(N, dtype=bool)
+        a = (other & (self.udep[None,:] >= start[:,None]) & (self.udep[None,:] <= self.udep[:,None])).sum(axis=1)
+        b = (other & (self.udep[None,:] >= self.udep[:,None]) & (start[None,:] <= self.udep[:,None])).sum(axis=1)
+
+        rank = np.empty(N, dtype=np.int64)
+        rank[np.lexsort((self.task_id, self.udep))] = np.arange(N)
+        lo = np.maximum(rank - a, 0)
+        hi = np.minimum(rank + b, N-1)
+        rows = np.arange(N)[:,None]
+        return( (rows >= lo[None,:]) & (rows <= hi[None,:]) )
@@ -0,0 +1,228 @@
+#   Copyright 2021 Mario Guzzi
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+'''
+Created on Oct. 19, 2026
+
+@author: Mario Guzzi
+'''
+
+import warnings
+
+import numpy as np
+import dimod
+
+from quzzi.qzprofile import profiler
+
+#==============================================================================================#
+# class tripEnumerator: Feasible trip enumeration on the segment connection graph              #
+#                                                                                              #
+# A trip starts on a home base departure, follows connections of the flight graph (the         #
+# segment edges of QuboTrips.G, from SegmentTable.connections) meeting the minimum connect     #
+# time, and ends on a home base arrival. Trips are enumerated depth first with pruning on:     #
+#   - max_legs : number of segments, also using the fewest legs needed to get back to a base   #
+#   - max_duty : check in to check out time in minutes (None for no limit)                     #
+#                                                                                              #
+# Trip cost is the non flying duty time: check in + connection gaps + check out.               #
+#                                                                                              #
+#==============================================================================================#
+
+class tripEnumerator:
+
+    def __init__(self, table, params, max_legs=6, max_duty=None, max_trips=200000):
+        self.T = table
+        self.params = params
+        self.max_legs = max_legs
+        self.max_duty = max_duty
+        self.max_trips = max_trips      # Stop enumerating beyond this many trips (with a warning)
+
+    # Successors of each segment: edges without the cancellable (below minimum connect) gaps
+    def successors(self):
+        (edge, weight) = self.T.connections(self.params)
+        edge &= (self.T.gaps() >= self.params['const_min_connect'])
+        return( [np.flatnonzero(edge[n]) for n in range(self.T.n)] )
+
+    # Fewest legs after each segment to arrive at a home base (0 when it arrives at one)
+    def homeLegs(self, succ):
+        never = self.T.n + 1
+        legs = np.where(self.T.hbArr, 0, never)
+        # Edges go from lower to higher task_id: resolve successors first
+        for n in np.argsort(self.T.task_id, kind='stable')[::-1]:
+            if ( legs[n] > 0 and len(succ[n]) ): legs[n] = min(never, 1 + legs[succ[n]].min())
+        return(legs)
+
+    # Is trip (segment indices) feasible: from a base departure, along successors, to a base arrival,
+    # within max_duty. The legs limit only bounds the enumeration
+    def isTrip(self, trip, succ=None):
+        T = self.T
+        if ( succ is None ): succ = self.successors()
+        if ( len(trip) == 0 or not T.hbDep[trip[0]] or not T.hbArr[trip[-1]] ): return(False)
+        if ( any(b not in succ[a] for a, b in zip(trip[:-1], trip[1:])) ): return(False)
+        if ( self.max_duty is not None and self.params['const_CI'] + T.uarr[trip[-1]] - T.udep[trip[0]] + self.params['const_CO'] > self.max_duty ): return(False)
+        return(True)
+
+    def cost(self, trip):
+        T = self.T
+        gaps = sum(int(T.udep[b] - T.uarr[a]) for a, b in zip(trip[:-1], trip[1:]))
+        return( self.params['const_CI'] + gaps + self.params['const_CO'] )
+
+    # Returns the trips (tuples of segment indices) and their costs
+    def enumerate(self):
+        T = self.T
+        CI = self.params['const_CI']
+        CO = self.params['const_CO']
+        succ = self.successors()
+        home = self.homeLegs(succ)
+        trips = []
+        for s in np.flatnonzero(T.hbDep):
+            stack = [(int(s),)]
+            while ( len(stack) ):
+                trip = stack.pop()
+                n = trip[-1]
+                if ( T.hbArr[n] ): trips.append(trip)
+                if ( len(trips) >= self.max_trips ):
+                    warnings.warn("Trip enumeration stopped at {} trips".format(self.max_trips))
+                    return( trips, [self.cost(t) for t in trips] )
+                if ( len(trip) >= self.max_legs ): continue
+                for m in succ[n]:
+                    if ( len(trip) + 1 + home[m] > self.max_legs ): continue      # Cannot get back to a base in time
+                    if ( self.max_duty is not None and CI + T.uarr[m] - T.udep[trip[0]] + CO > self.max_duty ): continue
+                    stack.append(trip + (int(m),))
+        trips.sort()
+        return( trips, [self.cost(t) for t in trips] )
+
+#==============================================================================================#
+# class partitionModel: Set partitioning trip model                                            #
+#                                                                                              #
+# One binary variable per enumerated trip. The BQM selects trips covering every segment once:  #
+#                                                                                              #
+#   H = sum_t cost_t x_t + A sum_s (1 - sum_{t covers s} x_t)^2                                #
+#                                                                                              #
+# A valid partition has the energy of its total cost. Segments that are not a feasible trip    #
+# on their own get a single segment fallback trip at the 'penalty' cost, so a partition        #
+# always exists (covering a segment is not enough: its trips may all overlap other trips).     #
+# Fallback trips are not feasible trips: a partition using any of them is not feasible         #
+# (isFeasible), and fallbacks() lists them.                                                    #
+#                                                                                              #
+# Second model type for routeAnneal (instead of the QuboTrips board):                          #
+#                                                                                              #
+#   ra = routeAnneal(dataset="DS2b.csv", homebases={"LCA":1}, depday=[1])                      #
+#   tripModel().annealer(ra)                       # Connection params                         #
+#   partitionModel(max_legs=6).annealer(ra).setConstraints()                                   #
+#   ra.solve(useNeal=True, useHyb=False)                                                       #
+#   ra.getSequences(ra.sampleset.first)                                                        #
+#                                                                                              #
+#==============================================================================================#
+
+class partitionModel:
+
+    def __init__(self, max_legs=6, max_duty=None, max_trips=200000, lagrange=None, penalty=None):
+        self.max_legs = max_legs
+        self.max_duty = max_duty
+        self.max_trips = max_trips
+        self.lagrange = lagrange        # Covering weight A (default: largest trip cost + 1)
+        self.penalty = penalty          # Fallback trip cost (default: twice the largest trip cost)
+        self.trips = []
+        self.costs = []
+        self.fallback = []              # Segments given a single segment fallback trip
+        self.enumerated = 0             # Trips before the fallback trips
+        self.bqm = None
+
+    # Use this model for routeAnneal A
+    def annealer(self,A):
+        self.A = A
+        A.PM = self
+        return(self)
+
+    def setConstraints(self):
+        A = self.A
+        with profiler.phase("enumerateTrips") as p:
+            E = tripEnumerator(A.getTable(), A.QT.params, self.max_legs, self.max_duty, self.max_trips)
+            (self.trips, self.costs) = E.enumerate()
+            p.size(trips=len(self.trips))
+
+        singles = set(trip[0] for trip in self.trips if len(trip) == 1)
+        self.fallback = [n for n in range(A.N) if n not in singles]
+        self.enumerated = len(self.trips)
+        penalty = self.penalty if self.penalty is not None else 2 * max(self.costs, default=1000)
+        for n in self.fallback:
+            self.trips.append((n,))
+            self.costs.append(penalty)
+
+        with profiler.phase("partitionQubo") as p:
+            self.bqm = self.buildBQM()
+            p.size(variables=self.bqm.num_variables, interactions=self.bqm.num_interactions)
+        return(self.bqm)
+
+    # Covering matrix: trips covering each segment
+    def covers(self):
+        cover = [[] for n in range(self.A.N)]
+        for t, trip in enumerate(self.trips):
+            for n in trip: cover[n].append(t)
+        return(cover)
+
+    def buildBQM(self):
+        A = self.lagrange if self.lagrange is not None else max(self.costs, default=0) + 1
+        bqm = dimod.BinaryQuadraticModel('BINARY')
+        for t, trip in enumerate(self.trips):
+            bqm.add_variable(t, self.costs[t] - A * len(trip))
+        for cover in self.covers():
+            for i in range(len(cover)):
+                for j in range(i+1, len(cover)):
+                    bqm.add_interaction(cover[i], cover[j], 2 * A)
+        bqm.offset = A * self.A.N
+        return(bqm)
+
+    def getBQM(self):
+        if ( self.bqm is None ): self.setConstraints()
+        return(self.bqm)
+
+    def selected(self, sample):
+        return( [t for t in range(len(self.trips)) if sample[t] == 1] )
+
+    # Does the sample cover every segment exactly once
+    def isPartition(self, sample):
+        count = np.zeros(self.A.N, dtype=int)
+        for t in self.selected(sample):
+            count[list(self.trips[t])] += 1
+        return( bool((count == 1).all()) )
+
+    # Fallback trips selected in the sample, as sequences of task ids
+    def fallbacks(self, sample):
+        return( [[self.A.segments[n].obj.task_id for n in self.trips[t]] for t in self.selected(sample) if t >= self.enumerated] )
+
+    # Is the sample a partition into feasible (enumerated) trips
+    def isFeasible(self, sample):
+        return( self.isPartition(sample) and len(self.fallbacks(sample)) == 0 )
+
+    # Encode sequences of task ids into the trip variables. Sequences that are not enumerated
+    # trips are left out (with a warning). Returns {variable: 0/1}
+    def encodeSequences(self, sequences):
+        index = {trip: t for t, trip in enumerate(self.trips)}
+        row = {s.obj.task_id: n for n, s in enumerate(self.A.segments)}
+        x = {t: 0 for t in range(len(self.trips))}
+        missing = 0
+        for seq in (sequences.values() if isinstance(sequences, dict) else sequences):
+            trip = tuple(row[t] for t in seq)
+            if ( trip in index ):
+                x[index[trip]] = 1
+            else:
+                missing += 1
+        if ( missing ): warnings.warn("{} sequences are not enumerated trips".format(missing))
+        return(x)
+
+    # Selected trips as sequences of task ids (as schedData.get_sequences), fallback trips included
+    def sequences(self, sample):
+        trips = sorted(self.trips[t] for t in self.selected(sample))
+        return( {i: [self.A.segments[n].obj.task_id for n in trip] for i, trip in enumerate(trips)} )
@@ -0,0 +1,160 @@
+#   Copyright 2021 Mario Guzzi
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+'''
+Created on Oct. 19, 2026
+
+@author: Mario Guzzi
+'''
+
+import numpy as np
+
+#==============================================================================================#
+# class sizePredictor: Problem size and resource prediction before building the QUBO          #
+#                                                                                              #
+# Computes, from the loaded schedData, the QuboTrips params and the home bases only, what the  #
+# tripModel.setConstraints build will produce:                                                 #
+#   - board variables (N x N grid plus N start flags)                                          #
+#   - ancillas created by the applyStart cubic gap reductions                                  #
+#   - keys and nonzeros per Qubo layer and for the final problem Qubo                          #
+#   - an estimate of the memory used by the build                                              #
+#                                                                                              #
+# The segment connection matrix is evaluated on the SegmentTable as in buildFltGraph, so the   #
+# prediction costs O(N^2) instead of the O(N^4) build.                                         #
+#                                                                                              #
+# An optional board mask (QuboTrips.buildFeasibleCells) restricts the counts to the feasible   #
+# cells. Pair counts between consecutive rows are then sum((M[r] @ W) * M[r+1]).               #
+#                                                                                              #
+# Usage:                                                                                       #
+#                                                                                              #
+#   P = sizePredictor(ra.FD, ra.QT.params, ra.HomeBases)                                       #
+#   size = P.predict()                                                                         #
+#   if ( P.exceeds(max_variables=20000) ): ...  decompose the day                              #
+#                                                                                              #
+#==============================================================================================#
+
+class sizePredictor:
+
+    # Approximate memory of one Qubo dictionary entry (tuple key, ints, float value, dict slot)
+    bytesPerKey = 100
+
+    def __init__(self, FD, params, HomeBases, LG=1, mask=None):
+        self.FD = FD
+        self.params = params
+        self.HomeBases = HomeBases
+        self.LG = LG            # Lagrange applied to the gaps (H.HD in setConstraints)
+        self.N = FD.N
+        # Feasible board cells (rows x segments), full board by default
+        self.mask = np.ones((self.N,self.N), dtype=bool) if mask is None else np.array(mask, dtype=bool)
+        self.size = None
+
+    # Segment to segment edges and weights as in QuboTrips.buildFltGraph (SegmentTable.connections)
+    # Returns the edge mask and the gaps grid of QuboTrips.buildGapsFromG
+    def connections(self):
+        T = self.FD.getTable(self.HomeBases)
+        (edge, weight) = T.connections(self.params)
+        grid = np.full((self.N,self.N), -float(self.LG * self.params['const_bad']))
+        grid[edge] = weight[edge]
+        return(edge, grid, T.hbDep, T.hbArr)
+
+    # Number of (row r, row r+1) cell pairs where W[n1,n2] holds, for rows first to last-1
+    def pairs(self, W, first=0, last=None):
+        M = self.mask[first:last]
+        return( int(((M[:-1].astype(np.int64) @ W.astype(np.int64)) * M[1:]).sum()) )
+
+    def predict(self):
+        N = self.N
+        M = self.mask
+        (edge, grid, hbDep, hbArr) = self.connections()
+        E = int(edge.sum())
+        cDep = int(hbDep.sum())
+        cArr = int(hbArr.sum())
+        K = int(M.sum())                                         # Board cells
+        first = M[:-1].sum(axis=0)                               # Cells per segment, all rows except last
+        perRow = M.sum(axis=1)
+        perCol = M.sum(axis=0)
+        allPairs = np.ones((N,N), dtype=bool)
+
+        baseToBase = hbArr[:,None] & hbDep[None,:]
+        validGap = (grid > 0)
+
+        layers = {}
+        # One node per row and per column, must start on flag 0
+        rowcol = int((perRow*(perRow-1)//2).sum() + (perCol*(perCol-1)//2).sum())   # Same row and same column pairs
+        layers['constraint'] = {'keys': K + rowcol + 1, 'nonzeros': K + rowcol + 1}
+        # Every consecutive row pair is visited, weights only where no edge exists
+        layers['misconnect'] = {'keys': self.pairs(allPairs), 'nonzeros': self.pairs(~edge)}
+        badstarts = int(perCol[~hbDep].sum() + first[~hbArr].sum())
+        layers['badstarts'] = {'keys': badstarts, 'nonzeros': badstarts}
+        objective = K + self.pairs(validGap)
+        layers['objective'] = {'keys': objective, 'nonzeros': objective}
+        gaps = validGap | (~validGap & baseToBase)
+        # applyStart reads the -gaps- layer for every pair into a base departure (rows 1 to N-2),
+        # leaving zero keys where no gap was stored
+        lookups = self.pairs(hbDep[None,:] & ~gaps, last=-1)
+        layers['-gaps-'] = {'keys': self.pairs(gaps) + lookups, 'nonzeros': self.pairs(gaps & (grid != 0))}
+        invalid = ~validGap & ~baseToBase
+        layers['invalid-gaps'] = {'keys': self.pairs(invalid), 'nonzeros': self.pairs(invalid & (grid != 0))}
+        cico = int(first[hbDep].sum() + first[hbArr].sum())
+        layers['audit-CICO'] = {'keys': cico, 'nonzeros': cico}
+
+        # applyStart: one ancilla per cancellable gap pair (previous row, row) for rows 1 to N-2
+        # whose target departs a base. Each adds the ancilla-flag pair, and the substitution
+        # constraint: the pair, 2 ancilla pairs and the ancilla linear.
+        cancellable = hbDep[None,:] & (validGap | (baseToBase & (-grid > 0)))
+        ancillas = self.pairs(cancellable, last=-1)
+        layers['cubic-gap'] = {'keys': ancillas, 'nonzeros': ancillas}
+        layers['substitutions'] = {'keys': 4*ancillas, 'nonzeros': 4*ancillas}
+
+        # Union of keys in the problem Qubo
+        consec = self.pairs(allPairs) - self.pairs(np.eye(N, dtype=bool))     # Consecutive rows, less same column
+        flags = 2*int(first.sum()) + int(M[-1][~hbDep].sum()) if N else 0  # Flag with same row and previous row
+        terms = K + 1 + rowcol + consec + flags + 4*ancillas
+
+        variables = K + N + ancillas
+        stored = sum(l['keys'] for l in layers.values())
+        self.size = {'segments': N,
+                     'edges': E + N*(cDep + cArr),
+                     'board': K + N,
+                     'pruned': N*N - K,
+                     'ancillas': ancillas,
+                     'variables': variables,
+                     'layers': layers,
+                     'terms': terms,
+                     'interactions': terms - (K + 1 + ancillas),
+                     'memory': (stored + 2*terms) * self.bytesPerKey}
+        return(self.size)
+
+    # Reasons for rejecting the problem, empty when within the limits
+    def exceeds(self, max_variables=None, max_interactions=None, max_memory=None):
+        size = self.size if self.size is not None else self.predict()
+        reasons = []
+        if ( max_variables is not None and size['variables'] > max_variables ):
+            reasons.append("variables {} > {}".format(size['variables'], max_variables))
+        if ( max_interactions is not None and size['interactions'] > max_interactions ):
+            reasons.append("interactions {} > {}".format(size['interactions'], max_interactions))
+        if ( max_memory is not None and size['memory'] > max_memory ):
+            reasons.append("memory {} > {}".format(size['memory'], max_memory))
+        return(reasons)
+
+    def print(self):
+        size = self.size if self.size is not None else self.predict()
+        print("Segments    :", size['segments'])
+        print("Graph edges :", size['edges'])
+        print("Variables   :", size['variables'], "( board", size['board'], "+ ancillas", size['ancillas'], ")")
+        if ( size['pruned'] ): print("Pruned cells:", size['pruned'])
+        for name, l in size['layers'].items():
+            print("   {:14s} keys {:12d} nonzeros {:12d}".format(name, l['keys'], l['nonzeros']))
+        print("Qubo terms  :", size['terms'], "interactions", size['interactions'])
+        print("Memory (est):", size['memory'], "bytes")
@@ -0,0 +1,170 @@
+#   Copyright 2021 Mario Guzzi
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+'''
+Created on Oct. 19, 2026
+
+@author: Mario Guzzi
+'''
+
+import time
+import threading
+import tracemalloc
+
+#==============================================================================================#
+# class phaseProfiler: Phase level instrumentation of the Quzzi pipeline                       #
+#                                                                                              #
+# Records the duration, peak memory (optional) and output sizes of named phases such as        #
+# loadFlts, buildFltGraph, each apply* layer, problemQubo, bqm, sample and decode.             #
+# Disabled by default: a disabled profiler costs one attribute test per phase.                 #
+#                                                                                              #
+# Usage:                                                                                       #
+#                                                                                              #
+#   from quzzi.qzprofile import profiler                                                       #
+#   profiler.enable(memory=True)                                                               #
+#   with profiler.phase("buildFltGraph") as p:                                                 #
+#       G = ...                                                                                #
+#       p.size(edges=G.number_of_edges())                                                      #
+#   profiler.print()                                                                           #
+#                                                                                              #
+#==============================================================================================#
+
+class phaseProfiler:
+
+    # One measured phase
+    class phaseRecord:
+        def __init__(self, name, depth):
+            self.name = name
+            self.depth = depth
+            self.start = 0.0
+            self.time = 0.0
+            self.base = 0         # traced memory at start of phase
+            self.peak = 0         # peak traced memory during the phase (bytes above base)
+            self.inner = 0        # peak reported by nested phases
+            self.sizes = {}
+
+        def size(self, **sizes):
+            self.sizes.update(sizes)
+            return(self)
+
+        def export(self):
+            rec = {'phase': self.name, 'depth': self.depth, 'time': self.time, 'peak': self.peak}
+            rec.update(self.sizes)
+            return(rec)
+
+    # Context returned when disabled
+    class noPhase:
+        def size(self, **sizes):
+            return(self)
+        def __enter__(self):
+            return(self)
+        def __exit__(self, *args):
+            return(False)
+
+    def __init__(self):
+        self.enabled = False
+        self.memory = False
+        self.records = []
+        self.local = threading.local()
+        self.idle = self.noPhase()
+
+    def enable(self, memory=False):
+        self.enabled = True
+        self.memory = memory
+        if ( memory and not tracemalloc.is_tracing() ):
+            tracemalloc.start()
+        return(self)
+
+    def disable(self):
+        self.enabled = False
+        if ( self.memory and tracemalloc.is_tracing() ):
+            tracemalloc.stop()
+        self.memory = False
+        return(self)
+
+    def clear(self):
+        self.records = []
+
+    def stack(self):
+        if ( not hasattr(self.local,'stack') ): self.local.stack = []
+        return(self.local.stack)
+
+    # Measure a named phase
+    def phase(self, name):
+        if ( not self.enabled ): return(self.idle)
+        return(self.measure(self, name))
+
+    class measure:
+        def __init__(self, profiler, name):
+            self.profiler = profiler
+            self.rec = profiler.phaseRecord(name, len(profiler.stack()))
+
+        def __enter__(self):
+            P = self.profiler
+            stack = P.stack()
+            if ( P.memory ):
+                (current, peak) = tracemalloc.get_traced_memory()
+                # Keep the parent peak before resetting it for this phase
+                if ( len(stack) ): stack[-1].inner = max(stack[-1].inner, peak)
+                tracemalloc.reset_peak()
+                self.rec.base = current
+            stack.append(self.rec)
+            P.records.append(self.rec)      # Listed in start order
+            self.rec.start = time.perf_counter()
+            return(self.rec)
+
+        def __exit__(self, *args):
+            P = self.profiler
+            rec = self.rec
+            rec.time = time.perf_counter() - rec.start
+            stack = P.stack()
+            stack.pop()
+            if ( P.memory ):
+                peak = max(rec.inner, tracemalloc.get_traced_memory()[1])
+                rec.peak = peak - rec.base
+                if ( len(stack) ): stack[-1].inner = max(stack[-1].inner, peak)
+            return(False)
+
+    # Record a phase measured elsewhere (e.g. in a worker process)
+    def add(self, name, duration, **sizes):
+        if ( not self.enabled ): return
+        rec = self.phaseRecord(name, len(self.stack()))
+        rec.time = duration
+        rec.size(**sizes)
+        self.records.append(rec)
+
+    # Export phases as a list of dictionaries, optionally from a given record index
+    def export(self, since=0):
+        return([r.export() for r in self.records[since:]])
+
+    # Totals per phase name
+    def summary(self, since=0):
+        totals = {}
+        for r in self.records[since:]:
+            if ( r.name not in totals ):
+                totals[r.name] = {'count': 0, 'time': 0.0, 'peak': 0}
+            t = totals[r.name]
+            t['count'] += 1
+            t['time'] += r.time
+            t['peak'] = max(t['peak'], r.peak)
+            t.update(r.sizes)
+        return(totals)
+
+    def print(self, since=0):
+        for r in self.records[since:]:
+            sizes = " ".join("{}={}".format(k,v) for k,v in r.sizes.items())
+            print("{:40s} {:10.4f}s {:12d}B {}".format('  '*r.depth + r.name, r.time, r.peak, sizes))
+
+# Shared profiler for the whole pipeline
+profiler = phaseProfiler()
@@ -101,9 +101,10 @@ class quadCoeff:
 class highOrderExpression:
     # Hold one expression term : W x [ v1 x v2 x v3 x ... x vn ]
     class oneterm:
-        def __init__(self,W,variables):
+        def __init__(self,W,variables,penalty=False):
             self.vars = variables
             self.W = W
+            self.penalty = penalty      # Substitution constraint term (see applyQubo)
         def getOrder(self):
             return(len(self.vars))
 
@@ -144,9 +145,10 @@ class highOrderExpression:
     # Add a term with penalty P and coefficient C to the expression
     # P is the penalty weight to place on the variable reduction constraint
     # C is the coefficient intended for the original expression
-    def add(self,x,P,C):
+    # penalty marks the terms of the substitution constraint
+    def add(self,x,P,C,penalty=False):
         #print("Adding this term:",x,P*C)
-        self.terms.append(self.oneterm(P*C,x))
+        self.terms.append(self.oneterm(P*C,x,penalty))
         return(self)
     
     def trim(self):
@@ -230,10 +232,10 @@ class highOrderExpression:
         
         # Generate the following terms from x and y
         # P(x0x1 -2x0y0 -2x1y0 +3y0) + Wy0x2     Note: x2 may be an array of n remaining terms requiring further reduction
-        self.add([x[0],x[1]], P,  1)
-        self.add([x[0],y[0]], P, -2)
-        self.add([x[1],y[0]], P, -2)
-        self.add([y[0]],      P, +3)
+        self.add([x[0],x[1]], P,  1, penalty=True)
+        self.add([x[0],y[0]], P, -2, penalty=True)
+        self.add([x[1],y[0]], P, -2, penalty=True)
+        self.add([y[0]],      P, +3, penalty=True)
         #self.add(x[2:]+[y[0]], W, 1) # Add the remaining term with the substituted variable
         self.add([y[0]]+x[2:], W, 1) # Add the remaining term with the substituted variable
         #return(exp)
@@ -345,10 +347,13 @@ class highOrderExpression:
                     #print("Q%d%d=%d" % (i,j,Q[(i,j)]))
         return (Q)
         
-    def applyQubo(self,Q):
+    # Substitution constraint terms go to penaltyQ when given (to weigh them as a layer of their own)
+    def applyQubo(self,Q,penaltyQ=None):
+        target = Q
         if ( self.getExpressionOrder()<3 ):
             for t in self.terms:
                 if ( t is not None ):
+                    Q = penaltyQ if ( t.penalty and penaltyQ is not None ) else target
 
                     # Linear Qii terms
                     if ( len(t.vars) == 1 ):
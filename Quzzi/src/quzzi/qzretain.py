@@ -0,0 +1,97 @@
+#   Copyright 2021 Mario Guzzi
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+'''
+Created on Oct. 19, 2026
+
+@author: Mario Guzzi
+'''
+
+import numpy as np
+import dimod
+
+#==============================================================================================#
+# class topSamples: Bounded sampleset retention                                                #
+#                                                                                              #
+# Keeps the k unique samples of lowest energy over the samplesets added (samplers, parallel    #
+# shards), with their occurrences aggregated. Memory stays at k samples whatever the number    #
+# of reads. Occurrences of a sample are counted while it is retained: a sample evicted then    #
+# seen again restarts its count. The info of the samplesets is kept (merged, a later one       #
+# taking precedence on shared keys), with reads (occurrences added) and retained (samples      #
+# kept).                                                                                       #
+#                                                                                              #
+# Usage (see routeAnneal.solve(topk=) and bench(topk=)):                                       #
+#                                                                                              #
+#   T = topSamples(k=10)                                                                       #
+#   for shard in shards: T.add(shard)                                                          #
+#   sampleset = T.sampleset()                                                                  #
+#                                                                                              #
+#==============================================================================================#
+
+class topSamples:
+
+    def __init__(self, k=10):
+        self.k = k
+        self.variables = None
+        self.vartype = None
+        self.retained = {}          # Sample bytes: [energy, occurrences, sample]
+        self.reads = 0              # Occurrences added
+        self.worst = None           # Highest retained energy when full
+        self.info = {}              # Merged info of the samplesets added
+
+    # Merge a sampleset. Returns self
+    def add(self, sampleset):
+        if ( self.variables is None ):
+            self.variables = list(sampleset.variables)
+            self.vartype = sampleset.vartype
+        self.info.update(sampleset.info)
+        if ( len(sampleset) == 0 ): return(self)
+        index = {v: i for i, v in enumerate(sampleset.variables)}
+        if ( len(index) != len(self.variables) or any(v not in index for v in self.variables) ):
+            raise ValueError("Samplesets over different variables cannot be merged")
+        record = sampleset.record
+        samples = record.sample[:, [index[v] for v in self.variables]]
+        energies = record.energy
+        occurrences = record.num_occurrences
+        self.reads += int(occurrences.sum())
+
+        # Identical samples have identical energies: past the worst retained energy, nothing
+        # can enter nor add to a retained sample
+        for i in np.argsort(energies, kind='stable'):
+            energy = float(energies[i])
+            if ( self.worst is not None and energy > self.worst ): break
+            key = samples[i].tobytes()
+            if ( key in self.retained ):
+                self.retained[key][1] += int(occurrences[i])
+                continue
+            if ( len(self.retained) >= self.k ):
+                if ( energy >= self.worst ): continue
+                del self.retained[max(self.retained, key=lambda s: self.retained[s][0])]
+            self.retained[key] = [energy, int(occurrences[i]), samples[i].copy()]
+            if ( len(self.retained) >= self.k ): self.worst = max(r[0] for r in self.retained.values())
+        return(self)
+
+    # Retained samples as a sampleset, by increasing energy
+    def sampleset(self):
+        rows = sorted(self.retained.values(), key=lambda r: r[0])
+        info = dict(self.info, reads=self.reads, retained=len(rows))
+        if ( len(rows) == 0 ): return( dimod.SampleSet.from_samples(([], self.variables or []), self.vartype or dimod.BINARY, energy=[], info=info) )
+        return( dimod.SampleSet.from_samples((np.array([r[2] for r in rows]), self.variables), self.vartype,
+                                             energy=[r[0] for r in rows], num_occurrences=[r[1] for r in rows], info=info) )
+
+# Keep the top k unique samples of a sampleset (all of them when k is None)
+
+def retain(sampleset, k=None):
+    if ( k is None ): return(sampleset)
+    return( topSamples(k).add(sampleset).sampleset() )
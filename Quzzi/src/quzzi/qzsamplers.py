@@ -0,0 +1,161 @@
+#   Copyright 2021 Mario Guzzi
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+'''
+Created on Oct. 19, 2026
+
+@author: Mario Guzzi
+'''
+
+import time
+import warnings
+
+import numpy as np
+import scipy.sparse as sp
+from scipy.optimize import milp, LinearConstraint, Bounds
+import dimod
+import neal
+
+#==============================================================================================#
+# Local samplers                                                                               #
+#                                                                                              #
+# latencySampler: Stand-in for a remote solver. Samples locally with a configurable latency    #
+#                 so asynchronous and concurrent benchmarks can be exercised offline           #
+#                                                                                              #
+# milpSampler:    Classical MILP backend (scipy.optimize.milp, HiGHS). Solves the set          #
+#                 partitioning model (qzpartition) directly, or a small BQM once linearized.   #
+#                 Returns one sample as a dimod SampleSet, with info['optimal'] False (and a   #
+#                 warning) when HiGHS stopped at time_limit on its best solution found.        #
+#                 The linearization is exact but its relaxation is weak: on board sized BQMs   #
+#                 (the penalty layers of QuboTrips) HiGHS does not get past trivial solutions  #
+#                 within any practical time, so BQMs above max_interactions are refused: use   #
+#                 the set partitioning model instead.                                          #
+#                                                                                              #
+#==============================================================================================#
+
+class latencySampler(dimod.Sampler):
+
+    # latency : seconds added to every call (emulates queueing and network time)
+    # child   : local sampler doing the actual work (Simulated Annealing by default)
+
+    def __init__(self, latency=1.0, child=None):
+        self.latency = latency
+        self.child = child if child is not None else neal.SimulatedAnnealingSampler()
+
+    @property
+    def parameters(self):
+        return self.child.parameters
+
+    @property
+    def properties(self):
+        return {'latency': self.latency, 'child_properties': self.child.properties}
+
+    def sample(self, bqm, **parameters):
+        t1 = time.time()
+        sampleset = self.child.sample(bqm, **parameters)
+        sampleset.resolve()
+        # Sleep only what remains of the latency once sampling is done
+        remaining = self.latency - (time.time() - t1)
+        if ( remaining > 0 ): time.sleep(remaining)
+        return(sampleset)
+
+class milpSampler(dimod.Sampler):
+
+    # model : partitionModel. Its BQM is solved as  min cost.x  subject to  cover.x = 1
+    #         Any other BQM is linearized with one product variable y_ij per interaction:
+    #         y_ij >= x_i + x_j - 1 for positive biases, y_ij <= x_i and y_ij <= x_j for negative ones
+    # max_interactions : largest BQM linearized (None for no limit)
+
+    def __init__(self, model=None, max_interactions=10000):
+        self.model = model
+        self.max_interactions = max_interactions
+
+    @property
+    def parameters(self):
+        return {'time_limit': [], 'mip_rel_gap': [], 'num_reads': []}
+
+    @property
+    def properties(self):
+        return {'backend': 'scipy.optimize.milp'}
+
+    # num_reads is accepted for compatibility with the other samplers: a single solution is returned
+    def sample(self, bqm, time_limit=None, mip_rel_gap=None, num_reads=1, **parameters):
+        options = {}
+        if ( time_limit is not None ): options['time_limit'] = time_limit
+        if ( mip_rel_gap is not None ): options['mip_rel_gap'] = mip_rel_gap
+
+        t1 = time.time()
+        binary = bqm if bqm.vartype is dimod.BINARY else bqm.change_vartype(dimod.BINARY, inplace=False)
+        if ( self.model is not None and self.model.bqm is bqm ):
+            (labels, x, res) = self.solvePartition(options)
+            path = 'partition'
+        else:
+            if ( self.max_interactions is not None and bqm.num_interactions > self.max_interactions ):
+                raise ValueError("BQM of {} interactions is too large to linearize (max_interactions={}): use the set partitioning model".format(
+                                 bqm.num_interactions, self.max_interactions))
+            (labels, x, res) = self.solveBQM(binary, options)
+            path = 'linearized'
+        if ( x is None ):
+            raise ValueError("MILP found no solution: " + str(res.message))
+
+        sample = np.round(x[:len(labels)]).astype(np.int8)
+        if ( bqm.vartype is dimod.SPIN ): sample = 2 * sample - 1
+        info = {'status': int(res.status), 'message': res.message, 'time': time.time() - t1,
+                'optimal': res.status == 0, 'path': path, 'gap': getattr(res, 'mip_gap', None)}
+        sampleset = dimod.SampleSet.from_samples_bqm((sample[None,:], labels), bqm, info=info)
+        if ( res.status != 0 ):
+            warnings.warn("MILP stopped before optimality ({}): best solution found at energy {}".format(res.message, sampleset.first.energy))
+        return( sampleset )
+
+    # Set partitioning: one binary per trip, every segment covered once
+    def solvePartition(self, options):
+        model = self.model
+        cols = [t for t, trip in enumerate(model.trips) for n in trip]
+        rows = [n for trip in model.trips for n in trip]
+        cover = sp.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(model.A.N, len(model.trips)))
+        res = milp(c=np.array(model.costs, dtype=float),
+                   constraints=LinearConstraint(cover, 1, 1),
+                   integrality=np.ones(len(model.trips)),
+                   bounds=Bounds(0, 1),
+                   options=options)
+        return( list(range(len(model.trips))), res.x, res )
+
+    # Linearized BQM: binaries x then continuous products y
+    def solveBQM(self, bqm, options):
+        (h, (irow, icol, J), offset, labels) = bqm.to_numpy_vectors(return_labels=True)
+        n = len(h)
+        m = len(J)
+        k = np.arange(m)
+        blocks = []
+        # Positive bias: y_k - x_i - x_j >= -1
+        pos = k[J > 0]
+        if ( len(pos) ):
+            A = sp.csr_matrix((np.concatenate([np.ones(len(pos)), -np.ones(2*len(pos))]),
+                               (np.tile(np.arange(len(pos)), 3), np.concatenate([n + pos, irow[pos], icol[pos]]))),
+                              shape=(len(pos), n + m))
+            blocks.append(LinearConstraint(A, -1, np.inf))
+        # Negative bias: y_k - x_i <= 0 and y_k - x_j <= 0
+        neg = k[J < 0]
+        for ends in (irow, icol):
+            if ( len(neg) ):
+                A = sp.csr_matrix((np.concatenate([np.ones(len(neg)), -np.ones(len(neg))]),
+                                   (np.tile(np.arange(len(neg)), 2), np.concatenate([n + neg, ends[neg]]))),
+                                  shape=(len(neg), n + m))
+                blocks.append(LinearConstraint(A, -np.inf, 0))
+        res = milp(c=np.concatenate([h, J]).astype(float),
+                   constraints=blocks,
+                   integrality=np.concatenate([np.ones(n), np.zeros(m)]),
+                   bounds=Bounds(0, 1),
+                   options=options)
+        return( labels, res.x, res )
@@ -0,0 +1,139 @@
+#   Copyright 2021 Mario Guzzi
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+'''
+Created on Oct. 19, 2026
+
+@author: Mario Guzzi
+'''
+
+import os
+import shutil
+import tempfile
+
+from quzzi.qzprofile import profiler
+from quzzi.qzsynth import schedGenerator
+from quzzi.qzanneal import routeAnneal
+from quzzi.tripModel import tripModel
+from quzzi.qzstore import resultStore
+
+#==============================================================================================#
+# class scaleBench: Scaling benchmark of the QUBO build, sampling and decoding                 #
+#                                                                                              #
+# Sweeps segment counts on synthetic schedules (schedGenerator) and records, for every phase   #
+# (graph build, each setConstraints layer, problemQubo, bqm, sampling, decoding): time, peak   #
+# memory, variable count, nonzero count and ancilla count. Output is one json line per         #
+# (size, phase) so that runs of different versions can be compared with compare(). A run       #
+# replaces the rows of its output file.                                                        #
+#                                                                                              #
+# Usage:                                                                                       #
+#                                                                                              #
+#   S = scaleBench(label="v1")                                                                 #
+#   S.run(sizes=[10,20,30], filename="scaling.jsonl")                                          #
+#   S.compare("scaling-v0.jsonl", "scaling.jsonl")                                             #
+#                                                                                              #
+#==============================================================================================#
+
+class scaleBench:
+
+    def __init__(self, label="", reads=10, seed=0, memory=True, generator=None, verbose=True):
+        self.label = label              # Version or run label written in every row
+        self.reads = reads              # Sampling reads (Simulated Annealing)
+        self.seed = seed
+        self.memory = memory            # Trace peak memory (slower)
+        self.verbose = verbose
+        # Generator parameters (see schedGenerator)
+        self.generator = generator if generator is not None else {'hubs': 1, 'spokes': 12, 'days': 1}
+        self.rows = []
+
+    # Build, sample and decode one size. Returns the rows for that size
+    def runSize(self, N, folder):
+        G = schedGenerator(seed=self.seed, **self.generator)
+        dataset = os.path.join(folder, "synth-{}.csv".format(N))
+        G.write(dataset, segments=N)
+
+        profiler.clear()
+        profiler.enable(memory=self.memory)
+        try:
+            ra = routeAnneal(dataset=dataset, homebases=G.homeBases())
+            model = tripModel().annealer(ra)
+            model.setConstraints()
+            bqm = ra.getBQM()
+            ra.sampleset = ra.sample(bqm, useNeal=True, useHyb=False, num_reads=self.reads, verbose=False)
+            with profiler.phase("decode") as p:
+                best = ra.sampleset.first
+                sequences = ra.FD.get_sequences(ra, (best.sample, best.energy))
+                p.size(sequences=len(sequences))
+            records = profiler.export()
+        finally:
+            profiler.disable()
+
+        rows = []
+        for rec in records:
+            row = {'label': self.label, 'N': N, 'segments': ra.N, 'phase': rec['phase'], 'depth': rec['depth'],
+                   'time': rec['time'], 'peak': rec['peak'],
+                   'variables': rec.get('variables'), 'nonzeros': rec.get('nonzeros'), 'ancillas': rec.get('ancillas')}
+            if ( rec['phase'] == 'buildFltGraph' ):
+                row['nonzeros'] = rec.get('edges')
+            if ( rec['phase'] == 'bqm' ):
+                row['nonzeros'] = rec.get('interactions')
+                row['ancillas'] = ra.QT.board.ancillas()
+            if ( rec['phase'] == 'sample' ):
+                row['time_per_read'] = rec['time'] / self.reads
+                row['ancillas'] = ra.QT.board.ancillas()
+                row['energy'] = float(best.energy)
+            if ( 'qubo' in rec ): row['qubo'] = rec['qubo']
+            rows.append(row)
+        return(rows)
+
+    def run(self, sizes=[10,20,30], filename=None):
+        store = None
+        if ( filename is not None ):
+            # Rows of a previous run would be summed with these by compare()
+            if ( os.path.exists(filename) ): os.remove(filename)
+            store = resultStore(filename)
+        folder = tempfile.mkdtemp(prefix="qzscale")
+        try:
+            for N in sizes:
+                rows = self.runSize(N, folder)
+                for row in rows:
+                    if ( self.verbose and row['depth'] == 0 ):
+                        print("N={:5d} {:32s} {:10.4f}s {:12d}B vars={} nz={} anc={}".format(
+                            N, row['phase'], row['time'], row['peak'], row['variables'], row['nonzeros'], row['ancillas']))
+                    if ( store is not None ): store.write(row)
+                self.rows.extend(rows)
+        finally:
+            shutil.rmtree(folder, ignore_errors=True)
+        return(self.rows)
+
+    # Compare two runs on a field (time by default) for top level phases
+    def compare(self, fileA, fileB, field='time'):
+        def load(filename):
+            values = {}
+            for rec in resultStore(filename).read(depth=0):
+                key = (rec['N'], rec['phase'])
+                values[key] = values.get(key, 0) + (rec.get(field) or 0)   # Sum repeated phases
+            return(values)
+        A = load(fileA)
+        B = load(fileB)
+        result = []
+        for key in sorted(set(A) | set(B)):
+            a = A.get(key)
+            b = B.get(key)
+            ratio = (b / a) if (a and b is not None) else None
+            result.append((key[0], key[1], a, b, ratio))
+            if ( self.verbose ):
+                print("N={:5d} {:32s} {:>14} {:>14} {}".format(key[0], key[1], str(a), str(b),
+                      "" if ratio is None else "x{:.2f}".format(ratio)))
+        return(result)
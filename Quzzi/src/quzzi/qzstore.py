@@ -0,0 +1,120 @@
+#   Copyright 2021 Mario Guzzi
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+'''
+Created on Oct. 19, 2026
+
+@author: Mario Guzzi
+'''
+
+import json
+import math
+import os
+import time
+
+import numpy as np
+
+#==============================================================================================#
+# class resultStore: Structured benchmark result store                                         #
+#                                                                                              #
+# One json object per line (JSONL), appended as results arrive. Each record holds the run      #
+# parameters, timings and sizes and only the compact best sample (list of variables set to 1). #
+# Reads are streamed line by line so long sweeps are never held in memory.                     #
+#                                                                                              #
+# Aggregate queries:                                                                           #
+#   successProbability(target)   Fraction of runs reaching the target energy                   #
+#   timeToTarget(target)         Expected time to reach the target with a given confidence     #
+#   runtimeStats()               Median and p95 runtime                                        #
+# each grouped by solver and problem size (nodes) unless other keys are given                  #
+#                                                                                              #
+#==============================================================================================#
+
+class resultStore:
+
+    def __init__(self, filename="results.jsonl"):
+        self.filename = filename
+
+    # Compact form of a sample: the variables set to 1
+    @staticmethod
+    def compact(sample):
+        return( sorted(int(v) for v, val in sample.items() if val) )
+
+    def write(self, record):
+        record = dict(record)
+        if ( 'timestamp' not in record ): record['timestamp'] = time.time()
+        with open(self.filename, 'a') as out_file:
+            out_file.write(json.dumps(record, default=self.jsonValue) + "\n")
+
+    # numpy values are not json serializable
+    @staticmethod
+    def jsonValue(v):
+        if ( isinstance(v, np.integer) ): return int(v)
+        if ( isinstance(v, np.floating) ): return float(v)
+        if ( isinstance(v, np.ndarray) ): return v.tolist()
+        raise TypeError("Not serializable: {}".format(type(v)))
+
+    def clear(self):
+        if ( os.path.exists(self.filename) ): os.remove(self.filename)
+
+    # Stream records, optionally only those matching all of the given key=value filters
+    def read(self, **filters):
+        if ( not os.path.exists(self.filename) ): return
+        with open(self.filename, 'r') as in_file:
+            for line in in_file:
+                if ( line.strip() == "" ): continue
+                rec = json.loads(line)
+                if ( all(rec.get(k) == v for k, v in filters.items()) ):
+                    yield rec
+
+    def groupKey(self, rec, by):
+        return( tuple(rec.get(k) for k in by) )
+
+    # Runs and hits (energy <= target) per group
+    def successProbability(self, target, by=('solver','nodes'), **filters):
+        groups = {}
+        for rec in self.read(**filters):
+            key = self.groupKey(rec, by)
+            if ( key not in groups ): groups[key] = {'runs': 0, 'hits': 0, 'time': 0.0}
+            g = groups[key]
+            g['runs'] += 1
+            g['time'] += rec['time']
+            if ( rec['energy'] <= target ): g['hits'] += 1
+        for g in groups.values():
+            g['p'] = g['hits'] / g['runs']
+            g['mean_time'] = g['time'] / g['runs']
+        return(groups)
+
+    # Time to target: mean run time x ln(1-confidence) / ln(1-p)
+    def timeToTarget(self, target, confidence=0.99, by=('solver','nodes'), **filters):
+        result = {}
+        for key, g in self.successProbability(target, by=by, **filters).items():
+            p = g['p']
+            if ( p <= 0.0 ):
+                ttt = math.inf
+            elif ( p >= 1.0 ):
+                ttt = g['mean_time']
+            else:
+                ttt = g['mean_time'] * math.log(1.0 - confidence) / math.log(1.0 - p)
+            result[key] = {'ttt': ttt, 'p': p, 'runs': g['runs']}
+        return(result)
+
+    # Median and 95th percentile of runtimes per group
+    def runtimeStats(self, by=('solver','nodes'), **filters):
+        times = {}
+        for rec in self.read(**filters):
+            times.setdefault(self.groupKey(rec, by), []).append(rec['time'])
+        result = {}
+        for key, t in times.items():
+            result[key] = {'count': len(t), 'median': float(np.median(t)), 'p95': float(np.percentile(t, 95))}
+        return(result)
@@ -0,0 +1,164 @@
+#   Copyright 2021 Mario Guzzi
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+'''
+Created on Oct. 19, 2026
+
+@author: Mario Guzzi
+'''
+
+import queue
+import threading
+import time
+
+import dimod
+import neal
+
+from quzzi.qzpartition import tripEnumerator
+from quzzi.qzprofile import profiler
+from quzzi.qzretain import topSamples
+
+#==============================================================================================#
+# class sampleStream: Batches of reads delivered as a local sampler finishes them              #
+#                                                                                              #
+# The reads are sampled in batches on a background thread (neal by default, or any dimod       #
+# sampler such as tabu) while the batches already done are decoded and checked on the caller   #
+# side. Iterating yields a report per batch:                                                   #
+#   - batch, reads, elapsed : batch number, reads done, seconds since the start                #
+#   - energy, best          : lowest energy of the batch and so far                            #
+#   - feasible              : decoded samples of the batch that are feasible trips             #
+#   - bestFeasible, trips   : lowest feasible energy so far and its sequences                  #
+#   - stopped               : 'target' or 'time' on the report stopping early, else None       #
+#                                                                                              #
+# The decode lowest samples of each batch are decoded (0 for none). A sample is feasible when  #
+# every active segment is in exactly one trip and every trip is feasible for tripEnumerator.   #
+# Sampling stops early once the best energy reaches target, or after time_limit seconds (no    #
+# batch is started past it, stream.stopped is then 'time'). Leaving the loop also stops it,    #
+# after the batch in progress.                                                                 #
+#                                                                                              #
+# The reads are merged into the sampleset (the top k unique samples when topk is given), set   #
+# on the annealer as sampleset when the stream ends.                                           #
+#                                                                                              #
+# Usage (see routeAnneal.solveStream):                                                         #
+#                                                                                              #
+#   for report in ra.solveStream(num_reads=5000, batch=250, target=-480000, time_limit=30):    #
+#       print(report['reads'], report['best'], report['bestFeasible'])                         #
+#   ra.print_all()                                                                             #
+#                                                                                              #
+#==============================================================================================#
+
+class sampleStream:
+
+    # parameters : passed to sampler.sample (num_sweeps, seed...). A seed is advanced by batch
+    def __init__(self, A, sampler=None, num_reads=1000, batch=100, target=None, time_limit=None, topk=None, decode=1, bqm=None, **parameters):
+        self.A = A
+        self.sampler = sampler if sampler is not None else neal.SimulatedAnnealingSampler()
+        self.num_reads = num_reads
+        self.batch = batch
+        self.target = target
+        self.time_limit = time_limit
+        self.topk = topk
+        self.decode = decode
+        self.bqm = bqm
+        self.parameters = parameters
+        self.halt = threading.Event()
+        self.sampleset = None
+        self.stopped = None
+        self.error = None
+        self.succ = None
+
+    # Stop after the batch in progress
+    def stop(self):
+        self.halt.set()
+
+    # Background thread: sample the batches into the queue, None when done
+    def produce(self, bqm, batches, t0):
+        try:
+            (reads, b) = (0, 0)
+            while ( reads < self.num_reads and not self.halt.is_set() ):
+                if ( self.time_limit is not None and time.time() - t0 >= self.time_limit ):
+                    self.stopped = 'time'
+                    break
+                n = min(self.batch, self.num_reads - reads)
+                parameters = dict(self.parameters)
+                if ( parameters.get('seed') is not None ): parameters['seed'] += b
+                sampleset = self.sampler.sample(bqm, num_reads=n, **parameters)
+                sampleset.resolve()
+                batches.put(sampleset)
+                (reads, b) = (reads + n, b + 1)
+        except Exception as e:
+            self.error = e
+        finally:
+            batches.put(None)
+
+    # Is a decoded solution feasible: every active segment once, in feasible trips
+    def feasible(self, sequences):
+        A = self.A
+        T = A.getTable()
+        if ( self.succ is None ):
+            self.E = tripEnumerator(T, A.QT.params)
+            self.succ = self.E.successors()
+        covered = sorted(t for seq in sequences.values() for t in seq)
+        if ( covered != [int(t) for t in T.task_id[~T.cancelled]] ): return(False)
+        return( all(self.E.isTrip([t-1 for t in seq], self.succ) for seq in sequences.values()) )
+
+    def __iter__(self):
+        A = self.A
+        bqm = self.bqm if self.bqm is not None else A.getBQM()
+        batches = queue.Queue()
+        self.halt.clear()
+        (self.stopped, self.error) = (None, None)
+        retained = topSamples(self.topk) if self.topk is not None else None
+        parts = []
+        (reads, best, bestFeasible, trips) = (0, None, None, None)
+        t0 = time.time()
+        producer = threading.Thread(target=self.produce, args=(bqm, batches, t0), daemon=True)
+        producer.start()
+        try:
+            b = 0
+            while ( True ):
+                sampleset = batches.get()
+                if ( sampleset is None ): break
+                reads += int(sampleset.record.num_occurrences.sum())
+                if ( retained is not None ): retained.add(sampleset)
+                else: parts.append(sampleset)
+                energy = float(sampleset.first.energy)
+                best = energy if best is None else min(best, energy)
+
+                feasible = 0
+                with profiler.phase("decode") as p:
+                    for i, res in enumerate(sampleset.data(['sample', 'energy'], sorted_by='energy')):
+                        if ( i >= self.decode ): break
+                        sequences = A.getSequences(res)
+                        if ( not self.feasible(sequences) ): continue
+                        feasible += 1
+                        if ( bestFeasible is None or res.energy < bestFeasible ): (bestFeasible, trips) = (float(res.energy), sequences)
+                    p.size(samples=min(self.decode, len(sampleset)))
+
+                elapsed = time.time() - t0
+                if ( self.target is not None and best <= self.target ): self.stopped = 'target'
+                elif ( self.time_limit is not None and elapsed >= self.time_limit ): self.stopped = 'time'
+                if ( self.stopped is not None ): self.stop()
+                yield( {'batch': b, 'reads': reads, 'elapsed': elapsed, 'energy': energy, 'best': best,
+                        'feasible': feasible, 'bestFeasible': bestFeasible, 'trips': trips, 'stopped': self.stopped} )
+                b += 1
+        finally:
+            self.stop()
+            producer.join()
+            if ( retained is not None ): self.sampleset = retained.sampleset()
+            elif ( len(parts) ): self.sampleset = dimod.concatenate(parts)
+            if ( self.sampleset is not None ):
+                A.sampleset = self.sampleset
+                profiler.add("sample", time.time() - t0, reads=reads, variables=bqm.num_variables)
+        if ( self.error is not None ): raise self.error
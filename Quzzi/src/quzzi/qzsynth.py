@@ -0,0 +1,147 @@
+#   Copyright 2021 Mario Guzzi
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+'''
+Created on Oct. 19, 2026
+
+@author: Mario Guzzi
+'''
+
+import csv
+import random
+import string
+
+#==============================================================================================#
+# class schedGenerator: Synthetic flight schedules for scaling benchmarks                      #
+#                                                                                              #
+# Generates hub-and-spoke schedules in the schedData.loadFlts column layout:                   #
+#   FID, FN, FDep, FArr, FDepD, FDepT, FArrT, FArrD, UDepD, UDepT, UArrT, UArrD, FFT, FTZD, Atype  #
+#                                                                                              #
+# Each hub (home base) operates rotations leaving in departure banks: an out-and-back to a    #
+# spoke, or with probability 'triangle' a hub-spoke-spoke-hub rotation. Spokes have a fixed    #
+# block time and aircraft type. Times are UTC (FTZD is 0). The same seed always produces the   #
+# same schedule.                                                                               #
+#                                                                                              #
+# Usage:                                                                                       #
+#                                                                                              #
+#   G = schedGenerator(hubs=2, spokes=30, days=3, atypes=["320","AT7"], seed=7)                #
+#   G.write("synth.csv", segments=500)                                                         #
+#   ra = routeAnneal(dataset="synth.csv", homebases=G.homeBases())                             #
+#                                                                                              #
+#==============================================================================================#
+
+class schedGenerator:
+
+    header = ["FID","FN","FDep","FArr","FDepD","FDepT","FArrT","FArrD","UDepD","UDepT","UArrT","UArrD","FFT","FTZD","Atype"]
+
+    # hubs       : number of home bases (or list of station codes)
+    # spokes     : number of outstations (or list of station codes)
+    # days       : number of operating days
+    # atypes     : aircraft types, assigned to spokes
+    # banks      : departure bank times at the hubs (minutes after midnight)
+    # bankSpread : departures within a bank are spread over this many minutes
+    # blockTimes : (min,max) block time in minutes of a hub-spoke leg
+    # turnaround : (min,max) ground time at outstations
+    # triangle   : probability of a hub-spoke-spoke-hub rotation
+
+    def __init__(self, hubs=1, spokes=12, days=1, atypes=["320"], banks=[360,540,720,900,1080],
+                 bankSpread=60, blockTimes=(40,300), turnaround=(35,60), triangle=0.1, seed=0):
+        self.seed = seed
+        self.hubs = hubs if isinstance(hubs,list) else self.stations("H", hubs)
+        self.spokes = spokes if isinstance(spokes,list) else self.stations("S", spokes)
+        self.days = days
+        self.atypes = atypes
+        self.banks = sorted(banks)
+        self.bankSpread = bankSpread
+        self.blockTimes = blockTimes
+        self.turnaround = turnaround
+        self.triangle = triangle
+
+        # Fixed spoke characteristics
+        rng = random.Random(seed)
+        self.block = {}
+        self.atype = {}
+        for s in self.spokes:
+            self.block[s] = self.round5(rng.randint(*self.blockTimes))
+            self.atype[s] = rng.choice(self.atypes)
+
+    # Three letter station codes: prefix followed by two letters
+    def stations(self, prefix, count):
+        letters = string.ascii_uppercase
+        return( [prefix + letters[(i // 26) % 26] + letters[i % 26] for i in range(count)] )
+
+    def round5(self, m):
+        return( int(5 * round(m / 5)) )
+
+    def homeBases(self):
+        return( {h: 1 for h in self.hubs} )
+
+    # One flight row. dep is the absolute departure in minutes from day 1 00:00
+    def row(self, fid, fn, dep, arr, udep, ft, atype):
+        uarr = udep + ft
+        depD = udep // 1440 + 1
+        arrD = uarr // 1440 + 1
+        depT = udep % 1440
+        arrT = uarr % 1440
+        return([fid, fn, dep, arr, depD, depT, arrT, arrD, depD, depT, arrT, arrD, ft, 0, atype])
+
+    # Generate rows until at least 'segments' rows (whole rotations only)
+    # Rotations are spread evenly across days, hubs and banks
+
+    def generate(self, segments=100):
+        rng = random.Random(self.seed + 1)
+        slots = self.days * len(self.hubs) * len(self.banks)
+        perSlot = max(1, -(-segments // (2 * slots)))     # Rotations per bank (ceiling)
+
+        rows = []
+        fid = 0
+        fn = {h: (i + 1) * 1000 for i, h in enumerate(self.hubs)}
+        for r in range(perSlot):
+            for d in range(self.days):
+                for h in self.hubs:
+                    for b in self.banks:
+                        if ( len(rows) >= segments ): break
+
+                        # Rotation legs: out-and-back or triangle
+                        s1 = rng.choice(self.spokes)
+                        legs = [(h, s1)]
+                        if ( rng.random() < self.triangle and len(self.spokes) > 1 ):
+                            s2 = rng.choice([s for s in self.spokes if s != s1])
+                            legs.append((s1, s2))
+                            legs.append((s2, h))
+                        else:
+                            legs.append((s1, h))
+
+                        t = d * 1440 + b + self.round5(rng.randint(0, self.bankSpread))
+                        atype = self.atype[s1]
+                        for (dep, arr) in legs:
+                            spoke = arr if dep == h else dep
+                            ft = self.block[spoke]
+                            if ( dep != h and arr != h ):  # Spoke to spoke
+                                ft = self.round5((self.block[dep] + self.block[arr]) / 2)
+                            fid += 1
+                            fn[h] += 1
+                            rows.append(self.row(fid, str(fn[h]), dep, arr, t, ft, atype))
+                            t += ft + self.round5(rng.randint(*self.turnaround))
+
+        rows.sort(key=lambda x: (x[8], x[9], x[0]))
+        return(rows)
+
+    def write(self, filename, segments=100):
+        rows = self.generate(segments)
+        with open(filename, 'w', newline='') as csvfile:
+            writer = csv.writer(csvfile, delimiter=',')
+            writer.writerow(self.header)
+            writer.writerows(rows)
+        return(len(rows))
@@ -0,0 +1,239 @@
+#   Copyright 2021 Mario Guzzi
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+'''
+Created on Oct. 19, 2026
+
+@author: Mario Guzzi
+'''
+
+import json
+import math
+import os
+import warnings
+
+import numpy as np
+import neal
+
+from quzzi.qzchain import tripChainer
+from quzzi.qzprofile import profiler
+
+#==============================================================================================#
+# class weightProfiles: Tuned weight profiles stored as json files by dataset family           #
+#                                                                                              #
+#==============================================================================================#
+
+class weightProfiles:
+
+    def __init__(self, path=".qzcache/weights"):
+        self.path = path
+
+    def file(self, family):
+        return(os.path.join(self.path, family + ".json"))
+
+    def load(self, family):
+        filename = self.file(family)
+        if ( not os.path.exists(filename) ): return(None)
+        with open(filename, 'r') as f:
+            return(json.load(f))
+
+    def save(self, family, profile):
+        os.makedirs(self.path, exist_ok=True)
+        # Write then rename so that concurrent runs never read a partial file
+        tmp = self.file(family) + ".tmp" + str(os.getpid())
+        with open(tmp, 'w') as f:
+            json.dump(profile, f, indent=1)
+        os.replace(tmp, self.file(family))
+
+    def clear(self):
+        if ( not os.path.isdir(self.path) ): return
+        for f in os.listdir(self.path):
+            if ( f.endswith(".json") ): os.remove(os.path.join(self.path, f))
+
+#==============================================================================================#
+# class weightTuner: Penalty layer weights tuned by short sampling batches                     #
+#                                                                                              #
+# The layers built by tripModel.setConstraints are reused: each penalty Qubo is weighed in the #
+# problem Qubo by a scale (QuboTrips.layerScale), nothing is rebuilt. Each batch is sampled    #
+# and measured from the energy of each layer against the greedy trips (tripChainer):           #
+#   - the violation rate of each penalty layer: samples above the reference by a quarter of    #
+#     the smallest coefficient of the layer                                                    #
+#   - the objective quality: best objective (the other layers) of the samples violating no     #
+#     layer, against the reference objective                                                   #
+#                                                                                              #
+# One layer at a time, its scale is bisected (geometric mean) within a factor spread of its    #
+# current value, the other layers held: raised while the layer violates more than              #
+# max_violation of the samples, lowered otherwise, to the smallest scale meeting the target.   #
+# The layers compete (a segment left out avoids its misconnects), so the layers are tuned in   #
+# several passes, and the profile kept is the best batch measured: meeting both targets, then  #
+# the most feasible samples. Scales are relative to the weights the layers were built with     #
+# (fixed or quboConditioner), which the family key includes. Only profiles meeting the targets #
+# are cached: a cached profile that does not is tuned again.                                   #
+#                                                                                              #
+# Usage:                                                                                       #
+#                                                                                              #
+#   M = tripModel().annealer(ra)                                                               #
+#   M.setConstraints()                                                                         #
+#   profile = weightTuner(M, cache=weightProfiles()).tune()      # Loaded when cached          #
+#   ra.solve(useNeal=True, useHyb=False)                                                       #
+#                                                                                              #
+#==============================================================================================#
+
+class weightTuner:
+
+    penalties = ('constraint', 'misconnect', 'badstarts', 'substitutions')
+
+    def __init__(self, model, sampler=None, num_reads=20, num_sweeps=500, max_violation=0.25, gap=0.10,
+                 rounds=6, passes=2, spread=4.0, tolerance=0.25, cache=None, family=None, seed=None, verbose=False):
+        self.model = model
+        self.sampler = sampler          # dimod sampler for the batches (default: neal with num_sweeps)
+        self.num_reads = num_reads
+        self.num_sweeps = num_sweeps
+        self.max_violation = max_violation  # Target: largest violation rate of a penalty layer
+        self.gap = gap                  # Target: best objective within gap * |reference objective|
+        self.rounds = rounds            # Batches per layer bisection
+        self.passes = passes            # Bisections of every layer
+        self.spread = spread
+        self.tolerance = tolerance      # Stop when every bracket is within a factor 1+tolerance
+        self.cache = cache              # weightProfiles
+        self.family = family
+        self.seed = seed
+        self.verbose = verbose
+        self.history = []
+
+    # Default dataset family: home bases, board size by tens, board pruning, base weights
+    def familyKey(self):
+        A = self.model.A
+        if ( self.family is not None ): return(self.family)
+        return( "{}-N{}-trip{}-{}".format("_".join(sorted(A.HomeBases)), 10 * math.ceil(A.N / 10), A.QT.params['const_max_trip'],
+                                          getattr(self.model, 'weightBase', "fixed")) )
+
+    # Energy of each board Qubo (unscaled) for samples X (rows of board variables)
+    def layerEnergies(self, X):
+        energies = {}
+        for qubo, Q in self.model.A.QT.board.Qubos.items():
+            if ( len(Q) == 0 ):
+                energies[qubo] = np.zeros(len(X))
+                continue
+            (I, J) = np.array(list(Q.keys())).T
+            W = np.fromiter(Q.values(), dtype=float, count=len(Q))
+            energies[qubo] = (X[:,I] * X[:,J]) @ W
+        return(energies)
+
+    # Layer energies of the greedy trips and the violation threshold of each penalty layer.
+    # When the greedy trips do not fit the board, the best sample of a first batch is the reference
+    def reference(self):
+        A = self.model.A
+        QT = A.QT
+        sequences = tripChainer(A.getTable(), QT.params, tripChainer.boardDuty(QT.params)).solve()
+        X = np.zeros((1, QT.board.qubits))
+        try:
+            for v, value in QT.encodeSequences(sequences).items(): X[0, v] = value
+        except ValueError as e:
+            warnings.warn("Greedy trips do not fit the board ({}): measuring against the best sample".format(e))
+            X = self.sample({qubo: QT.layerScale.get(qubo, 1.0) for qubo in self.penalties})
+            X = X[[int(np.argmin(sum(self.layerEnergies(X).values())))]]
+        self.ref = {qubo: float(E[0]) for qubo, E in self.layerEnergies(X).items()}
+        self.threshold = {}
+        for qubo in self.penalties:
+            a = np.abs(np.fromiter(QT.board.Qubos[qubo].values(), dtype=float))
+            a = a[a > 0]
+            self.threshold[qubo] = 0.25 * a.min() if len(a) else 0.0
+        return(self.ref)
+
+    def objective(self, energies):
+        return( sum(E for qubo, E in energies.items() if qubo not in self.penalties) )
+
+    # Samples of a batch with the given scales (rows of board variables)
+    def sample(self, scales):
+        A = self.model.A
+        QT = A.QT
+        QT.setLayerScale(scales)
+        bqm = A.getBQM()
+        with profiler.phase("tuneBatch") as p:
+            if ( self.sampler is None ):
+                sampleset = neal.SimulatedAnnealingSampler().sample(bqm, num_reads=self.num_reads, num_sweeps=self.num_sweeps, seed=self.seed)
+            else:
+                sampleset = self.sampler.sample(bqm, num_reads=self.num_reads)
+            p.size(reads=self.num_reads, variables=bqm.num_variables)
+        X = np.zeros((len(sampleset), QT.board.qubits))
+        columns = [int(v) for v in sampleset.variables]
+        X[:, columns] = sampleset.record.sample
+        return(X)
+
+    # Sample a batch with the given scales. Returns the violation rates and the best feasible objective
+    def measure(self, scales):
+        X = self.sample(scales)
+        energies = self.layerEnergies(X)
+        violated = {qubo: energies[qubo] - self.ref[qubo] > self.threshold[qubo] for qubo in self.penalties}
+        feasible = ~np.any([violated[qubo] for qubo in self.penalties], axis=0)
+        objective = self.objective(energies)[feasible]
+        return( {'scales': dict(scales),
+                 'rates': {qubo: float(violated[qubo].mean()) for qubo in self.penalties},
+                 'feasible': float(feasible.mean()),
+                 'objective': float(objective.min()) if len(objective) else None} )
+
+    def batch(self, scales):
+        stats = self.measure(scales)
+        self.history.append(stats)
+        if ( self.verbose ): print("Batch", len(self.history), stats)
+        return(stats)
+
+    def meetsTargets(self, stats):
+        if ( max(stats['rates'].values()) > self.max_violation or stats['objective'] is None ): return(False)
+        target = self.objective(self.ref)
+        return( stats['objective'] <= target + self.gap * abs(target) )
+
+    # Tune (or load) the profile and apply it. Returns the profile
+    def tune(self):
+        A = self.model.A
+        QT = A.QT
+        if ( A.PM is not None ): raise ValueError("Weight tuning applies to the board model")
+        family = self.familyKey()
+        if ( self.cache is not None ):
+            profile = self.cache.load(family)
+            if ( profile is not None and not profile.get('met', False) ):
+                warnings.warn("Cached weight profile for {} did not meet the targets: tuning again".format(family))
+            elif ( profile is not None ):
+                if ( self.verbose ): print("Weight profile", family, "loaded")
+                QT.setLayerScale(profile['scales'])
+                return(profile)
+
+        self.reference()
+        self.history = []
+        scales = {qubo: QT.layerScale.get(qubo, 1.0) for qubo in self.penalties}
+        with profiler.phase("tuneWeights"):
+            for p in range(self.passes):
+                for qubo in self.penalties:
+                    (lo, hi) = (scales[qubo] / self.spread, scales[qubo] * self.spread)
+                    for r in range(self.rounds):
+                        stats = self.batch(scales)
+                        if ( stats['rates'][qubo] > self.max_violation ):
+                            lo = scales[qubo]
+                        else:
+                            hi = scales[qubo]
+                        scales[qubo] = math.sqrt(lo * hi)
+                        if ( hi <= lo * (1 + self.tolerance) ): break
+                    scales[qubo] = hi       # Smallest scale meeting the target (or the top of the range)
+            self.batch(scales)
+
+        best = min(self.history, key=lambda stats: (not self.meetsTargets(stats), -stats['feasible'], max(stats['rates'].values())))
+        if ( not self.meetsTargets(best) ):
+            warnings.warn("No weight profile met the targets for {}: keeping the most feasible one".format(family))
+        profile = {'family': family, 'scales': best['scales'], 'rates': best['rates'], 'feasible': best['feasible'],
+                   'objective': best['objective'], 'reference': self.objective(self.ref), 'rounds': len(self.history),
+                   'met': self.meetsTargets(best)}
+        QT.setLayerScale(profile['scales'])
+        if ( self.cache is not None and profile['met'] ): self.cache.save(family, profile)
+        return(profile)
@@ -31,6 +31,10 @@ import networkx as nx
 import matplotlib.pyplot as plt
 import math
 
+from quzzi.qzprofile import profiler
+from quzzi.qzpredict import sizePredictor
+from quzzi.qztune import weightTuner
+
 class tripModel:
     
     def __init__(self):
@@ -77,6 +81,7 @@ class tripModel:
         QT.params['const_min_prone_rest'] = 8*60 # Default: Amount of time in between segments that may qualify for a rest period
         QT.params['const_start'] = 90
         QT.params['const_stoptrip'] = 0
+        QT.params['const_max_trip'] = 0         # Board pruning: maximum trip span in minutes (0 keeps the full board)
 
         # Rebuild the graph using current params
         QT.commitParams()
@@ -158,11 +163,23 @@ class tripModel:
     def numQuboPairs(self,N):
         # Given the number of nodes, we want to compute
         # the number of Qubo pairs (Qij) we will have
+        # Note: Upper bound only. Use predict() for the actual problem size
         return( math.comb(int((N**2)/2),2) )
 
+    # Predict variables, ancillas, nonzeros per layer and memory of setConstraints
+    # from the connection matrix, before building anything
+    def predict(self):
+        A = self.A
+        return( sizePredictor(A.FD, A.QT.params, A.HomeBases, LG=self.hamilWeights.HD, mask=A.QT.buildFeasibleCells()).predict() )
+
     def rank(self,v):
         return( math.ceil(math.log10(v)))
 
+    # Tune the penalty layer weights by short sampling batches, after setConstraints.
+    # Returns the weight profile (see qztune.weightTuner for the options and the cache)
+    def tuneWeights(self,**kwargs):
+        return( weightTuner(self,**kwargs).tune() )
+
     # ===============================================================================================
     # Constraint weight preparation
     # ===============================================================================================
@@ -173,6 +190,7 @@ class tripModel:
         HC = 1.0        # Off base starts
         HB = 1.0        # Bias on misconnects   
         HD = 1.0        # bad gap weights
+        HM = 100        # Must start (scales const_must_start)
         LG = 1          # Not currently used
         HX = 1          # Calculated "undesirable instances" weight
         HXL = 1         # Calculated "undesirable instances" weight rank
@@ -238,6 +256,7 @@ class tripModel:
         W.HB = 10**W.T2 #4.5 #10**T2    # mis connects
         W.HC = 4.0 #10**T3    # bad starts
         W.HD = 1.0 # HX*75     # 10**T4 # bad gaps used in ValidGaps
+        W.HM = 100             # must start
 
         '''
         print("HX  :", W.HX)
@@ -253,27 +272,47 @@ class tripModel:
         
         return(W)
     
-    def setConstraints(self):
+    # weights: hamilWeights to use instead of makeHamilWeights (see qzcondition)
+    # base: name of the weights the layers are built with (tuned weight profiles are relative to them)
+    def setConstraints(self,weights=None,base="fixed"):
 
-        H = self.makeHamilWeights(7)
+        with profiler.phase("makeHamilWeights"):
+            H = weights if weights is not None else self.makeHamilWeights(7)
+        self.weightBase = base
         
         QT = self.A.QT
+        QT.layers = []
         
         # Build final Qubos
 
         # Set structure constraints
 
-        QT.applyOneNodePerRow(H.HA)                      # (1)
-        QT.applyOneNodePerCol(H.HA)                      # (2)
-        QT.applyMustStart(LG=100)                        # (3) TODO: Fix default weight and auto sizing
-        #QT.applyCantStart()                             # (4)
-        QT.applyNoMisconnect(qubo='misconnect',LG=H.HB)  # (5)
-        QT.applyNoStartOffBase(qubo='badstarts',LG=H.HC) # (5b)
+        self.applyLayer(QT.applyOneNodePerRow,LG=H.HA)                      # (1)
+        self.applyLayer(QT.applyOneNodePerCol,LG=H.HA)                      # (2)
+        self.applyLayer(QT.applyMustStart,LG=H.HM)                          # (3) Auto sizing: see qzcondition
+        #self.applyLayer(QT.applyCantStart)                                 # (4)
+        self.applyLayer(QT.applyNoMisconnect,qubo='misconnect',LG=H.HB)     # (5)
+        self.applyLayer(QT.applyNoStartOffBase,qubo='badstarts',LG=H.HC)    # (5b)
 
         # Objective contributions
-        QT.applySegmentInitialContribution()             # (6) 
-        QT.applyValidGaps(LG=H.HD)                       # (7)
-        QT.applyStart(qubo='audit-CICO',P=H.H0)          # (8) Must come anywhere *after* ValidGaps
+        self.applyLayer(QT.applySegmentInitialContribution,qubo='objective') # (6) 
+        self.applyLayer(QT.applyValidGaps,qubo='objective',LG=H.HD)         # (7)
+        self.applyLayer(QT.applyStart,qubo='audit-CICO',P=H.H0)             # (8) Must come anywhere *after* ValidGaps
+
+    # Apply one QuboTrips layer, measured as a phase of its own
+    # Layers are recorded in QT.layers with their weights, to be patched after segment edits
+    def applyLayer(self,apply,qubo='constraint',**kwargs):
+        QT = self.A.QT
+        with profiler.phase(apply.__name__) as p:
+            # Several layers share a Qubo: their own terms and nonzeros are the growth of that Qubo
+            if ( profiler.enabled ):
+                Q = QT.board.getQubo(qubo)
+                (terms, nonzeros) = (len(Q), QT.board.nonzeros(Q))
+            apply(qubo=qubo,**kwargs)
+            QT.layers.append((apply.__name__, qubo, kwargs))
+            if ( profiler.enabled ):
+                Q = QT.board.getQubo(qubo)
+                p.size(qubo=qubo, terms=len(Q) - terms, nonzeros=QT.board.nonzeros(Q) - nonzeros, variables=int(QT.board.qubits), ancillas=QT.board.ancillas())
 
         #QT.applyStartInitialContribution(qubo='initial-starts')      # (6b) experimental. Trying to incentivise adding starts to remove negative gaps
 
@@ -0,0 +1,39 @@
+#   Copyright 2021 Mario Guzzi
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+'''
+Created on Oct. 19, 2026
+
+@author: Mario Guzzi
+'''
+
+# Scaling benchmark: sweeps synthetic schedule sizes and writes one json line
+# per size and phase. Compare two runs with:
+#
+#   python scale_solver.py [label] [previous.jsonl]
+
+import sys
+
+from quzzi.qzscale import scaleBench
+
+label = sys.argv[1] if len(sys.argv) > 1 else "current"
+filename = "scaling-" + label + ".jsonl"
+
+S = scaleBench(label=label, reads=10, generator={'hubs': 1, 'spokes': 12, 'days': 1})
+S.run(sizes=[10,16,24,32], filename=filename)
+
+if ( len(sys.argv) > 2 ):
+    S.compare(sys.argv[2], filename)
+
+print("Completed")